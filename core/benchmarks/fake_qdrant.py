@@ -0,0 +1,76 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class FakeQdrantHandler(BaseHTTPRequestHandler):
+    """
+    Answers ``POST /collections/<name>/points/search`` with canned points, like the Qdrant REST API.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wbufsize = 1 << 16
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        request = json.loads(body or b"{}")
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        limit = request.get("limit", 3)
+        result = [
+            {"id": str(i), "version": 0, "score": round(random.uniform(0.7, 1.0), 4),
+             "payload": {"context": f"Fake context {i}"}}
+            for i in range(limit)
+        ]
+        data = json.dumps({"result": result, "status": "ok", "time": self.server.latency}).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeQdrantServer(object):
+    """
+    Local stand-in for a Qdrant instance, served from a background thread.
+
+    :param latency: float - Seconds of simulated server-side work per request.
+    """
+
+    def __init__(self, latency: float = 0.002):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeQdrantHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def summarize_latencies(latencies_ms) -> dict:
+    latencies = np.asarray(latencies_ms)
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "mean_ms": round(float(latencies.mean()), 3),
+    }
@@ -0,0 +1,89 @@
+"""
+Compare search latency of the pooled ``QdrantTransport`` against per-call connections.
+
+Run with ``python -m core.benchmarks.qdrant_transport``. ``per_call`` is the previous implementation
+(``requests.post``); ``per_call_httpx`` opens a fresh ``httpx.Client`` per call but reuses one SSL
+context, so it isolates the cost of the connection itself from httpx building an SSL context on every
+call. A local fake Qdrant server is used, so the numbers exclude TLS; against a remote HTTPS Qdrant the
+gap is larger since every per-call request also pays a TLS handshake.
+"""
+import argparse
+import json
+import ssl
+import time
+
+import httpx
+import requests
+
+from core.benchmarks.fake_qdrant import FakeQdrantServer, summarize_latencies
+from core.services.qdrant_transport import QdrantTransport
+
+
+def per_call_search(url, api_key, query_vector, collection_name, limit=3, score_threshold=0.7):
+    """
+    Mirrors the former ``search_qdrant_api``: a fresh connection and a 60 s timeout on every call.
+    """
+    headers = {"Content-Type": "application/json", "Accept": "application/json", "api-key": api_key}
+    payload = {"vector": query_vector, "limit": limit, "score_threshold": score_threshold, "with_payload": True}
+    response = requests.post(
+        f"{url}collections/{collection_name}/points/search",
+        headers=headers,
+        data=json.dumps(payload),
+        timeout=60
+    )
+    response.raise_for_status()
+    return response.json().get("result", [])
+
+
+_SSL_CONTEXT = ssl.create_default_context()
+
+
+def per_call_httpx_search(url, api_key, query_vector, collection_name, limit=3, score_threshold=0.7):
+    """
+    A fresh ``httpx.Client`` (and connection) on every call, sharing one SSL context.
+    """
+    headers = {"Content-Type": "application/json", "Accept": "application/json", "api-key": api_key}
+    payload = {"vector": query_vector, "limit": limit, "score_threshold": score_threshold, "with_payload": True}
+    with httpx.Client(verify=_SSL_CONTEXT, timeout=60) as client:
+        response = client.post(
+            f"{url}collections/{collection_name}/points/search",
+            headers=headers,
+            content=json.dumps(payload)
+        )
+    response.raise_for_status()
+    return response.json().get("result", [])
+
+
+def _time_calls(fn, iterations):
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run(iterations=500, latency=0.002, vector_size=1536):
+    query_vector = [0.01] * vector_size
+    with FakeQdrantServer(latency=latency) as server:
+        transport = QdrantTransport(url=server.url, api_key="bench")
+        results = {
+            "per_call": summarize_latencies(_time_calls(
+                lambda: per_call_search(server.url, "bench", query_vector, "bench"), iterations)),
+            "per_call_httpx": summarize_latencies(_time_calls(
+                lambda: per_call_httpx_search(server.url, "bench", query_vector, "bench"), iterations)),
+            "pooled": summarize_latencies(_time_calls(
+                lambda: transport.search("bench", query_vector), iterations)),
+        }
+        transport.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated server latency in seconds")
+    args = parser.parse_args()
+
+    for name, stats in run(iterations=args.iterations, latency=args.latency).items():
+        print(f"{name:>14}: p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms mean={stats['mean_ms']}ms")
@@ -0,0 +1,90 @@
+"""
+Latency, accuracy and cost of task-creation structured output across LLM configurations.
+
+Run with ``python -m core.benchmarks.structured_output --configs task-creation-agent,task-creation-agent-claude``
+(Django settings must be configured and the configurations present). Every message of the task-intent
+labelled set is sent to each configuration with the ``task_creation`` schema, the way
+``identify_creation_intent_and_execute`` does; accuracy is the share of answers whose ``creation_intent``
+matches the label. Routing is bypassed, so each configuration's own provider and model answer. Use the
+result to choose the ``routing`` targets of the task-creation configuration.
+"""
+import argparse
+import time
+from datetime import datetime
+
+import django
+
+from core.benchmarks.fake_qdrant import summarize_latencies
+
+
+def run_config(config_name, examples):
+    from django.db.models import Sum
+    from django.utils import timezone
+    from core.models import LLMRequestLog
+    from core.providers.llm_service import LLMProviderError
+    from core.services.llm_interface import LLMInterface
+    from core.services.request_log_writer import llm_request_log_writer
+    from core.services.response_cache import llm_response_cache
+    from university_agent.constants import StructuredOutputConstants
+
+    interface = LLMInterface()
+    config_obj = interface.get_config_object(config_name)
+    llm_response_cache.clear(config_name)
+
+    started_at = timezone.now()
+    latencies, correct, failures = [], 0, 0
+    for example in examples:
+        started = time.perf_counter()
+        try:
+            task = interface.get_custom_structured_response(
+                config_name=config_name,
+                user_prompt=f"Current Datetime; {datetime.now()} User Query:{example['text']}",
+                schema_name=StructuredOutputConstants.TASK_CREATION_SCHEMA,
+                model=config_obj.model,
+            )
+        except LLMProviderError:
+            failures += 1
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+        correct += task.creation_intent == example["task"]
+
+    llm_request_log_writer.flush()
+    logs = LLMRequestLog.objects.filter(config_name=config_name, status="SUCCESS", created_at__gte=started_at)
+    totals = logs.aggregate(cost=Sum("response_cost"), input_tokens=Sum("input_tokens"), output_tokens=Sum("output_tokens"))
+
+    answered = len(latencies)
+    return dict(
+        summarize_latencies(latencies) if latencies else {"p50_ms": None, "p99_ms": None, "mean_ms": None},
+        provider=config_obj.llm_provider,
+        model=config_obj.model,
+        accuracy=correct / answered if answered else 0.0,
+        failures=failures,
+        cost=totals["cost"] or 0.0,
+        input_tokens=totals["input_tokens"] or 0,
+        output_tokens=totals["output_tokens"] or 0,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--configs", required=True, help="Comma-separated LLM configuration names to compare")
+    parser.add_argument("--eval-set", default=None, help="JSONL file of {\"text\", \"task\"} examples")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N examples")
+    args = parser.parse_args()
+
+    django.setup()
+    from university_agent.intent_classifier import load_task_intent_eval_set
+
+    examples = load_task_intent_eval_set(args.eval_set)[:args.limit]
+    print(f"{len(examples)} examples, {sum(1 for example in examples if example['task'])} task requests")
+    print(f"{'config':<32} {'provider':<10} {'p50 ms':>9} {'p99 ms':>9} {'accuracy':>8} {'failed':>6} {'cost':>10}")
+    for config_name in args.configs.split(","):
+        result = run_config(config_name.strip(), examples)
+        p50 = f"{result['p50_ms']:.0f}" if result["p50_ms"] is not None else "-"
+        p99 = f"{result['p99_ms']:.0f}" if result["p99_ms"] is not None else "-"
+        print(f"{config_name.strip():<32} {result['provider']:<10} {p50:>9} {p99:>9} "
+              f"{result['accuracy']:>8.2f} {result['failures']:>6} {result['cost']:>10.5f}")
+
+
+if __name__ == "__main__":
+    main()
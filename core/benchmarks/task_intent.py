@@ -0,0 +1,33 @@
+"""
+Precision, recall and LLM call rate of the local task-intent pre-classifier across thresholds.
+
+Run with ``python -m core.benchmarks.task_intent`` (Django settings must be configured). Recall is the
+share of task requests that still reach the task-creation LLM; the call rate is the share of all messages
+that do, i.e. one minus the LLM calls saved.
+"""
+import argparse
+
+import django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--eval-set", default=None, help="JSONL file of {\"text\", \"task\"} examples")
+    parser.add_argument("--thresholds", default="0.1,0.2,0.3,0.4,0.5,0.6,0.7",
+                        help="Comma-separated ambiguous thresholds to evaluate")
+    args = parser.parse_args()
+
+    django.setup()
+    from university_agent.intent_classifier import TaskIntentClassifier, evaluate, load_task_intent_eval_set
+
+    examples = load_task_intent_eval_set(args.eval_set)
+    print(f"{len(examples)} examples, {sum(1 for example in examples if example['task'])} task requests")
+    print(f"{'threshold':>9} {'precision':>9} {'recall':>7} {'llm calls':>9}  missed")
+    for threshold in (float(value) for value in args.thresholds.split(",")):
+        result = evaluate(TaskIntentClassifier(ambiguous_threshold=threshold), examples)
+        print(f"{threshold:>9.2f} {result['precision']:>9.2f} {result['recall']:>7.2f} "
+              f"{result['llm_call_rate']:>9.2f}  {len(result['missed'])}")
+
+
+if __name__ == "__main__":
+    main()
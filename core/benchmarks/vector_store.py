@@ -0,0 +1,68 @@
+"""
+Compare search latency of the in-process ``LocalVectorStore`` against the remote Qdrant REST path.
+
+Run with ``python -m core.benchmarks.vector_store``. The remote path is served by a local fake
+Qdrant server, so its numbers are a lower bound on a real network round trip.
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from core.benchmarks.fake_qdrant import FakeQdrantServer, summarize_latencies
+from core.services.qdrant_transport import QdrantTransport
+from core.services.vector_store import LocalVectorStore, QdrantVectorStore
+
+
+def _time_searches(search, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run(points=5000, vector_size=1536, iterations=500, dtype="float32", latency=0.002):
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(iterations, vector_size)).astype(np.float32).tolist()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        local = LocalVectorStore("bench", base_dir=base_dir, dtype=dtype)
+        local.ensure_collection(vector_size=vector_size)
+        vectors = rng.normal(size=(points, vector_size)).astype(np.float32)
+        local.upsert([
+            {"id": str(i), "vector": vector, "payload": {"context": f"context {i}"}}
+            for i, vector in enumerate(vectors)
+        ])
+        results = {
+            f"local_{dtype}": summarize_latencies(_time_searches(
+                lambda query: local.search(query, limit=3, score_threshold=0.0), queries)),
+        }
+
+    with FakeQdrantServer(latency=latency) as server:
+        transport = QdrantTransport(url=server.url, api_key="bench")
+        remote = QdrantVectorStore("bench", client=None, transport=transport)
+        results["remote_qdrant"] = summarize_latencies(_time_searches(
+            lambda query: remote.search(query, limit=3, score_threshold=0.0), queries))
+        transport.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated Qdrant latency in seconds")
+    args, _ = parser.parse_known_args()
+
+    results = run(points=args.points, iterations=args.iterations, dtype=args.dtype, latency=args.latency)
+    for name, stats in results.items():
+        print(f"{name:>14}: p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms mean={stats['mean_ms']}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,116 @@ class OpenAIConstants:
     DEFAULT_SIZE = "1024x1024"
     DEFAULT_QUALITY = "standard"
     DEFAULT_STYLE = "natural"
+    CACHED_INPUT_COST_MULTIPLIER = 0.5
 
 class AnthropicConstants:
-    DEFAULT_MAX_TOKENS = 8000
\ No newline at end of file
+    DEFAULT_MAX_TOKENS = 8000
+    CACHE_WRITE_COST_MULTIPLIER = 1.25
+    CACHE_READ_COST_MULTIPLIER = 0.1
+
+class EmbeddingConstants:
+    DEFAULT_MODEL = "text-embedding-ada-002"
+    VECTOR_SIZE = 1536
+    CACHE_ALIAS = "embeddings"
+    LOCAL_CACHE_MAX_SIZE = 2048
+    MAX_BATCH_TOKENS = 8000
+    MAX_BATCH_SIZE = 256
+    INGEST_CONCURRENCY = 4
+
+class VectorStoreConstants:
+    QDRANT = "qdrant"
+    LOCAL = "local"
+    LOCAL_SEARCH_CHUNK_ROWS = 4096
+
+class SemanticCacheConstants:
+    THRESHOLD = 0.97
+    TTL = 6 * 60 * 60
+    MAX_ENTRIES = 512
+    CACHE_HIT_STATUS = "CACHE_HIT"
+    GENERATION_CACHE_ALIAS = "default"
+
+class RetrievalConstants:
+    DENSE = "dense"
+    HYBRID = "hybrid"
+    RRF_K = 60
+    CANDIDATE_MULTIPLIER = 4
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+    SPARSE_MIN_SCORE = 0.25
+    SPARSE_INDEX_CHECK_INTERVAL = 5
+
+class ContextBudgetConstants:
+    MAX_INPUT_TOKENS = 12000
+    CONTEXT_TOKENS = 4000
+    HISTORY_TOKENS = 3000
+    MIN_CHUNK_TOKENS = 64
+
+class LLMConfigCacheConstants:
+    VERSION_KEY = "llm_config:version"
+    VERSION_CACHE_ALIAS = "default"
+    TTL = 5 * 60
+    VERSION_CHECK_INTERVAL = 2
+
+class RequestLogConstants:
+    BATCH_SIZE = 100
+    FLUSH_INTERVAL = 1.0
+    MAX_QUEUE_SIZE = 10000
+    ENQUEUE_TIMEOUT = 0.05
+    SPILL_FILE_NAME = "llm_request_log_spill.jsonl"
+
+class ResponseCacheConstants:
+    TTL = 60 * 60
+    MAX_ENTRIES = 256
+    CACHE_HIT_STATUS = "CACHE_HIT"
+
+class BatchConstants:
+    SUBMITTED = "submitted"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    EXPIRED = "expired"
+    FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED, EXPIRED)
+    REQUEST_TYPE = "batch"
+    DEFAULT_PRICE_MULTIPLIER = 0.5
+    MAX_REQUESTS = 50000
+    OPENAI_ENDPOINT = "/v1/chat/completions"
+    OPENAI_COMPLETION_WINDOW = "24h"
+    POLL_INTERVAL = 30
+
+class RateLimitConstants:
+    MAX_CONCURRENCY = 16
+    MIN_CONCURRENCY = 1
+    LATENCY_TARGET = 60.0
+    DECREASE_FACTOR = 0.5
+    DECREASE_INTERVAL = 1.0
+    MAX_RETRIES = 3
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 20.0
+    MAX_WAIT = 60.0
+
+class RoutingConstants:
+    WINDOW = 5 * 60
+    MAX_SAMPLES = 200
+    MIN_SAMPLES = 20
+    MAX_P95_LATENCY = 30.0
+    MAX_ERROR_RATE = 0.5
+    SIMPLE_MAX_CHARS = 0
+    HEDGE_MAX_WORKERS = 8
+
+class SingleFlightConstants:
+    CACHE_ALIAS = "default"
+    KEY_PREFIX = "single_flight"
+    WAIT_TIMEOUT = 30.0
+    POLL_INTERVAL = 0.05
+    RESULT_TTL = 5
+    EMBEDDING = "embedding"
+    VECTOR_SEARCH = "vector_search"
+    LLM = "llm"
+
+class EmbeddingBatchConstants:
+    WINDOW_MS = 5
+    MAX_SIZE = 64
+    MAX_CONCURRENCY = 8
+    TIMEOUT = 60.0
+    LATENCY_SAMPLES = 1000
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_vectorcollectionmanifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='llmrequestlog',
+            name='cache_read_tokens',
+            field=models.IntegerField(blank=True, default=0, null=True),
+        ),
+        migrations.AddField(
+            model_name='llmrequestlog',
+            name='cache_write_tokens',
+            field=models.IntegerField(blank=True, default=0, null=True),
+        ),
+    ]
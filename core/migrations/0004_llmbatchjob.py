@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_llmrequestlog_cache_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMBatchJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('config_name', models.CharField(max_length=255)),
+                ('llm_provider', models.CharField(max_length=255)),
+                ('model', models.CharField(blank=True, max_length=255, null=True)),
+                ('provider_batch_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('status', models.CharField(default='submitted', max_length=50)),
+                ('request_count', models.IntegerField(default=0)),
+                ('succeeded_count', models.IntegerField(default=0)),
+                ('failed_count', models.IntegerField(default=0)),
+                ('results_processed', models.BooleanField(default=False)),
+                ('total_cost', models.FloatField(default=0)),
+                ('meta_data', models.JSONField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'llm_batch_job',
+            },
+        ),
+    ]
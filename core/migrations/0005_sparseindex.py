@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_llmbatchjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SparseIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection_name', models.CharField(max_length=255, unique=True)),
+                ('documents', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'sparse_index',
+            },
+        ),
+    ]
@@ -29,6 +29,8 @@ class LLMRequestLog(models.Model):
     response_data = models.JSONField(default=dict)
     input_tokens = models.IntegerField(default=0, null=True, blank=True)
     output_tokens = models.IntegerField(default=0, null=True, blank=True)
+    cache_read_tokens = models.IntegerField(default=0, null=True, blank=True)
+    cache_write_tokens = models.IntegerField(default=0, null=True, blank=True)
     meta_data = models.JSONField(null=True, blank=True)
     status = models.CharField(max_length=255, null=True, blank=True)
     response_cost = models.FloatField(default=0)
@@ -52,4 +54,46 @@ class LLMInfo(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        db_table = 'llm_info'
\ No newline at end of file
+        db_table = 'llm_info'
+
+
+class VectorCollectionManifest(models.Model):
+    collection_name = models.CharField(max_length=255, unique=True)
+    point_ids = models.JSONField(default=list)
+    meta_data = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'vector_collection_manifest'
+
+
+class SparseIndex(models.Model):
+    collection_name = models.CharField(max_length=255, unique=True)
+    documents = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'sparse_index'
+
+
+class LLMBatchJob(models.Model):
+    user_id = models.CharField(max_length=255, null=True, blank=True)
+    config_name = models.CharField(max_length=255)
+    llm_provider = models.CharField(max_length=255)
+    model = models.CharField(max_length=255, null=True, blank=True)
+    provider_batch_id = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=50, default='submitted')
+    request_count = models.IntegerField(default=0)
+    succeeded_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+    results_processed = models.BooleanField(default=False)
+    total_cost = models.FloatField(default=0)
+    meta_data = models.JSONField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'llm_batch_job'
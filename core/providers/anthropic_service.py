@@ -1,6 +1,10 @@
-from core.constants import AnthropicConstants
+import re
+
+from django.conf import settings
+
+from core.constants import AnthropicConstants, BatchConstants
 from .llm_service import BaseLLMProvider
-from anthropic import Anthropic
+from core.services.client_registry import get_anthropic_client
 from rag_agent_backend.settings import env
 
 
@@ -8,23 +12,110 @@ class AnthropicProvider(BaseLLMProvider):
 
     def __init__(self, config_name):
         super().__init__(config_name)
-        self.client = Anthropic(api_key=env("ANTHROPIC_API_KEY"))
+        self.client = get_anthropic_client(env("ANTHROPIC_API_KEY"))
+        # Requests are retried by the rate limiter, which needs to see every 429 and 529 to adapt.
+        self.request_client = self.client.with_options(max_retries=0)
         self.provider = 'anthropic'
 
-    def _calculate_text_response_cost(self, llm_info, input_tokens, output_tokens):
+    @classmethod
+    def get_client_fingerprint(cls):
+        return (env("ANTHROPIC_API_KEY"),)
+
+    def _calculate_text_response_cost(self, llm_info, input_tokens, output_tokens, cache_read_tokens=0, cache_write_tokens=0):
+        """
+        :param input_tokens: int - Input tokens billed at the regular rate, i.e. not read from or written to the prompt cache.
+        :param cache_read_tokens: int - Input tokens read from the prompt cache.
+        :param cache_write_tokens: int - Input tokens written to the prompt cache.
+        """
         pricing = llm_info.pricing
 
         input_tokens_cost_per_k = pricing.get("input_tokens_cost_per_k", 0)
         output_tokens_cost_per_k = pricing.get("output_tokens_cost_per_k", 0)
+        cache_read_tokens_cost_per_k = pricing.get(
+            "cache_read_tokens_cost_per_k", input_tokens_cost_per_k * AnthropicConstants.CACHE_READ_COST_MULTIPLIER)
+        cache_write_tokens_cost_per_k = pricing.get(
+            "cache_write_tokens_cost_per_k", input_tokens_cost_per_k * AnthropicConstants.CACHE_WRITE_COST_MULTIPLIER)
 
         input_cost = (input_tokens / 1000) * input_tokens_cost_per_k
         output_cost = (output_tokens / 1000) * output_tokens_cost_per_k
+        cache_cost = (cache_read_tokens / 1000) * cache_read_tokens_cost_per_k \
+            + (cache_write_tokens / 1000) * cache_write_tokens_cost_per_k
 
-        total_cost = input_cost + output_cost
+        total_cost = input_cost + output_cost + cache_cost
 
         return total_cost
 
-    def get_text_response(self, model, user_prompt, system_prompt, max_completion_tokens, temperature, n, frequency_penalty, llm_info):
+    def _get_usage_and_cost(self, usage, llm_info):
+        """
+        Usage data and cost for an Anthropic ``usage`` object. ``input_tokens`` in the returned usage data
+        is the whole prompt, including cached tokens, as it is for OpenAI.
+        """
+        cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        input_tokens = usage.input_tokens + cache_read_tokens + cache_write_tokens
+        output_tokens = usage.output_tokens
+        usage_data = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "cache_read_tokens": cache_read_tokens,
+            "cache_write_tokens": cache_write_tokens
+        }
+
+        response_cost = self._calculate_text_response_cost(
+            input_tokens=usage.input_tokens, output_tokens=output_tokens, llm_info=llm_info,
+            cache_read_tokens=cache_read_tokens, cache_write_tokens=cache_write_tokens)
+        return usage_data, response_cost
+
+    @staticmethod
+    def _usage_tokens(response):
+        usage = response.usage
+        return usage.input_tokens + usage.output_tokens + (usage.cache_read_input_tokens or 0) \
+            + (usage.cache_creation_input_tokens or 0)
+
+    @staticmethod
+    def _cacheable_system(system_prompts):
+        """
+        The system prompt as text blocks, with an ephemeral cache breakpoint after the first one (the static
+        instructions), so repeated calls read it from Anthropic's prompt cache. Prompts shorter than the
+        model's minimum cacheable length are simply not cached.
+
+        :param system_prompts: str or list - The system prompt, or several system messages in order.
+        """
+        if isinstance(system_prompts, str):
+            system_prompts = [system_prompts]
+        system_prompts = [prompt for prompt in system_prompts if prompt]
+        if not system_prompts or not getattr(settings, "ANTHROPIC_PROMPT_CACHE_SYSTEM", True):
+            return "\n\n".join(system_prompts)
+
+        blocks = [{"type": "text", "text": prompt} for prompt in system_prompts]
+        blocks[0]["cache_control"] = {"type": "ephemeral"}
+        return blocks
+
+    @staticmethod
+    def _cacheable_messages(messages):
+        """
+        Put a cache breakpoint on the last message before the final turn, so the earlier conversation,
+        which is the same on every turn of a chat, is read from the prompt cache.
+        """
+        if len(messages) < 2 or not getattr(settings, "ANTHROPIC_PROMPT_CACHE_HISTORY", True):
+            return messages
+
+        messages = list(messages)
+        stable = dict(messages[-2])
+        content = stable.get("content")
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        elif isinstance(content, list) and content:
+            content = [dict(block) for block in content]
+        else:
+            return messages
+        content[-1]["cache_control"] = {"type": "ephemeral"}
+        stable["content"] = content
+        messages[-2] = stable
+        return messages
+
+    def get_text_response(self, model, user_prompt, system_prompt, max_completion_tokens, temperature, n, frequency_penalty, llm_info, meta_data=None):
 
         max_completion_tokens = max_completion_tokens \
             if max_completion_tokens < AnthropicConstants.DEFAULT_MAX_TOKENS else AnthropicConstants.DEFAULT_MAX_TOKENS
@@ -39,32 +130,27 @@ class AnthropicProvider(BaseLLMProvider):
         }
         response_cost = 0
         try:
-            response = self.client.messages.create(
-                model=model,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=max_completion_tokens,
-                temperature=temperature
+            response = self.get_rate_limiter(model).call(
+                lambda: self.request_client.messages.create(
+                    model=model,
+                    system=self._cacheable_system(system_prompt),
+                    messages=[
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    max_tokens=max_completion_tokens,
+                    temperature=temperature
+                ),
+                tokens=self.estimate_tokens(system_prompt, user_prompt),
+                usage_tokens=self._usage_tokens
             )
 
-            input_tokens = response.usage.input_tokens
-            output_tokens = response.usage.output_tokens
-            usage_data = {
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "total_tokens": input_tokens + output_tokens
-            }
-
-            response_cost = self._calculate_text_response_cost(input_tokens=input_tokens, output_tokens=output_tokens, llm_info=llm_info)
+            usage_data, response_cost = self._get_usage_and_cost(response.usage, llm_info)
 
             self.log_response(model=model, config_name=self.config_name, request_type='text', request_data=request_data,
-                              response_data=response.to_dict(), usage_data=usage_data, status="SUCCESS", response_cost=response_cost)
-
-            self.publish_llm_event(config_name=self.config_name,usage_data=usage_data, response_cost=response_cost)
+                              response_data=response.to_dict(), usage_data=usage_data, status="SUCCESS", response_cost=response_cost,
+                              meta_data=meta_data)
 
-            return response
+            return [content.text for content in response.content]
 
 
         except Exception as e:
@@ -77,11 +163,12 @@ class AnthropicProvider(BaseLLMProvider):
                 response_data={"error": str(e)},
                 response_cost=response_cost,
                 usage_data={},
-                status="FAILURE"
+                status="FAILURE",
+                meta_data=meta_data
             )
 
 
-    def get_text_response_from_context(self, model, messages, max_completion_tokens, temperature, n, frequency_penalty, llm_info):
+    def get_text_response_from_context(self, model, messages, max_completion_tokens, temperature, n, frequency_penalty, llm_info, meta_data=None):
 
         max_completion_tokens = max_completion_tokens \
             if max_completion_tokens < AnthropicConstants.DEFAULT_MAX_TOKENS else AnthropicConstants.DEFAULT_MAX_TOKENS
@@ -95,44 +182,258 @@ class AnthropicProvider(BaseLLMProvider):
         }
         response_cost = 0
 
-        system_prompt = ""
+        system_prompts, filtered_messages = self._split_system_prompt(messages)
+        try:
+            response = self.get_rate_limiter(model).call(
+                lambda: self.request_client.messages.create(
+                    model=model,
+                    messages=self._cacheable_messages(filtered_messages),
+                    system=self._cacheable_system(system_prompts),
+                    max_tokens=max_completion_tokens,
+                    temperature=temperature,
+                ),
+                tokens=self.estimate_tokens(messages),
+                usage_tokens=self._usage_tokens
+            )
+
+            usage_data, response_cost = self._get_usage_and_cost(response.usage, llm_info)
+
+            self.log_response(model=model, config_name=self.config_name, request_type='text', request_data=request_data,
+                              response_data=response.to_dict(), usage_data=usage_data, status="SUCCESS", response_cost=response_cost,
+                              meta_data=meta_data)
+
+            return [content.text for content in response.content]
+
+
+        except Exception as e:
+
+            self.log_response(
+                model=model,
+                config_name=self.config_name,
+                request_type='text',
+                request_data=request_data,
+                response_data={"error": str(e)},
+                response_cost=response_cost,
+                usage_data={},
+                status="FAILURE",
+                meta_data=meta_data
+            )
+
+
+    def get_text_stream_from_context(self, model, messages, max_completion_tokens, temperature, frequency_penalty, llm_info, meta_data=None):
+
+        max_completion_tokens = max_completion_tokens \
+            if max_completion_tokens < AnthropicConstants.DEFAULT_MAX_TOKENS else AnthropicConstants.DEFAULT_MAX_TOKENS
+
+        request_data = {
+            "messages": messages,
+            "max_completion_tokens": max_completion_tokens,
+            "temperature": temperature,
+            "n": 1,
+            "frequency_penalty": frequency_penalty,
+            "stream": True
+        }
+        parts = []
+        final_message = None
+        status = "CANCELLED"
+        rate_limiter = self.get_rate_limiter(model)
+        reserved_tokens = self.estimate_tokens(messages)
+
+        system_prompts, filtered_messages = self._split_system_prompt(messages)
+        try:
+            # The slot is held for the whole stream; a stream is not retried once it has started.
+            with rate_limiter.slot(tokens=reserved_tokens), self.request_client.messages.stream(
+                model=model,
+                messages=self._cacheable_messages(filtered_messages),
+                system=self._cacheable_system(system_prompts),
+                max_tokens=max_completion_tokens,
+                temperature=temperature,
+            ) as stream:
+                for text in stream.text_stream:
+                    parts.append(text)
+                    yield text
+                final_message = stream.get_final_message()
+            status = "SUCCESS"
+
+        except Exception as e:
+            status = "FAILURE"
+            self.log_response(
+                model=model,
+                config_name=self.config_name,
+                request_type='text',
+                request_data=request_data,
+                response_data={"error": str(e), "content": "".join(parts)},
+                response_cost=0,
+                usage_data={},
+                status=status,
+                meta_data=meta_data
+            )
+            raise
+
+        finally:
+            if status != "FAILURE":
+                usage_data = {}
+                response_cost = 0
+                response_data = {"content": "".join(parts)}
+                if final_message is not None:
+                    usage_data, response_cost = self._get_usage_and_cost(final_message.usage, llm_info)
+                    rate_limiter.settle_tokens(reserved_tokens, self._usage_tokens(final_message))
+                    response_data = final_message.to_dict()
+
+                self.log_response(model=model, config_name=self.config_name, request_type='text', request_data=request_data,
+                                  response_data=response_data, usage_data=usage_data, status=status,
+                                  response_cost=response_cost, meta_data=meta_data)
+
+    @staticmethod
+    def _split_system_prompt(messages):
+        """
+        Anthropic takes the system prompt as a separate argument rather than as a message.
+
+        :return: tuple - The contents of the system messages in order, and the remaining messages.
+        """
+        system_prompts = []
         filtered_messages = []
 
         for message in messages:
             if message.get('role') == 'system':
-                system_prompt = message.get('content', "")
+                system_prompts.append(message.get('content', ""))
             else:
                 filtered_messages.append(message)
+        return system_prompts, filtered_messages
+
+    def get_image_response(self, model, prompt, size, style, quality, n, llm_info):
+        raise NotImplementedError("Anthropic does not offer image generation; use an OpenAI configuration.")
+
+    @staticmethod
+    def _image_source(image_url):
+        """
+        Anthropic image source for an ``https://`` URL or a ``data:<media type>;base64,`` URL.
+        """
+        match = re.match(r"^data:(?P<media_type>[\w/+.-]+);base64,(?P<data>.+)$", image_url, re.DOTALL)
+        if match:
+            return {"type": "base64", "media_type": match.group("media_type"), "data": match.group("data")}
+        return {"type": "url", "url": image_url}
+
+    def get_image_analysis(self, model, user_prompt, image_url, max_completion_tokens, temperature, n, frequency_penalty, llm_info=None):
+
+        max_completion_tokens = max_completion_tokens \
+            if max_completion_tokens < AnthropicConstants.DEFAULT_MAX_TOKENS else AnthropicConstants.DEFAULT_MAX_TOKENS
+
+        request_data = {
+            "user_prompt": user_prompt,
+            "max_completion_tokens": max_completion_tokens,
+            "temperature": temperature,
+            "n": n,
+            "frequency_penalty": frequency_penalty
+        }
+        response_cost = 0
         try:
-            response = self.client.messages.create(
+            response = self.get_rate_limiter(model).call(
+                lambda: self.request_client.messages.create(
+                    model=model,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "image", "source": self._image_source(image_url)},
+                                {"type": "text", "text": user_prompt},
+                            ],
+                        }
+                    ],
+                    max_tokens=max_completion_tokens,
+                    temperature=temperature
+                ),
+                tokens=self.estimate_tokens(user_prompt),
+                usage_tokens=self._usage_tokens
+            )
+
+            usage_data = {}
+            if llm_info is not None:
+                usage_data, response_cost = self._get_usage_and_cost(response.usage, llm_info)
+
+            self.log_response(model=model, config_name=self.config_name, request_type='text', request_data=request_data,
+                              response_data=response.to_dict(), usage_data=usage_data, status="SUCCESS",
+                              response_cost=response_cost)
+
+            return [content.text for content in response.content if content.type == "text"]
+
+        except Exception as e:
+
+            self.log_response(
                 model=model,
-                messages=filtered_messages,
-                system=system_prompt,
-                max_tokens=max_completion_tokens,
-                temperature=temperature,
+                config_name=self.config_name,
+                request_type='text',
+                request_data=request_data,
+                response_data={"error": str(e)},
+                response_cost=response_cost,
+                usage_data={},
+                status="FAILURE"
             )
 
-            input_tokens = response.usage.input_tokens
-            output_tokens = response.usage.output_tokens
-            usage_data = {
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "total_tokens": input_tokens + output_tokens
+    @staticmethod
+    def _structured_output_tool(response_format):
+        """
+        A tool whose input schema is the response schema. ``response_format`` is a pydantic model or a
+        ``json_schema`` response format such as ``StructuredOutputSchema.response_format``.
+        """
+        if isinstance(response_format, dict):
+            json_schema = response_format["json_schema"]
+            return {
+                "name": json_schema["name"],
+                "description": json_schema.get("description") or f"Return the answer as {json_schema['name']}.",
+                "input_schema": json_schema["schema"],
             }
+        return {
+            "name": response_format.__name__,
+            "description": f"Return the answer as {response_format.__name__}.",
+            "input_schema": response_format.model_json_schema(),
+        }
 
-            response_cost = self._calculate_text_response_cost(input_tokens=input_tokens, output_tokens=output_tokens, llm_info=llm_info)
+    def get_structured_output(self, model, user_prompt, system_prompt, response_format, max_completion_tokens, temperature, n, frequency_penalty, llm_info, meta_data=None):
+        """
+        Structured output through forced tool use: the schema is offered as the only tool and the model is
+        required to call it, so the tool input is the structured answer (see ``parse_structured_output``).
+        """
 
-            self.log_response(model=model, config_name=self.config_name, request_type='text', request_data=request_data,
-                              response_data=response.to_dict(), usage_data=usage_data, status="SUCCESS", response_cost=response_cost)
+        max_completion_tokens = max_completion_tokens \
+            if max_completion_tokens < AnthropicConstants.DEFAULT_MAX_TOKENS else AnthropicConstants.DEFAULT_MAX_TOKENS
 
-            self.publish_llm_event(config_name=self.config_name,usage_data=usage_data, response_cost=response_cost)
+        request_data = {
+            "user_prompt": user_prompt,
+            "system_prompt": system_prompt,
+            "max_completion_tokens": max_completion_tokens,
+            "temperature": temperature,
+            "n": n,
+            "frequency_penalty": frequency_penalty
+        }
+        response_cost = 0
+        tool = self._structured_output_tool(response_format)
+        try:
+            response = self.get_rate_limiter(model).call(
+                lambda: self.request_client.messages.create(
+                    model=model,
+                    system=self._cacheable_system(system_prompt),
+                    messages=[
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    tools=[tool],
+                    tool_choice={"type": "tool", "name": tool["name"]},
+                    max_tokens=max_completion_tokens,
+                    temperature=temperature
+                ),
+                tokens=self.estimate_tokens(system_prompt, user_prompt, tool),
+                usage_tokens=self._usage_tokens
+            )
 
+            usage_data, response_cost = self._get_usage_and_cost(response.usage, llm_info)
 
-            return [content.text for content in response.content]
+            self.log_response(model=model, config_name=self.config_name, request_type='text', request_data=request_data,
+                              response_data=response.to_dict(), usage_data=usage_data, response_cost=response_cost, status="SUCCESS",
+                              meta_data=meta_data)
 
+            return response
 
         except Exception as e:
-
             self.log_response(
                 model=model,
                 config_name=self.config_name,
@@ -141,15 +442,53 @@ class AnthropicProvider(BaseLLMProvider):
                 response_data={"error": str(e)},
                 response_cost=response_cost,
                 usage_data={},
-                status="FAILURE"
+                status="FAILURE",
+                meta_data=meta_data
             )
 
+    def submit_batch(self, model, requests, max_completion_tokens, temperature, frequency_penalty):
+        max_completion_tokens = max_completion_tokens \
+            if max_completion_tokens < AnthropicConstants.DEFAULT_MAX_TOKENS else AnthropicConstants.DEFAULT_MAX_TOKENS
 
-    def get_image_response(self, model, prompt, size, style, quality, n, llm_info):
-        pass
-
-    def get_image_analysis(self, model, user_prompt, image_url, max_completion_tokens, temperature, n, frequency_penalty):
-        pass
+        batch_requests = []
+        for request in requests:
+            system_prompts, filtered_messages = self._split_system_prompt(request["messages"])
+            batch_requests.append({
+                "custom_id": request["custom_id"],
+                "params": {
+                    "model": model,
+                    "messages": self._cacheable_messages(filtered_messages),
+                    "system": self._cacheable_system(system_prompts),
+                    "max_tokens": max_completion_tokens,
+                    "temperature": temperature,
+                },
+            })
+
+        batch = self.client.messages.batches.create(requests=batch_requests)
+        return batch.id
+
+    def get_batch_status(self, batch_id):
+        batch = self.client.messages.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "status": BatchConstants.COMPLETED if batch.processing_status == "ended" else BatchConstants.IN_PROGRESS,
+            "succeeded": counts.succeeded,
+            "failed": counts.errored + counts.canceled + counts.expired,
+        }
 
-    def get_structured_output(self, model, user_prompt, system_prompt, response_format, max_completion_tokens, temperature, n, frequency_penalty, llm_info):
-        pass
\ No newline at end of file
+    def get_batch_results(self, batch_id, llm_info):
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type != "succeeded":
+                yield self._batch_failure(entry.custom_id, entry.result.to_dict())
+                continue
+
+            message = entry.result.message
+            usage_data, response_cost = self._get_usage_and_cost(message.usage, llm_info)
+            yield {
+                "custom_id": entry.custom_id,
+                "status": "SUCCESS",
+                "content": "".join(block.text for block in message.content if block.type == "text"),
+                "usage_data": usage_data,
+                "response_cost": self._apply_batch_price(llm_info, response_cost),
+                "response_data": message.to_dict(),
+            }
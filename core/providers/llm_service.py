@@ -1,7 +1,18 @@
+import json
 from abc import ABC, abstractmethod
 
+from django.conf import settings
+
 from authenticator.thread_container import ThreadContainer
+from core.constants import BatchConstants, OpenAIConstants
 from core.models import LLMRequestLog
+from core.services.rate_limiter import LLMRateLimiter, llm_rate_limiters
+from core.services.request_log_writer import llm_request_log_writer
+
+
+class LLMProviderError(Exception):
+    """Raised when a provider request fails after all retries"""
+    pass
 
 
 class BaseLLMProvider(ABC):
@@ -9,6 +20,28 @@ class BaseLLMProvider(ABC):
     def __init__(self, config_name):
         self.config_name = config_name
 
+    @classmethod
+    def get_client_fingerprint(cls) -> tuple:
+        """
+        The credentials and settings a provider instance is built from. ``LLMInterface`` shares one
+        instance per configuration and rebuilds it when this changes.
+        """
+        return ()
+
+    def get_rate_limiter(self, model) -> LLMRateLimiter:
+        """
+        The limiter shared by every request to this provider and model in the process.
+        """
+        return llm_rate_limiters.get(self.provider, model)
+
+    @staticmethod
+    def estimate_tokens(*contents) -> int:
+        """
+        Rough prompt size used to reserve rate limit budget before the real usage is known.
+        """
+        text = "".join(content if isinstance(content, str) else json.dumps(content, default=str) for content in contents)
+        return len(text) // OpenAIConstants.TOKEN_MULTIPLIER
+
     @abstractmethod
     def get_text_response(self, **kwargs):
         pass
@@ -17,6 +50,15 @@ class BaseLLMProvider(ABC):
     def get_text_response_from_context(self, **kwargs):
         pass
 
+    @abstractmethod
+    def get_text_stream_from_context(self, **kwargs):
+        """
+        Like ``get_text_response_from_context`` for a single choice, but yields text deltas as they arrive.
+        The request is logged with its usage and cost once the stream completes, or with status
+        ``CANCELLED`` if the consumer stops early. Errors are logged and re-raised.
+        """
+        pass
+
     @abstractmethod
     def get_image_response(self, **kwargs):
         pass
@@ -29,7 +71,52 @@ class BaseLLMProvider(ABC):
     def get_structured_output(self, **kwargs):
         pass
 
-    def log_response(self, model, config_name, request_type, request_data, response_data, response_cost, usage_data, status):
+    def submit_batch(self, model, requests, max_completion_tokens, temperature, frequency_penalty):
+        """
+        Submit chat requests as one provider batch job.
+
+        :param model: str - The model used for every request.
+        :param requests: list - ``{"custom_id": ..., "messages": [...]}`` dicts.
+        :return: str - The provider's id for the batch.
+        """
+        raise NotImplementedError(f"Provider '{self.provider}' does not support batch requests.")
+
+    def get_batch_status(self, batch_id):
+        """
+        :param batch_id: str - The provider's id for the batch.
+        :return: dict - ``status`` (one of the ``BatchConstants`` statuses) and the ``succeeded`` and ``failed`` request counts.
+        """
+        raise NotImplementedError(f"Provider '{self.provider}' does not support batch requests.")
+
+    def get_batch_results(self, batch_id, llm_info):
+        """
+        :param batch_id: str - The provider's id for a finished batch.
+        :param llm_info: LLMInfo - Pricing for the batch's model.
+        :return: Iterator[dict] - One dict per request with ``custom_id``, ``status`` (SUCCESS or FAILURE), ``content``,
+            ``usage_data``, ``response_cost`` (batch price applied) and ``response_data``.
+        """
+        raise NotImplementedError(f"Provider '{self.provider}' does not support batch requests.")
+
+    @staticmethod
+    def _apply_batch_price(llm_info, response_cost):
+        """
+        ``pricing["batch_price_multiplier"]`` is the share of the regular price a batch request costs, e.g. 0.5.
+        """
+        return response_cost * llm_info.pricing.get("batch_price_multiplier", BatchConstants.DEFAULT_PRICE_MULTIPLIER)
+
+    @staticmethod
+    def _batch_failure(custom_id, error):
+        return {
+            "custom_id": custom_id,
+            "status": "FAILURE",
+            "content": None,
+            "usage_data": {},
+            "response_cost": 0,
+            "response_data": {"error": error},
+        }
+
+    def log_response(self, model, config_name, request_type, request_data, response_data, response_cost, usage_data, status,
+                     meta_data=None):
         """
         Log the response data of an LLM request for tracking and analysis.
 
@@ -41,22 +128,71 @@ class BaseLLMProvider(ABC):
         :param response_cost: float - The cost associated with the response.
         :param usage_data: dict - The token usage data, including input and output tokens.
         :param status: str - The status of the request (e.g., 'success', 'failure').
+        :param meta_data: dict, optional - Extra data about the request, such as cache or prompt statistics.
         :return: None - This method does not return a value.
         :raises Exception: If there is an error while logging the response.
         """
 
-        user_id = ThreadContainer.get_current_user_id()
-        LLMRequestLog.objects.create(
-            request_model=model,
-            config_name = config_name,
-            request_type = request_type,
-            request_data = request_data,
-            response_data = response_data,
-            input_tokens = usage_data.get("input_tokens", 0),
-            output_tokens = usage_data.get("output_tokens", 0),
+        log_llm_request(
+            model=model,
+            config_name=config_name,
+            request_type=request_type,
+            request_data=request_data,
+            response_data=response_data,
             response_cost=response_cost,
-            user_id = user_id,
-            status = status,
+            usage_data=usage_data,
+            status=status,
+            meta_data=meta_data,
         )
 
 
+def log_llm_request(model, config_name, request_type, request_data, response_data, response_cost, usage_data, status,
+                    meta_data=None, user_id=None):
+    """
+    Write an ``LLMRequestLog`` entry for the current user. Used by providers and by callers that answer
+    without reaching a provider, such as caches, so cost reporting covers every request.
+    With ``LLM_REQUEST_LOG_ASYNC`` the entry is queued for the background batch writer instead.
+    ``user_id`` defaults to the current user.
+    """
+
+    user_id = user_id or ThreadContainer.get_current_user_id()
+    record = dict(
+        request_model=model,
+        config_name = config_name,
+        request_type = request_type,
+        request_data = request_data,
+        response_data = response_data,
+        input_tokens = usage_data.get("input_tokens", 0),
+        output_tokens = usage_data.get("output_tokens", 0),
+        cache_read_tokens = usage_data.get("cache_read_tokens", 0),
+        cache_write_tokens = usage_data.get("cache_write_tokens", 0),
+        response_cost=response_cost,
+        user_id = user_id,
+        status = status,
+        meta_data = meta_data,
+    )
+
+    if getattr(settings, "LLM_REQUEST_LOG_ASYNC", False):
+        llm_request_log_writer.write(record)
+    else:
+        LLMRequestLog.objects.create(**record)
+
+
+def parse_structured_output(response) -> dict:
+    """
+    The structured data in a provider's ``get_structured_output`` response: the JSON message content of an
+    OpenAI completion, or the input of the forced tool call in an Anthropic message.
+
+    :raises LLMProviderError: If the response holds no structured data, e.g. the model refused.
+    """
+    choices = getattr(response, "choices", None)
+    if choices:
+        message = choices[0].message
+        if not message.content:
+            raise LLMProviderError(f"No structured output in the response: {getattr(message, 'refusal', None) or 'empty content'}")
+        return json.loads(message.content)
+
+    for block in getattr(response, "content", None) or ():
+        if getattr(block, "type", None) == "tool_use":
+            return block.input
+    raise LLMProviderError("No structured output in the response")
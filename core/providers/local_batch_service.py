@@ -0,0 +1,126 @@
+import json
+import os
+import uuid
+
+from django.conf import settings
+
+from core.constants import BatchConstants, OpenAIConstants
+from .llm_service import BaseLLMProvider, LLMProviderError
+
+
+class LocalBatchProvider(BaseLLMProvider):
+    """
+    File-based stand-in for the provider batch APIs, for tests and local development. It is only registered
+    as provider ``local`` with ``LOCAL_BATCH_PROVIDER_ENABLED``.
+
+    ``submit_batch`` writes the requests to ``LOCAL_BATCH_DIR/<batch id>/requests.jsonl``. The batch completes
+    on its first status check, when every request is answered by echoing its last user message into
+    ``results.jsonl``. Requests without a user message fail. Token counts are character-based estimates.
+    """
+
+    def __init__(self, config_name):
+        super().__init__(config_name)
+        self.base_dir = getattr(settings, "LOCAL_BATCH_DIR", os.path.join(settings.BASE_DIR, ".cache", "batches"))
+        self.provider = 'local'
+
+    def _calculate_text_response_cost(self, llm_info, input_tokens, output_tokens):
+        pricing = llm_info.pricing
+
+        input_tokens_cost_per_k = pricing.get("input_tokens_cost_per_k", 0)
+        output_tokens_cost_per_k = pricing.get("output_tokens_cost_per_k", 0)
+
+        input_cost = (input_tokens / 1000) * input_tokens_cost_per_k
+        output_cost = (output_tokens / 1000) * output_tokens_cost_per_k
+
+        return input_cost + output_cost
+
+    @staticmethod
+    def _count_tokens(text):
+        return -(-len(text) // OpenAIConstants.TOKEN_MULTIPLIER)
+
+    def _path(self, batch_id, name):
+        return os.path.join(self.base_dir, batch_id, name)
+
+    def submit_batch(self, model, requests, max_completion_tokens, temperature, frequency_penalty):
+        batch_id = f"local-batch-{uuid.uuid4().hex}"
+        os.makedirs(os.path.join(self.base_dir, batch_id))
+        with open(self._path(batch_id, "requests.jsonl"), "w") as f:
+            for request in requests:
+                f.write(json.dumps(dict(request, model=model)) + "\n")
+        return batch_id
+
+    def get_batch_status(self, batch_id):
+        results_path = self._path(batch_id, "results.jsonl")
+        if not os.path.exists(results_path):
+            self._run_batch(batch_id)
+
+        succeeded = failed = 0
+        with open(results_path) as f:
+            for line in f:
+                if json.loads(line).get("content") is not None:
+                    succeeded += 1
+                else:
+                    failed += 1
+        return {"status": BatchConstants.COMPLETED, "succeeded": succeeded, "failed": failed}
+
+    def _run_batch(self, batch_id):
+        results = []
+        with open(self._path(batch_id, "requests.jsonl")) as f:
+            for line in f:
+                request = json.loads(line)
+                user_messages = [message["content"] for message in request["messages"] if message.get("role") == "user"]
+                results.append({
+                    "custom_id": request["custom_id"],
+                    "model": request["model"],
+                    "content": user_messages[-1] if user_messages else None,
+                    "input_tokens": sum(self._count_tokens(str(message.get("content", ""))) for message in request["messages"]),
+                })
+
+        tmp_path = self._path(batch_id, "results.jsonl.tmp")
+        with open(tmp_path, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+        os.replace(tmp_path, self._path(batch_id, "results.jsonl"))
+
+    def get_batch_results(self, batch_id, llm_info):
+        with open(self._path(batch_id, "results.jsonl")) as f:
+            for line in f:
+                result = json.loads(line)
+                if result["content"] is None:
+                    yield self._batch_failure(result["custom_id"], "Request has no user message")
+                    continue
+
+                input_tokens = result["input_tokens"]
+                output_tokens = self._count_tokens(result["content"])
+                response_cost = self._calculate_text_response_cost(
+                    llm_info=llm_info, input_tokens=input_tokens, output_tokens=output_tokens)
+                yield {
+                    "custom_id": result["custom_id"],
+                    "status": "SUCCESS",
+                    "content": result["content"],
+                    "usage_data": {
+                        "input_tokens": input_tokens,
+                        "output_tokens": output_tokens,
+                        "total_tokens": input_tokens + output_tokens
+                    },
+                    "response_cost": self._apply_batch_price(llm_info, response_cost),
+                    "response_data": result,
+                }
+
+    def get_text_response(self, **kwargs):
+        raise LLMProviderError("The local provider only supports batch requests.")
+
+    def get_text_response_from_context(self, **kwargs):
+        raise LLMProviderError("The local provider only supports batch requests.")
+
+    def get_text_stream_from_context(self, **kwargs):
+        raise LLMProviderError("The local provider only supports batch requests.")
+
+    def get_image_response(self, **kwargs):
+        raise LLMProviderError("The local provider only supports batch requests.")
+
+    def get_image_analysis(self, **kwargs):
+        raise LLMProviderError("The local provider only supports batch requests.")
+
+    def get_structured_output(self, **kwargs):
+        raise LLMProviderError("The local provider only supports batch requests.")
@@ -1,6 +1,11 @@
+import json
+
+from openai.types.chat import ChatCompletion
+
 from .llm_service import BaseLLMProvider
-from openai import OpenAI
 
+from core.constants import BatchConstants, OpenAIConstants
+from core.services.client_registry import get_openai_client
 from rag_agent_backend.settings import env
 
 
@@ -8,22 +13,57 @@ class OpenAIProvider(BaseLLMProvider):
 
     def __init__(self, config_name):
         super().__init__(config_name)
-        self.client = OpenAI(api_key=env('OPENAI_API_KEY'))
+        self.client = get_openai_client(env('OPENAI_API_KEY'))
+        # Requests are retried by the rate limiter, which needs to see every 429 to adapt.
+        self.request_client = self.client.with_options(max_retries=0)
         self.provider = 'openai'
 
-    def _calculate_text_response_cost(self, llm_info, input_tokens, output_tokens):
+    @classmethod
+    def get_client_fingerprint(cls):
+        return (env('OPENAI_API_KEY'),)
+
+    def _calculate_text_response_cost(self, llm_info, input_tokens, output_tokens, cached_tokens=0):
+        """
+        :param input_tokens: int - All prompt tokens, including ``cached_tokens``.
+        :param cached_tokens: int - Prompt tokens served from OpenAI's prompt cache, billed at the cached input rate.
+        """
         pricing = llm_info.pricing
 
         input_tokens_cost_per_k = pricing.get("input_tokens_cost_per_k", 0)
         output_tokens_cost_per_k = pricing.get("output_tokens_cost_per_k", 0)
+        cached_input_tokens_cost_per_k = pricing.get(
+            "cached_input_tokens_cost_per_k", input_tokens_cost_per_k * OpenAIConstants.CACHED_INPUT_COST_MULTIPLIER)
 
-        input_cost = (input_tokens / 1000) * input_tokens_cost_per_k
+        input_cost = ((input_tokens - cached_tokens) / 1000) * input_tokens_cost_per_k \
+            + (cached_tokens / 1000) * cached_input_tokens_cost_per_k
         output_cost = (output_tokens / 1000) * output_tokens_cost_per_k
 
         total_cost = input_cost + output_cost
 
         return total_cost
 
+    def _get_usage_and_cost(self, usage, llm_info):
+        """
+        Usage data and cost for an OpenAI ``usage`` object, with prompt-cache hits as ``cache_read_tokens``.
+        """
+        input_tokens = usage.prompt_tokens
+        output_tokens = usage.completion_tokens
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+        usage_data = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "cache_read_tokens": cached_tokens
+        }
+
+        response_cost = self._calculate_text_response_cost(
+            input_tokens=input_tokens, output_tokens=output_tokens, llm_info=llm_info, cached_tokens=cached_tokens)
+        return usage_data, response_cost
+
+    @staticmethod
+    def _usage_tokens(response):
+        return response.usage.total_tokens if response.usage else None
+
     def _calculate_image_response_cost(self, llm_info, n, quality, size):
         pricing = llm_info.pricing
 
@@ -38,7 +78,7 @@ class OpenAIProvider(BaseLLMProvider):
         total_cost = n * price_per_image
         return total_cost
 
-    def get_text_response(self, model, user_prompt, system_prompt, max_completion_tokens, temperature, n, frequency_penalty, llm_info):
+    def get_text_response(self, model, user_prompt, system_prompt, max_completion_tokens, temperature, n, frequency_penalty, llm_info, meta_data=None):
 
         request_data = {
             "user_prompt": user_prompt,
@@ -50,31 +90,27 @@ class OpenAIProvider(BaseLLMProvider):
         }
         response_cost = 0
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_completion_tokens=max_completion_tokens,
-                temperature=temperature,
-                frequency_penalty=frequency_penalty,
-                n=n,
+            response = self.get_rate_limiter(model).call(
+                lambda: self.request_client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    max_completion_tokens=max_completion_tokens,
+                    temperature=temperature,
+                    frequency_penalty=frequency_penalty,
+                    n=n,
+                ),
+                tokens=self.estimate_tokens(system_prompt, user_prompt),
+                usage_tokens=self._usage_tokens
             )
 
-            input_tokens = response.usage.prompt_tokens
-            output_tokens = response.usage.completion_tokens
-            total_tokens = input_tokens + output_tokens
-            usage_data = {
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "total_tokens": total_tokens
-            }
-
-            response_cost = self._calculate_text_response_cost(input_tokens=input_tokens, output_tokens=output_tokens, llm_info=llm_info)
+            usage_data, response_cost = self._get_usage_and_cost(response.usage, llm_info)
 
             self.log_response(model=model, config_name=self.config_name, request_type='text', request_data=request_data,
-                              response_data=response.to_dict(), usage_data=usage_data, status="SUCCESS", response_cost=response_cost)
+                              response_data=response.to_dict(), usage_data=usage_data, status="SUCCESS", response_cost=response_cost,
+                              meta_data=meta_data)
 
 
             return [choice.message.content for choice in response.choices]
@@ -90,10 +126,11 @@ class OpenAIProvider(BaseLLMProvider):
                 response_data={"error": str(e)},
                 response_cost=response_cost,
                 usage_data={},
-                status="FAILURE"
+                status="FAILURE",
+                meta_data=meta_data
             )
 
-    def get_text_response_from_context(self, model, messages, max_completion_tokens, temperature, n, frequency_penalty, llm_info):
+    def get_text_response_from_context(self, model, messages, max_completion_tokens, temperature, n, frequency_penalty, llm_info, meta_data=None):
 
         request_data = {
             "messages": messages,
@@ -105,28 +142,24 @@ class OpenAIProvider(BaseLLMProvider):
         response_cost = 0
 
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_completion_tokens=max_completion_tokens,
-                temperature=temperature,
-                frequency_penalty=frequency_penalty,
-                n=n,
+            response = self.get_rate_limiter(model).call(
+                lambda: self.request_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_completion_tokens=max_completion_tokens,
+                    temperature=temperature,
+                    frequency_penalty=frequency_penalty,
+                    n=n,
+                ),
+                tokens=self.estimate_tokens(messages),
+                usage_tokens=self._usage_tokens
             )
 
-            input_tokens = response.usage.prompt_tokens
-            output_tokens = response.usage.completion_tokens
-            total_tokens = input_tokens + output_tokens
-            usage_data = {
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "total_tokens": total_tokens
-            }
-
-            response_cost = self._calculate_text_response_cost(input_tokens=input_tokens, output_tokens=output_tokens, llm_info=llm_info)
+            usage_data, response_cost = self._get_usage_and_cost(response.usage, llm_info)
 
             self.log_response(model=model, config_name=self.config_name, request_type='text', request_data=request_data,
-                              response_data=response.to_dict(), usage_data=usage_data, status="SUCCESS", response_cost=response_cost)
+                              response_data=response.to_dict(), usage_data=usage_data, status="SUCCESS", response_cost=response_cost,
+                              meta_data=meta_data)
 
 
             return [choice.message.content for choice in response.choices]
@@ -142,10 +175,85 @@ class OpenAIProvider(BaseLLMProvider):
                 response_data={"error": str(e)},
                 response_cost=response_cost,
                 usage_data={},
-                status="FAILURE"
+                status="FAILURE",
+                meta_data=meta_data
             )
 
 
+    def get_text_stream_from_context(self, model, messages, max_completion_tokens, temperature, frequency_penalty, llm_info, meta_data=None):
+
+        request_data = {
+            "messages": messages,
+            "max_completion_tokens": max_completion_tokens,
+            "temperature": temperature,
+            "n": 1,
+            "frequency_penalty": frequency_penalty,
+            "stream": True
+        }
+        parts = []
+        usage = None
+        finish_reason = None
+        response_id = None
+        stream = None
+        status = "CANCELLED"
+        rate_limiter = self.get_rate_limiter(model)
+        reserved_tokens = self.estimate_tokens(messages)
+
+        try:
+            # The slot is held for the whole stream; a stream is not retried once it has started.
+            with rate_limiter.slot(tokens=reserved_tokens):
+                stream = self.request_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_completion_tokens=max_completion_tokens,
+                    temperature=temperature,
+                    frequency_penalty=frequency_penalty,
+                    n=1,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+
+                for chunk in stream:
+                    response_id = chunk.id
+                    if chunk.usage:
+                        usage = chunk.usage
+                    for choice in chunk.choices:
+                        if choice.finish_reason:
+                            finish_reason = choice.finish_reason
+                        if choice.delta and choice.delta.content:
+                            parts.append(choice.delta.content)
+                            yield choice.delta.content
+            status = "SUCCESS"
+
+        except Exception as e:
+            status = "FAILURE"
+            self.log_response(
+                model=model,
+                config_name=self.config_name,
+                request_type='text',
+                request_data=request_data,
+                response_data={"error": str(e), "content": "".join(parts)},
+                response_cost=0,
+                usage_data={},
+                status=status,
+                meta_data=meta_data
+            )
+            raise
+
+        finally:
+            if stream is not None:
+                stream.close()
+            if status != "FAILURE":
+                usage_data = {}
+                response_cost = 0
+                if usage:
+                    usage_data, response_cost = self._get_usage_and_cost(usage, llm_info)
+                    rate_limiter.settle_tokens(reserved_tokens, usage.total_tokens)
+
+                self.log_response(model=model, config_name=self.config_name, request_type='text', request_data=request_data,
+                                  response_data={"id": response_id, "content": "".join(parts), "finish_reason": finish_reason},
+                                  usage_data=usage_data, status=status, response_cost=response_cost, meta_data=meta_data)
+
     def get_image_response(self, model, prompt, size, style, quality, n, llm_info):
 
         response_cost = 0
@@ -157,13 +265,15 @@ class OpenAIProvider(BaseLLMProvider):
             "n": n,
         }
         try:
-            response = self.client.images.generate(
-                model=model,
-                prompt=prompt,
-                size=size,
-                style=style,
-                quality=quality,
-                n=n,
+            response = self.get_rate_limiter(model).call(
+                lambda: self.request_client.images.generate(
+                    model=model,
+                    prompt=prompt,
+                    size=size,
+                    style=style,
+                    quality=quality,
+                    n=n,
+                )
             )
 
             usage_data = {
@@ -206,33 +316,27 @@ class OpenAIProvider(BaseLLMProvider):
         }
         response_cost = 0
         try:
-            completion = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": user_prompt}, {"type": "image_url", "image_url": {"url": image_url}},
-                        ],
-                    }
-                ],
-                max_completion_tokens=max_completion_tokens,
-                temperature=temperature,
-                frequency_penalty=frequency_penalty,
-                n=n
+            completion = self.get_rate_limiter(model).call(
+                lambda: self.request_client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": user_prompt}, {"type": "image_url", "image_url": {"url": image_url}},
+                            ],
+                        }
+                    ],
+                    max_completion_tokens=max_completion_tokens,
+                    temperature=temperature,
+                    frequency_penalty=frequency_penalty,
+                    n=n
+                ),
+                tokens=self.estimate_tokens(user_prompt),
+                usage_tokens=self._usage_tokens
             )
 
-            input_tokens = completion.usage.prompt_tokens
-            output_tokens = completion.usage.completion_tokens
-            total_tokens = input_tokens + output_tokens
-            usage_data = {
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "total_tokens": total_tokens
-            }
-
-            response_cost = self._calculate_text_response_cost(input_tokens=input_tokens, output_tokens=output_tokens,
-                                                               llm_info=llm_info)
+            usage_data, response_cost = self._get_usage_and_cost(completion.usage, llm_info)
 
             self.log_response(model=model, config_name=self.config_name, request_type='text', request_data=request_data,
                               response_data=completion.to_dict(), usage_data=usage_data, status="SUCCESS",
@@ -254,7 +358,7 @@ class OpenAIProvider(BaseLLMProvider):
             )
 
 
-    def get_structured_output(self, model, user_prompt, system_prompt, response_format, max_completion_tokens, temperature, n, frequency_penalty, llm_info):
+    def get_structured_output(self, model, user_prompt, system_prompt, response_format, max_completion_tokens, temperature, n, frequency_penalty, llm_info, meta_data=None):
 
         request_data = {
             "user_prompt": user_prompt,
@@ -267,31 +371,28 @@ class OpenAIProvider(BaseLLMProvider):
         response_cost = 0
         try:
 
-            completion = self.client.beta.chat.completions.parse(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                response_format=response_format,
-                frequency_penalty=frequency_penalty,
-                max_completion_tokens=max_completion_tokens,
-                n=n,
-                temperature=temperature
+            completion = self.get_rate_limiter(model).call(
+                lambda: self.request_client.beta.chat.completions.parse(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                    response_format=response_format,
+                    frequency_penalty=frequency_penalty,
+                    max_completion_tokens=max_completion_tokens,
+                    n=n,
+                    temperature=temperature
+                ),
+                tokens=self.estimate_tokens(system_prompt, user_prompt),
+                usage_tokens=self._usage_tokens
             )
 
-            input_tokens = completion.usage.prompt_tokens
-            output_tokens = completion.usage.completion_tokens
-            total_tokens = input_tokens + output_tokens
-            usage_data = {
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "total_tokens": total_tokens
-            }
-            response_cost = self._calculate_text_response_cost(input_tokens=input_tokens, output_tokens=output_tokens, llm_info=llm_info)
+            usage_data, response_cost = self._get_usage_and_cost(completion.usage, llm_info)
 
             self.log_response(model=model, config_name=self.config_name, request_type='text', request_data=request_data,
-                              response_data=completion.to_dict(), usage_data=usage_data, response_cost=response_cost, status="SUCCESS")
+                              response_data=completion.to_dict(), usage_data=usage_data, response_cost=response_cost, status="SUCCESS",
+                              meta_data=meta_data)
 
 
             return completion
@@ -305,5 +406,77 @@ class OpenAIProvider(BaseLLMProvider):
                 response_data={"error": str(e)},
                 response_cost=response_cost,
                 usage_data={},
-                status="FAILURE"
-            )
\ No newline at end of file
+                status="FAILURE",
+                meta_data=meta_data
+            )
+
+    _BATCH_STATUSES = {
+        "validating": BatchConstants.IN_PROGRESS,
+        "in_progress": BatchConstants.IN_PROGRESS,
+        "finalizing": BatchConstants.IN_PROGRESS,
+        "cancelling": BatchConstants.IN_PROGRESS,
+        "completed": BatchConstants.COMPLETED,
+        "failed": BatchConstants.FAILED,
+        "expired": BatchConstants.EXPIRED,
+        "cancelled": BatchConstants.CANCELLED,
+    }
+
+    def submit_batch(self, model, requests, max_completion_tokens, temperature, frequency_penalty):
+        lines = [
+            json.dumps({
+                "custom_id": request["custom_id"],
+                "method": "POST",
+                "url": BatchConstants.OPENAI_ENDPOINT,
+                "body": {
+                    "model": model,
+                    "messages": request["messages"],
+                    "max_completion_tokens": max_completion_tokens,
+                    "temperature": temperature,
+                    "frequency_penalty": frequency_penalty,
+                },
+            })
+            for request in requests
+        ]
+        batch_file = self.client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=BatchConstants.OPENAI_ENDPOINT,
+            completion_window=BatchConstants.OPENAI_COMPLETION_WINDOW,
+            metadata={"config_name": self.config_name},
+        )
+        return batch.id
+
+    def get_batch_status(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "status": self._BATCH_STATUSES.get(batch.status, BatchConstants.IN_PROGRESS),
+            "succeeded": counts.completed if counts else 0,
+            "failed": counts.failed if counts else 0,
+        }
+
+    def get_batch_results(self, batch_id, llm_info):
+        batch = self.client.batches.retrieve(batch_id)
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            with self.client.files.with_streaming_response.content(file_id) as response:
+                for line in response.iter_lines():
+                    if line.strip():
+                        yield self._parse_batch_result(json.loads(line), llm_info)
+
+    def _parse_batch_result(self, result, llm_info):
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            return self._batch_failure(result["custom_id"], result.get("error") or response.get("body"))
+
+        completion = ChatCompletion.model_validate(response["body"])
+        usage_data, response_cost = self._get_usage_and_cost(completion.usage, llm_info)
+        return {
+            "custom_id": result["custom_id"],
+            "status": "SUCCESS",
+            "content": completion.choices[0].message.content,
+            "usage_data": usage_data,
+            "response_cost": self._apply_batch_price(llm_info, response_cost),
+            "response_data": response["body"],
+        }
@@ -0,0 +1,95 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+from authenticator.thread_container import ThreadContainer
+
+logger = logging.getLogger(__name__)
+
+
+def with_thread_context(fn):
+    """
+    Wrap ``fn`` so it runs with the calling thread's user in ``ThreadContainer``, which user-scoped
+    querysets and LLM request logs rely on, and closes its database connections when done.
+    The user is captured when ``with_thread_context`` is called, not when ``fn`` runs.
+    """
+    user_id = ThreadContainer.get_current_user_id()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        ThreadContainer.clear()
+        if user_id is not None:
+            ThreadContainer.set_value('user_id', user_id)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            ThreadContainer.clear()
+            connections.close_all()
+
+    return wrapper
+
+
+def iterate_with_thread_context(iterable):
+    """
+    Iterate ``iterable`` with the calling thread's user in ``ThreadContainer``. Streaming responses are
+    consumed after the request middleware has cleared the thread context, so generators that write
+    user-scoped rows wrap themselves with this.
+    """
+    user_id = ThreadContainer.get_current_user_id()
+
+    def generate():
+        ThreadContainer.clear()
+        if user_id is not None:
+            ThreadContainer.set_value('user_id', user_id)
+        try:
+            yield from iterable
+        finally:
+            ThreadContainer.clear()
+
+    return generate()
+
+
+def run_in_background(fn, *args, **kwargs) -> threading.Thread:
+    """
+    Run ``fn`` on a daemon thread with the current thread context. Exceptions are logged, not raised.
+    """
+    contextual_fn = with_thread_context(fn)
+
+    def target():
+        try:
+            contextual_fn(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Background task {getattr(fn, '__name__', fn)} failed: {str(e)}")
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Process-wide thread pool for request-time fan-out, sized by ``BACKGROUND_MAX_WORKERS``.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "BACKGROUND_MAX_WORKERS", 8),
+                thread_name_prefix="fanout",
+            )
+        return _executor
+
+
+def submit(fn, *args, **kwargs) -> Future:
+    """
+    Submit ``fn`` to the shared pool with the current thread context.
+    """
+    return get_executor().submit(with_thread_context(fn), *args, **kwargs)
@@ -0,0 +1,89 @@
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Hashable, Tuple
+
+import qdrant_client
+from anthropic import Anthropic
+from django.conf import settings
+from openai import OpenAI
+
+from core.services.qdrant_transport import QdrantTransport
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry(object):
+    """
+    Process-wide registry of long-lived API clients and the objects built around them.
+
+    Each entry is stored under a key together with a fingerprint of what it was built from (credentials,
+    URLs, relevant settings). ``get`` returns the cached instance while the fingerprint is unchanged and
+    rebuilds it when it changes, so a worker keeps one warm connection pool per client for its whole life.
+    A replaced instance is not closed, since other threads may still be using it; it is released once the
+    last reference goes away.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        # Re-entrant: factories build their own clients through the registry.
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "builds": 0, "rebuilds": 0}
+
+    @staticmethod
+    def _digest(fingerprint: Tuple) -> str:
+        # Only a digest is kept, so the registry does not hold a second copy of every credential.
+        return hashlib.sha256(repr(fingerprint).encode("utf-8")).hexdigest()
+
+    def get(self, key: Hashable, fingerprint: Tuple, factory: Callable[[], Any]) -> Any:
+        """
+        :param key: Hashable - Identity of the client, e.g. ``("openai",)`` or ``("rag_agent", "tutorKB")``.
+        :param fingerprint: tuple - Everything the instance depends on; a change triggers a rebuild.
+        :param factory: callable - Builds a new instance.
+        :return: Any - The shared instance.
+        """
+        digest = self._digest(fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == digest:
+                self._stats["hits"] += 1
+                return entry[1]
+
+            instance = factory()
+            self._entries[key] = (digest, instance)
+            self._stats["rebuilds" if entry else "builds"] += 1
+        if entry:
+            logger.info(f"Rebuilt client {key} after a configuration change")
+        return instance
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, clients=len(self._entries))
+
+
+client_registry = ClientRegistry()
+
+
+def get_openai_client(api_key: str):
+    return client_registry.get(("openai",), (api_key,), lambda: OpenAI(api_key=api_key))
+
+
+def get_anthropic_client(api_key: str):
+    return client_registry.get(("anthropic",), (api_key,), lambda: Anthropic(api_key=api_key))
+
+
+def get_qdrant_client(url: str, api_key: str):
+    return client_registry.get(
+        ("qdrant",), (url, api_key), lambda: qdrant_client.QdrantClient(url=url, api_key=api_key))
+
+
+def get_qdrant_transport(url: str, api_key: str):
+    fingerprint = (url, api_key) + tuple(
+        getattr(settings, name, None) for name in (
+            "QDRANT_POOL_SIZE", "QDRANT_CONNECT_TIMEOUT", "QDRANT_READ_TIMEOUT", "QDRANT_MAX_RETRIES", "QDRANT_HTTP2"))
+    return client_registry.get(
+        ("qdrant_transport",), fingerprint, lambda: QdrantTransport.from_settings(url=url, api_key=api_key))
@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from core.constants import LLMConfigCacheConstants
+from core.models import LLMConfiguration
+
+logger = logging.getLogger(__name__)
+
+
+class LLMConfigCache(object):
+    """
+    In-process cache of ``LLMConfiguration`` rows, each loaded together with its ``LLMInfo`` in one query.
+
+    Saving or deleting a configuration or an ``LLMInfo`` bumps a version counter in the Django cache
+    ``LLM_CONFIG_CACHE_VERSION_CACHE_ALIAS`` once the transaction commits (see ``core.signals``). Every
+    process re-reads the counter at most once per ``version_check_interval`` seconds and drops its entries
+    when it has moved, so admin edits show up within seconds. A per-process backend (local memory, dummy)
+    cannot carry the bump to other processes, so entries then only live ``version_check_interval``
+    seconds instead of ``ttl``.
+    """
+
+    def __init__(self, ttl: float = None, version_check_interval: float = None):
+        self.ttl = ttl if ttl is not None else getattr(
+            settings, "LLM_CONFIG_CACHE_TTL", LLMConfigCacheConstants.TTL)
+        self.version_check_interval = version_check_interval if version_check_interval is not None else getattr(
+            settings, "LLM_CONFIG_CACHE_VERSION_CHECK_INTERVAL", LLMConfigCacheConstants.VERSION_CHECK_INTERVAL)
+        self._entries = {}
+        self._version = None
+        self._version_checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+        self._warned = False
+
+    @property
+    def version_cache(self):
+        return caches[getattr(
+            settings, "LLM_CONFIG_CACHE_VERSION_CACHE_ALIAS", LLMConfigCacheConstants.VERSION_CACHE_ALIAS)]
+
+    def get_ttl(self) -> float:
+        """
+        :return: float - How long an entry is served, capped at ``version_check_interval`` when the version
+            counter is not in a cache shared between processes.
+        """
+        if not isinstance(self.version_cache, (LocMemCache, DummyCache)):
+            return self.ttl
+        if not self._warned:
+            self._warned = True
+            logger.warning("LLM_CONFIG_CACHE_VERSION_CACHE_ALIAS is not a shared cache; LLM configurations are "
+                           f"re-read every {self.version_check_interval}s instead of being cached for {self.ttl}s")
+        return min(self.ttl, self.version_check_interval)
+
+    def _sync_version(self):
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        version = self.version_cache.get(LLMConfigCacheConstants.VERSION_KEY, 0)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            self._version_checked_at = now
+
+    def get(self, config_name: str) -> Optional[LLMConfiguration]:
+        """
+        :param config_name: str - The configuration to resolve.
+        :return: LLMConfiguration - The configuration with ``llm_info`` already loaded, or None if it does not exist.
+        """
+        self._sync_version()
+        ttl = self.get_ttl()
+        with self._lock:
+            entry = self._entries.get(config_name)
+            if entry and time.monotonic() - entry[0] < ttl:
+                self._stats["hits"] += 1
+                return entry[1]
+            self._stats["misses"] += 1
+
+        config_obj = LLMConfiguration.objects.select_related('llm_info').filter(config_name=config_name).first()
+        if config_obj:
+            with self._lock:
+                self._entries[config_name] = (time.monotonic(), config_obj)
+        return config_obj
+
+    def invalidate(self):
+        """
+        Drop cached configurations in this process and signal every other process to do the same. Call it
+        once the change is committed, so that no process re-caches the old rows.
+        """
+        cache = self.version_cache
+        cache.add(LLMConfigCacheConstants.VERSION_KEY, 0, timeout=None)
+        try:
+            cache.incr(LLMConfigCacheConstants.VERSION_KEY)
+        except ValueError:
+            cache.set(LLMConfigCacheConstants.VERSION_KEY, 1, timeout=None)
+
+        with self._lock:
+            self._entries.clear()
+            self._version_checked_at = 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+llm_config_cache = LLMConfigCache()
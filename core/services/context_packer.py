@@ -0,0 +1,155 @@
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import tiktoken
+
+from core.constants import ContextBudgetConstants, OpenAIConstants
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCounter(object):
+    """
+    Counts tokens with the model's tiktoken encoding. Models tiktoken does not know (Anthropic and other
+    non-OpenAI models) fall back to the characters-per-token estimate, as does a model whose encoding
+    could not be loaded (tiktoken downloads encoding files on first use unless ``TIKTOKEN_CACHE_DIR``
+    holds them), which is logged.
+    """
+
+    _encodings = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model
+        self.encoding = self._get_encoding(model)
+
+    @classmethod
+    def _get_encoding(cls, model):
+        if not model:
+            return None
+        with cls._lock:
+            if model not in cls._encodings:
+                try:
+                    cls._encodings[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    cls._encodings[model] = None
+                except Exception as e:
+                    logger.error(f"Failed to load the tiktoken encoding for {model}, estimating tokens: {str(e)}")
+                    cls._encodings[model] = None
+            return cls._encodings[model]
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return -(-len(text) // OpenAIConstants.TOKEN_MULTIPLIER)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text)
+            return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * OpenAIConstants.TOKEN_MULTIPLIER]
+
+
+class ContextPacker(object):
+    """
+    Fits the RAG prompt into a per-model token budget.
+
+    The system prompt, the session summary and the current question are always kept. What remains of
+    ``max_input_tokens`` is split between retrieved chunks (``context_tokens``) and conversation history
+    (``history_tokens``); budget one part leaves unused is lent to the other. Chunks are kept in rank
+    order, the first chunk that does not fit is truncated if enough room is left, and the rest are
+    dropped. History keeps the most recent messages and drops the oldest, then any leading assistant
+    messages, so that it still starts at a user turn.
+    """
+
+    def __init__(self, model: Optional[str] = None, budget: Optional[Dict[str, int]] = None):
+        budget = budget or {}
+        self.counter = TokenCounter(model)
+        self.max_input_tokens = budget.get("max_input_tokens", ContextBudgetConstants.MAX_INPUT_TOKENS)
+        self.context_tokens = budget.get("context_tokens", ContextBudgetConstants.CONTEXT_TOKENS)
+        self.history_tokens = budget.get("history_tokens", ContextBudgetConstants.HISTORY_TOKENS)
+        self.min_chunk_tokens = budget.get("min_chunk_tokens", ContextBudgetConstants.MIN_CHUNK_TOKENS)
+
+    @classmethod
+    def for_config(cls, config_obj):
+        """
+        Packer for an ``LLMConfiguration``, with the budget overridable through ``config_data["context_budget"]``.
+        """
+        return cls(model=config_obj.model, budget=(config_obj.config_data or {}).get("context_budget"))
+
+    def _pack_chunks(self, chunks: List[str], budget: int):
+        packed, used, truncated = [], 0, 0
+        for chunk in chunks:
+            tokens = self.counter.count(chunk)
+            if used + tokens <= budget:
+                packed.append(chunk)
+                used += tokens
+                continue
+            remaining = budget - used
+            if remaining >= self.min_chunk_tokens:
+                packed.append(self.counter.truncate(chunk, remaining))
+                used += self.counter.count(packed[-1])
+                truncated += 1
+            break
+        return packed, used, truncated
+
+    def _pack_history(self, history: List[Dict[str, str]], budget: int):
+        packed, used = [], 0
+        for message in reversed(history):
+            tokens = self.counter.count(str(message))
+            if used + tokens > budget:
+                break
+            packed.append((message, tokens))
+            used += tokens
+        packed.reverse()
+        # Dropping the oldest messages can leave an assistant turn first; history must start at a user turn.
+        while packed and packed[0][0]["role"] != "user":
+            used -= packed.pop(0)[1]
+        return [message for message, _ in packed], used
+
+    def pack(self, system_prompt: str, question: str, chunks: List[str],
+             history: Optional[List[Dict[str, str]]] = None, summary: Optional[str] = None) -> dict:
+        """
+        :param system_prompt: str - The system prompt; always kept.
+        :param summary: str, optional - Summary of older conversation turns; always kept.
+        :param question: str - The current user question; always kept.
+        :param chunks: list - Retrieved context chunks, best first.
+        :param history: list, optional - Previous messages as ``{"role": ..., "content": ...}``, oldest first.
+        :return: dict - ``chunks`` and ``history`` that fit, plus a ``tokens`` report with per-part counts.
+        """
+        history = history or []
+        system_tokens = self.counter.count(system_prompt)
+        question_tokens = self.counter.count(question)
+        summary_tokens = self.counter.count(summary)
+        available = max(self.max_input_tokens - system_tokens - question_tokens - summary_tokens, 0)
+
+        history_needed = sum(self.counter.count(str(message)) for message in history)
+
+        context_budget = min(self.context_tokens + max(self.history_tokens - history_needed, 0), available)
+        packed_chunks, context_used, truncated = self._pack_chunks(chunks, context_budget)
+
+        history_budget = min(self.history_tokens + max(self.context_tokens - context_used, 0), available - context_used)
+        packed_history, history_used = self._pack_history(history, history_budget)
+
+        report = {
+            "model": self.counter.model,
+            "exact": self.counter.encoding is not None,
+            "system": system_tokens,
+            "question": question_tokens,
+            "summary": summary_tokens,
+            "context": context_used,
+            "history": history_used,
+            "total": system_tokens + question_tokens + summary_tokens + context_used + history_used,
+            "budget": self.max_input_tokens,
+            "chunks_kept": len(packed_chunks),
+            "chunks_dropped": len(chunks) - len(packed_chunks),
+            "chunks_truncated": truncated,
+            "messages_kept": len(packed_history),
+            "messages_dropped": len(history) - len(packed_history),
+        }
+        return {"chunks": packed_chunks, "history": packed_history, "tokens": report}
@@ -0,0 +1,176 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+from django.conf import settings
+
+from core.constants import EmbeddingBatchConstants
+
+logger = logging.getLogger(__name__)
+
+
+class _EmbeddingRequest(object):
+
+    def __init__(self, client, model: str, text: str):
+        self.client = client
+        self.model = model
+        self.text = text
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class EmbeddingBatcher(object):
+    """
+    Micro-batches query embeddings from concurrent requests.
+
+    Callers queue their texts and wait on a future. A daemon thread takes the first waiting text, keeps
+    collecting for ``EMBEDDING_BATCH_WINDOW_MS`` milliseconds or until ``EMBEDDING_BATCH_MAX_SIZE`` texts
+    are waiting, and hands them to a pool of ``EMBEDDING_BATCH_MAX_CONCURRENCY`` sender threads, which make
+    one multi-input ``embeddings.create`` per client and model, identical texts once. Collection carries on
+    while batches are being sent, so a text waits at most the window (plus a free sender). Each caller gets
+    its own vector, or the batch's exception. The time a text spends waiting for its batch to be sent is the
+    latency the batcher adds, reported by ``stats``. A window of 0 disables batching.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._executor = None
+        self._pid = None
+        self._waits_ms = deque(maxlen=EmbeddingBatchConstants.LATENCY_SAMPLES)
+        self._stats = {"requests": 0, "batched_requests": 0, "batches": 0, "api_inputs": 0, "max_batch_size": 0, "errors": 0}
+
+    @staticmethod
+    def get_window() -> float:
+        """
+        :return: float - The collection window in seconds; 0 when batching is disabled.
+        """
+        return getattr(settings, "EMBEDDING_BATCH_WINDOW_MS", EmbeddingBatchConstants.WINDOW_MS) / 1000
+
+    def is_enabled(self) -> bool:
+        return self.get_window() > 0
+
+    def _is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def _ensure_started(self):
+        # Started lazily, again in a forked worker, where the parent's threads do not exist, and again if
+        # the collector thread has died.
+        if self._is_running():
+            return
+        with self._lock:
+            if self._is_running():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._executor = None
+                self._pid = os.getpid()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=getattr(
+                        settings, "EMBEDDING_BATCH_MAX_CONCURRENCY", EmbeddingBatchConstants.MAX_CONCURRENCY),
+                    thread_name_prefix="embedding-batch",
+                )
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, client, model: str, text: str) -> Future:
+        """
+        :param client: OpenAI - The client to embed with; requests are only batched with others using the same client.
+        :param model: str - The embedding model.
+        :param text: str - The text to embed.
+        :return: Future - Resolves to the embedding vector.
+        """
+        self._ensure_started()
+        request = _EmbeddingRequest(client, model, text)
+        self._queue.put(request)
+        with self._lock:
+            self._stats["requests"] += 1
+        return request.future
+
+    def embed_many(self, client, model: str, texts: List[str]) -> List[List[float]]:
+        """
+        Embed ``texts`` through the batcher and wait for the vectors.
+
+        :raises TimeoutError: If the vectors are not back within ``EMBEDDING_BATCH_TIMEOUT`` seconds.
+        """
+        futures = [self.submit(client, model, text) for text in texts]
+        timeout = getattr(settings, "EMBEDDING_BATCH_TIMEOUT", EmbeddingBatchConstants.TIMEOUT)
+        return [future.result(timeout=timeout) for future in futures]
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                max_size = getattr(settings, "EMBEDDING_BATCH_MAX_SIZE", EmbeddingBatchConstants.MAX_SIZE)
+                deadline = batch[0].enqueued_at + self.get_window()
+                while len(batch) < max_size:
+                    try:
+                        batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                    except queue.Empty:
+                        break
+
+                groups = {}
+                for request in batch:
+                    groups.setdefault((id(request.client), request.model), []).append(request)
+                for requests in groups.values():
+                    self._executor.submit(self._send, requests)
+            except Exception as e:
+                logger.error(f"Embedding batcher failed to dispatch {len(batch)} texts: {str(e)}")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _send(self, requests: List[_EmbeddingRequest]):
+        sent_at = time.monotonic()
+        texts = list(dict.fromkeys(request.text for request in requests))
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["batched_requests"] += len(requests)
+            self._stats["api_inputs"] += len(texts)
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(requests))
+            self._waits_ms.extend((sent_at - request.enqueued_at) * 1000 for request in requests)
+
+        try:
+            response = requests[0].client.embeddings.create(model=requests[0].model, input=texts)
+            if len(response.data) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings, got {len(response.data)}")
+            vectors = {text: item.embedding for text, item in zip(texts, response.data)}
+        except Exception as e:
+            logger.error(f"Batched embedding of {len(texts)} texts failed: {str(e)}")
+            with self._lock:
+                self._stats["errors"] += 1
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        for request in requests:
+            request.future.set_result(vectors[request.text])
+
+    def stats(self) -> dict:
+        """
+        :return: dict - Request, batch and API input counts, the mean and largest batch size, and the added
+            latency (queue wait before the batch is sent) over recent requests as ``wait_p50_ms``, ``wait_p99_ms``
+            and ``wait_mean_ms``.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            waits = sorted(self._waits_ms)
+        stats["window_ms"] = self.get_window() * 1000
+        stats["mean_batch_size"] = stats["batched_requests"] / stats["batches"] if stats["batches"] else 0.0
+        if waits:
+            stats["wait_p50_ms"] = round(waits[int(len(waits) * 0.5)], 3)
+            stats["wait_p99_ms"] = round(waits[min(len(waits) - 1, int(len(waits) * 0.99))], 3)
+            stats["wait_mean_ms"] = round(sum(waits) / len(waits), 3)
+        else:
+            stats["wait_p50_ms"] = stats["wait_p99_ms"] = stats["wait_mean_ms"] = None
+        return stats
+
+
+embedding_batcher = EmbeddingBatcher()
@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.constants import EmbeddingConstants, OpenAIConstants
+from core.services.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache(object):
+    """
+    Two-tier cache for embedding vectors.
+
+    The first tier is an in-process LRU, the second is the Django cache configured under
+    ``EmbeddingConstants.CACHE_ALIAS`` (file based by default), which owns TTL and size-based eviction. The
+    file backend scans its directory on every write, so its entry cap is kept small (see ``CACHES``).
+    Entries are keyed by (model, hash of the whitespace-normalised text).
+    """
+
+    def __init__(self, local_max_size: int = None, cache_alias: str = EmbeddingConstants.CACHE_ALIAS):
+        self.local = LRUCache(
+            max_size=local_max_size or getattr(
+                settings, "EMBEDDING_CACHE_LOCAL_MAX_SIZE", EmbeddingConstants.LOCAL_CACHE_MAX_SIZE)
+        )
+        self.cache_alias = cache_alias
+        self._lock = threading.Lock()
+        self._stats = {
+            "local_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "saved_tokens": 0,
+            "miss_latency_ms_total": 0.0,
+        }
+
+    @property
+    def persistent(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return " ".join(text.split())
+
+    def make_key(self, model: str, text: str) -> str:
+        digest = hashlib.sha256(self.normalize_text(text).encode("utf-8")).hexdigest()
+        return f"emb:{model}:{digest}"
+
+    def _incr(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, List[float]]:
+        """
+        Look up the cached vectors for ``texts``.
+
+        :param model: str - The embedding model the vectors were produced with.
+        :param texts: list - The texts to look up.
+        :return: dict - Index into ``texts`` mapped to its cached vector. Missing indexes were not cached.
+        """
+        found = {}
+        pending = {}
+        for index, text in enumerate(texts):
+            key = self.make_key(model, text)
+            vector = self.local.get(key)
+            if vector is not None:
+                found[index] = vector
+                self._incr("local_hits")
+                self._incr("saved_tokens", len(text) // OpenAIConstants.TOKEN_MULTIPLIER)
+            else:
+                pending.setdefault(key, []).append(index)
+
+        if pending:
+            try:
+                persisted = self.persistent.get_many(list(pending.keys()))
+            except Exception as e:
+                logger.warning(f"Embedding cache read failed: {str(e)}")
+                persisted = {}
+
+            for key, vector in persisted.items():
+                self.local.set(key, vector)
+                for index in pending.pop(key):
+                    found[index] = vector
+                    self._incr("persistent_hits")
+                    self._incr("saved_tokens", len(texts[index]) // OpenAIConstants.TOKEN_MULTIPLIER)
+
+        self._incr("misses", sum(len(indexes) for indexes in pending.values()))
+        return found
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text]).get(0)
+
+    def set_many(self, model: str, vectors: Dict[str, List[float]]):
+        """
+        :param model: str - The embedding model the vectors were produced with.
+        :param vectors: dict - Text mapped to its embedding vector.
+        """
+        entries = {self.make_key(model, text): vector for text, vector in vectors.items()}
+        for key, vector in entries.items():
+            self.local.set(key, vector)
+        try:
+            self.persistent.set_many(entries)
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {str(e)}")
+
+    def set(self, model: str, text: str, vector: List[float]):
+        self.set_many(model, {text: vector})
+
+    def record_miss_latency(self, elapsed_ms: float):
+        self._incr("miss_latency_ms_total", elapsed_ms)
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters since process start, plus the estimated tokens and latency the cache saved.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        hits = stats["local_hits"] + stats["persistent_hits"]
+        lookups = hits + stats["misses"]
+        avg_miss_latency_ms = stats.pop("miss_latency_ms_total") / stats["misses"] if stats["misses"] else 0.0
+        stats.update({
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "avg_miss_latency_ms": round(avg_miss_latency_ms, 2),
+            "saved_latency_ms": round(hits * avg_miss_latency_ms, 2),
+        })
+        return stats
+
+
+embedding_cache = EmbeddingCache()
@@ -1,8 +1,23 @@
-from core.constants import OpenAIConstants
-from core.models import LLMConfiguration
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from pydantic import ValidationError
+
+from authenticator.thread_container import ThreadContainer
+from core.constants import BatchConstants, OpenAIConstants
+from core.models import LLMBatchJob
 from core.providers.anthropic_service import AnthropicProvider
-from core.providers.llm_service import BaseLLMProvider
+from core.providers.llm_service import BaseLLMProvider, LLMProviderError, log_llm_request, parse_structured_output
+from core.providers.local_batch_service import LocalBatchProvider
 from core.providers.openai_service import OpenAIProvider
+from core.services.client_registry import client_registry
+from core.services.config_cache import llm_config_cache
+from core.services.model_router import model_router
+from core.services.rate_limiter import llm_rate_limiters
+from core.services.schema_registry import schema_registry
+from core.services.response_cache import llm_response_cache
+from core.services.single_flight import single_flight
 
 
 class LLMInterface(object):
@@ -10,8 +25,11 @@ class LLMInterface(object):
     def __init__(self):
         self.providers = {
             'openai': OpenAIProvider,
-            'anthropic': AnthropicProvider
+            'anthropic': AnthropicProvider,
         }
+        # The file-based stand-in batch provider is only for tests and local development.
+        if getattr(settings, "LOCAL_BATCH_PROVIDER_ENABLED", False):
+            self.providers['local'] = LocalBatchProvider
 
     def get_llm_provider(self, provider_name: str, config_name) -> BaseLLMProvider:
         """
@@ -19,7 +37,7 @@ class LLMInterface(object):
 
         :param provider_name: str - The name of the LLM provider to retrieve.
         :param config_name: Any - The configuration to initialize the provider with.
-        :return: BaseLLMProvider - An instance of the requested LLM provider.
+        :return: BaseLLMProvider - The shared instance of the requested LLM provider for this configuration.
         :raises ValueError: If the specified provider is not present in the available providers.
         """
 
@@ -31,22 +49,91 @@ class LLMInterface(object):
         if not provider:
             raise ValueError(f"Provider '{provider_name}' is not present.")
 
-        return provider(config_name)
+        return client_registry.get(
+            ("llm_provider", provider_name, config_name),
+            provider.get_client_fingerprint(),
+            lambda: provider(config_name)
+        )
 
     def get_config_object(self, config_name):
         """
         Retrieve a configuration object based on the given configuration name.
 
         :param config_name: str - The name of the configuration to retrieve.
-        :return: LLMConfiguration - The configuration object corresponding to the given name.
+        :return: LLMConfiguration - The configuration object corresponding to the given name, with ``llm_info`` loaded.
         :raises ValueError: If the specified configuration is not present.
         """
-        config_obj = LLMConfiguration.objects.filter(config_name=config_name).first()
+        config_obj = llm_config_cache.get(config_name)
         if not config_obj:
             raise ValueError(f"Config {config_name} is not present")
 
         return config_obj
 
+    @staticmethod
+    def get_rate_limit_stats() -> dict:
+        """
+        :return: dict - Per ``provider:model`` request, retry, throttle and wait counters, and the current limits.
+        """
+        return llm_rate_limiters.stats()
+
+    @staticmethod
+    def get_routing_stats() -> dict:
+        """
+        :return: dict - Rolling sample count, error rate and p95 latency per ``provider:model``.
+        """
+        return model_router.stats()
+
+    @staticmethod
+    def get_single_flight_stats() -> dict:
+        """
+        :return: dict - Per kind of call (embedding, vector search, LLM), how many calls were coalesced onto another in flight.
+        """
+        return single_flight.stats()
+
+    @staticmethod
+    def _last_user_message(messages):
+        for message in reversed(messages):
+            if message.get("role") == "user" and isinstance(message.get("content"), str):
+                return message["content"]
+        return None
+
+    def _provider_call(self, config_obj, target, method_name, request_params, meta_data):
+        """
+        Call a provider method for ``target``, one of the configurations ``config_obj`` routes to. The request
+        keeps its parameters and is logged under the original configuration name, with the target's model and pricing.
+        """
+        llm_provider = self.get_llm_provider(target.llm_provider, config_obj.config_name)
+        if target is not config_obj:
+            request_params = dict(request_params, model=target.model)
+        return getattr(llm_provider, method_name)(llm_info=target.llm_info, meta_data=meta_data, **request_params)
+
+    def _route(self, config_obj, method_name, request_params, routing_text, meta_data, routable=True):
+        """
+        Make a provider request through the configuration's routing rules (see ``ModelRouter``).
+        Without rules, or when the caller pinned a model, only the configuration's own provider is used.
+        """
+        self.get_llm_provider(config_obj.llm_provider, config_obj.config_name)
+        return model_router.call(
+            config_obj,
+            lambda target, target_meta_data: self._provider_call(
+                config_obj, target, method_name, request_params, target_meta_data),
+            routing_text=routing_text,
+            meta_data=meta_data,
+            enabled=routable
+        )
+
+    @staticmethod
+    def _check_response(response, config_obj):
+        """
+        Providers log a failed request and return None; turn that into an error the caller can handle.
+
+        :raises LLMProviderError: If the provider returned no response.
+        """
+        if not response:
+            raise LLMProviderError(
+                f"{config_obj.llm_provider} request for config {config_obj.config_name} failed; "
+                f"the error is recorded in the request log")
+
     def get_custom_response(
             self,
             user_prompt,
@@ -56,7 +143,8 @@ class LLMInterface(object):
             max_completion_tokens=None,
             temperature=None,
             n=None,
-            frequency_penalty=None
+            frequency_penalty=None,
+            routing_text=None
     ):
         """
         Generate a custom response from an LLM provider based on the provided user prompt and configuration.
@@ -69,17 +157,17 @@ class LLMInterface(object):
         :param temperature: float, optional - The randomness of the model's responses. Defaults to the value in the configuration or a predefined low temperature.
         :param n: int, optional - The number of responses to generate. Defaults to the response count specified in the configuration.
         :param frequency_penalty: float, optional - A penalty for using repetitive words. Defaults to the value in the configuration or a predefined default.
+        :param routing_text: str, optional - The text the routing rules classify, e.g. the user's question without retrieved context. Defaults to the user prompt.
         :return: str - The content of the first choice in the generated response.
         :raises ValueError: If the specified configuration or provider is not present.
+        :raises LLMProviderError: If the provider request failed after all retries.
         """
 
         config_obj = self.get_config_object(config_name)
-        llm_provider = self.get_llm_provider(config_obj.llm_provider, config_name)
 
         config_data = config_obj.config_data
-        llm_info = config_obj.llm_info
 
-        response = llm_provider.get_text_response(
+        request_params = dict(
             model=model or config_obj.model,
             user_prompt=user_prompt,
             system_prompt=system_prompt or config_obj.system_behaviour,
@@ -87,9 +175,18 @@ class LLMInterface(object):
             temperature=temperature if temperature is not None else config_data.get("temperature", OpenAIConstants.LOW_TEMPERATURE),
             n=n or config_obj.response_count,
             frequency_penalty=frequency_penalty if frequency_penalty is not None else config_data.get("frequency_penalty", OpenAIConstants.DEFAULT_FREQUENCY_PENALTY),
-            llm_info=llm_info
         )
 
+        response = llm_response_cache.get_or_call(
+            config_obj,
+            'text',
+            lambda: self._route(
+                config_obj, 'get_text_response', request_params, routing_text or user_prompt, None, routable=model is None),
+            provider=config_obj.llm_provider,
+            **request_params
+        )
+        self._check_response(response, config_obj)
+
         return response[0]
 
     def get_custom_response_from_context(
@@ -100,7 +197,9 @@ class LLMInterface(object):
             max_completion_tokens=None,
             temperature=None,
             n=None,
-            frequency_penalty=None
+            frequency_penalty=None,
+            meta_data=None,
+            routing_text=None
     ):
         """
         Generate a custom response from an LLM provider using a conversational context.
@@ -112,40 +211,100 @@ class LLMInterface(object):
         :param temperature: float, optional - The randomness of the model's responses. Defaults to the value in the configuration or a predefined low temperature.
         :param n: int, optional - The number of responses to generate. Defaults to the response count specified in the configuration.
         :param frequency_penalty: float, optional - A penalty for using repetitive words. Defaults to the value in the configuration or a predefined default.
+        :param meta_data: dict, optional - Extra data to store on the request log entry.
+        :param routing_text: str, optional - The text the routing rules classify, e.g. the user's question without retrieved context. Defaults to the last user message.
         :return: str - The content of the first choice in the generated response.
         :raises ValueError: If the specified configuration or provider is not present.
+        :raises LLMProviderError: If the provider request failed after all retries.
         """
 
         config_obj = self.get_config_object(config_name)
-        llm_provider = self.get_llm_provider(config_obj.llm_provider, config_name)
-
 
         config_data = config_obj.config_data
-        llm_info = config_obj.llm_info
 
-        response = llm_provider.get_text_response_from_context(
+        request_params = dict(
             model=model or config_obj.model,
             messages=messages,
             max_completion_tokens=max_completion_tokens or config_data.get("max_completion_tokens", OpenAIConstants.DEFAULT_MAX_COMPLETION_TOKENS),
             temperature=temperature if temperature is not None else config_data.get("temperature", OpenAIConstants.LOW_TEMPERATURE),
             n=n or config_obj.response_count,
             frequency_penalty=frequency_penalty if frequency_penalty is not None else config_data.get("frequency_penalty", OpenAIConstants.DEFAULT_FREQUENCY_PENALTY),
-            llm_info=llm_info
         )
 
+        response = llm_response_cache.get_or_call(
+            config_obj,
+            'text',
+            lambda: self._route(
+                config_obj, 'get_text_response_from_context', request_params,
+                routing_text or self._last_user_message(messages), meta_data, routable=model is None),
+            provider=config_obj.llm_provider,
+            **request_params
+        )
+        self._check_response(response, config_obj)
+
         return response[0]
 
+    def get_streaming_response_from_context(
+            self,
+            messages,
+            config_name,
+            model=None,
+            max_completion_tokens=None,
+            temperature=None,
+            frequency_penalty=None,
+            meta_data=None,
+            routing_text=None
+    ):
+        """
+        Stream a response from an LLM provider using a conversational context.
+
+        :param messages: list - A list of message dictionaries representing the conversation history (including previous exchanges).
+        :param config_name: str - The name of the configuration to use for generating the response.
+        :param model: str, optional - The model to be used for the response. Defaults to the model specified in the configuration.
+        :param max_completion_tokens: int, optional - The maximum number of tokens in the completion. Defaults to the value in the configuration or a predefined default.
+        :param temperature: float, optional - The randomness of the model's responses. Defaults to the value in the configuration or a predefined low temperature.
+        :param frequency_penalty: float, optional - A penalty for using repetitive words. Defaults to the value in the configuration or a predefined default.
+        :param meta_data: dict, optional - Extra data to store on the request log entry.
+        :param routing_text: str, optional - The text the routing rules classify, e.g. the user's question without retrieved context. Defaults to the last user message.
+        :return: Iterator[str] - Text deltas as they are generated. Usage and cost are logged when the stream completes.
+        :raises ValueError: If the specified configuration or provider is not present.
+        """
+
+        config_obj = self.get_config_object(config_name)
+
+        config_data = config_obj.config_data
+
+        request_params = dict(
+            model=model or config_obj.model,
+            messages=messages,
+            max_completion_tokens=max_completion_tokens or config_data.get("max_completion_tokens", OpenAIConstants.DEFAULT_MAX_COMPLETION_TOKENS),
+            temperature=temperature if temperature is not None else config_data.get("temperature", OpenAIConstants.LOW_TEMPERATURE),
+            frequency_penalty=frequency_penalty if frequency_penalty is not None else config_data.get("frequency_penalty", OpenAIConstants.DEFAULT_FREQUENCY_PENALTY),
+        )
+
+        self.get_llm_provider(config_obj.llm_provider, config_obj.config_name)
+        return model_router.stream(
+            config_obj,
+            lambda target, target_meta_data: self._provider_call(
+                config_obj, target, 'get_text_stream_from_context', request_params, target_meta_data),
+            routing_text=routing_text or self._last_user_message(messages),
+            meta_data=meta_data,
+            enabled=model is None
+        )
+
     def get_custom_structured_response(
             self,
             config_name,
             user_prompt,
-            response_format,
+            response_format=None,
+            schema_name=None,
             model=None,
             system_prompt=None,
             max_completion_tokens=None,
             temperature=None,
             n=None,
-            frequency_penalty=None
+            frequency_penalty=None,
+            routing_text=None
     ):
         """
         Generate a custom structured response from an LLM provider based on the provided user prompt, configuration, and response format.
@@ -153,26 +312,31 @@ class LLMInterface(object):
         :param config_name: str - The name of the configuration to use for generating the response.
         :param user_prompt: str - The prompt or query provided by the user.
         :param response_format: str - The desired format of the structured response (e.g., JSON, Markdown).
+        :param schema_name: str, optional - A schema registered in ``schema_registry``, used instead of ``response_format``.
+            Its precomputed JSON schema is sent and the response is returned as a validated model instance.
         :param model: str, optional - The model to be used for the response. Defaults to the model specified in the configuration.
         :param system_prompt: str, optional - The system's behavior prompt. Defaults to the system behavior in the configuration.
         :param max_completion_tokens: int, optional - The maximum number of tokens in the completion. Defaults to the value in the configuration or a predefined default.
         :param temperature: float, optional - The randomness of the model's responses. Defaults to the value in the configuration or a predefined low temperature.
         :param n: int, optional - The number of responses to generate. Defaults to the response count specified in the configuration.
         :param frequency_penalty: float, optional - A penalty for using repetitive words. Defaults to the value in the configuration or a predefined default.
-        :return: Any - The structured response generated by the LLM provider.
-        :raises ValueError: If the specified configuration or provider is not present.
+        :param routing_text: str, optional - The text the routing rules classify, e.g. the user's question without retrieved context. Defaults to the user prompt.
+        :return: Any - The structured response generated by the LLM provider, or with ``schema_name`` the validated model instance.
+        :raises ValueError: If the specified configuration, provider or schema is not present.
+        :raises LLMProviderError: If the provider request failed after all retries, or its answer does not match the schema.
         """
 
         config_obj = self.get_config_object(config_name)
-        llm_provider = self.get_llm_provider(config_obj.llm_provider, config_name)
 
         config_data = config_obj.config_data
-        model = model or config_obj.model
-        llm_info = config_obj.llm_info
 
+        schema = None
+        if schema_name:
+            schema = schema_registry.get(schema_name)
+            response_format = schema.response_format
 
-        response = llm_provider.get_structured_output(
-            model=model,
+        request_params = dict(
+            model=model or config_obj.model,
             user_prompt=user_prompt,
             response_format=response_format,
             system_prompt=system_prompt or config_obj.system_behaviour,
@@ -181,7 +345,173 @@ class LLMInterface(object):
             n=n or config_obj.response_count,
             frequency_penalty=frequency_penalty if frequency_penalty is not None else config_data.get(
                 "frequency_penalty", OpenAIConstants.DEFAULT_FREQUENCY_PENALTY),
-            llm_info=llm_info
         )
 
-        return response
\ No newline at end of file
+        response = llm_response_cache.get_or_call(
+            config_obj,
+            'text',
+            lambda: self._route(
+                config_obj, 'get_structured_output', request_params, routing_text or user_prompt, None, routable=model is None),
+            provider=config_obj.llm_provider,
+            **dict(request_params, response_format=schema_name or response_format)
+        )
+        self._check_response(response, config_obj)
+
+        if schema is None:
+            return response
+        try:
+            return schema.validate(parse_structured_output(response))
+        except (ValidationError, ValueError, TypeError) as e:
+            raise LLMProviderError(f"Response for config {config_name} does not match schema {schema_name}: {str(e)}")
+
+    def submit_batch(
+            self,
+            config_name,
+            requests,
+            model=None,
+            system_prompt=None,
+            max_completion_tokens=None,
+            temperature=None,
+            frequency_penalty=None
+    ):
+        """
+        Submit many requests as one provider batch job, for workloads that do not need an immediate answer.
+        Batches are billed at a discount and are usually finished within hours.
+
+        :param config_name: str - The name of the configuration to use for every request.
+        :param requests: list - Dicts with either a ``user_prompt`` (sent with the system prompt) or a full ``messages`` list,
+            and optionally a ``custom_id`` (defaults to the request's index) to match results to requests.
+        :param model: str, optional - The model to be used for the requests. Defaults to the model specified in the configuration.
+        :param system_prompt: str, optional - The system's behavior prompt for ``user_prompt`` requests. Defaults to the system behavior in the configuration.
+        :param max_completion_tokens: int, optional - The maximum number of tokens in each completion. Defaults to the value in the configuration or a predefined default.
+        :param temperature: float, optional - The randomness of the model's responses. Defaults to the value in the configuration or a predefined low temperature.
+        :param frequency_penalty: float, optional - A penalty for using repetitive words. Defaults to the value in the configuration or a predefined default.
+        :return: LLMBatchJob - The submitted job; pass it to ``poll_batch`` or ``wait_for_batch`` to collect the results.
+        :raises ValueError: If there are no requests or too many, or the configuration or provider is not present.
+        """
+        if not requests:
+            raise ValueError("No requests to submit")
+        if len(requests) > BatchConstants.MAX_REQUESTS:
+            raise ValueError(f"A batch can hold at most {BatchConstants.MAX_REQUESTS} requests")
+
+        config_obj = self.get_config_object(config_name)
+        llm_provider = self.get_llm_provider(config_obj.llm_provider, config_name)
+
+        config_data = config_obj.config_data or {}
+        model = model or config_obj.model
+        system_prompt = system_prompt or config_obj.system_behaviour
+
+        batch_requests = []
+        for index, request in enumerate(requests):
+            messages = request.get("messages")
+            if not messages:
+                messages = [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": request.get("user_prompt")}
+                ]
+            batch_requests.append({"custom_id": str(request.get("custom_id", index)), "messages": messages})
+
+        provider_batch_id = llm_provider.submit_batch(
+            model=model,
+            requests=batch_requests,
+            max_completion_tokens=max_completion_tokens or config_data.get("max_completion_tokens", OpenAIConstants.DEFAULT_MAX_COMPLETION_TOKENS),
+            temperature=temperature if temperature is not None else config_data.get("temperature", OpenAIConstants.LOW_TEMPERATURE),
+            frequency_penalty=frequency_penalty if frequency_penalty is not None else config_data.get("frequency_penalty", OpenAIConstants.DEFAULT_FREQUENCY_PENALTY),
+        )
+
+        return LLMBatchJob.objects.create(
+            user_id=ThreadContainer.get_current_user_id(),
+            config_name=config_name,
+            llm_provider=config_obj.llm_provider,
+            model=model,
+            provider_batch_id=provider_batch_id,
+            status=BatchConstants.SUBMITTED,
+            request_count=len(batch_requests),
+        )
+
+    def poll_batch(self, batch_job, on_result=None):
+        """
+        Refresh a batch job's status. Once the batch has finished, every result is written to ``LLMRequestLog``
+        at the batch price and passed to ``on_result``. A job's results are only processed once: the poller
+        that finds it finished first claims it with a conditional update, and overlapping polls return the job
+        as claimed. A job whose processing failed part-way stays claimed with no ``completed_at``.
+
+        :param batch_job: LLMBatchJob - The job returned by ``submit_batch``.
+        :param on_result: callable, optional - Called with each result dict (``custom_id``, ``status``, ``content``, ...).
+        :return: LLMBatchJob - The updated job.
+        """
+        if batch_job.results_processed:
+            return batch_job
+
+        config_obj = self.get_config_object(batch_job.config_name)
+        llm_provider = self.get_llm_provider(batch_job.llm_provider, batch_job.config_name)
+
+        batch_status = llm_provider.get_batch_status(batch_job.provider_batch_id)
+        batch_job.status = batch_status["status"]
+        batch_job.succeeded_count = batch_status["succeeded"]
+        batch_job.failed_count = batch_status["failed"]
+        if batch_job.status not in BatchConstants.FINISHED_STATUSES:
+            batch_job.save()
+            return batch_job
+
+        claimed = LLMBatchJob.objects.filter(id=batch_job.id, results_processed=False).update(
+            results_processed=True,
+            status=batch_job.status,
+            succeeded_count=batch_job.succeeded_count,
+            failed_count=batch_job.failed_count,
+        )
+        if not claimed:
+            batch_job.refresh_from_db()
+            return batch_job
+        batch_job.results_processed = True
+
+        total_cost = 0
+        for result in llm_provider.get_batch_results(batch_job.provider_batch_id, config_obj.llm_info):
+            log_llm_request(
+                model=batch_job.model,
+                config_name=batch_job.config_name,
+                request_type=BatchConstants.REQUEST_TYPE,
+                request_data={"batch_job_id": batch_job.id, "custom_id": result["custom_id"]},
+                response_data=result["response_data"],
+                response_cost=result["response_cost"],
+                usage_data=result["usage_data"],
+                status=result["status"],
+                meta_data={"batch_job_id": batch_job.id, "provider_batch_id": batch_job.provider_batch_id},
+                user_id=batch_job.user_id,
+            )
+            total_cost += result["response_cost"]
+            if on_result:
+                on_result(result)
+
+        batch_job.total_cost = total_cost
+        batch_job.completed_at = timezone.now()
+        batch_job.save()
+        return batch_job
+
+    def wait_for_batch(self, batch_job, on_result=None, poll_interval=BatchConstants.POLL_INTERVAL, timeout=None):
+        """
+        Poll a batch job until its results have been processed.
+
+        :param timeout: float, optional - Give up after this many seconds and return the job as it is.
+        :return: LLMBatchJob - The updated job.
+        """
+        started = time.monotonic()
+        while True:
+            batch_job = self.poll_batch(batch_job, on_result=on_result)
+            if batch_job.results_processed:
+                return batch_job
+            if timeout is not None and time.monotonic() - started + poll_interval > timeout:
+                return batch_job
+            time.sleep(poll_interval)
+
+    def poll_pending_batches(self):
+        """
+        Poll every batch job whose results have not been processed yet, e.g. from a periodic task.
+
+        :return: list - The jobs that finished during this call.
+        """
+        finished = []
+        for batch_job in LLMBatchJob.objects.filter(results_processed=False):
+            if self.poll_batch(batch_job).results_processed:
+                finished.append(batch_job)
+        return finished
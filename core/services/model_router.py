@@ -0,0 +1,293 @@
+import logging
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from core.constants import RoutingConstants
+from core.services.background import with_thread_context
+from core.services.config_cache import llm_config_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ModelHealth(object):
+    """
+    Rolling latency and error statistics per ``provider:model``, over the last ``max_samples`` requests
+    within ``window`` seconds. Shared by every configuration in the process.
+    """
+
+    def __init__(self, window: float = RoutingConstants.WINDOW, max_samples: int = RoutingConstants.MAX_SAMPLES):
+        self.window = window
+        self.max_samples = max_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, latency: Optional[float], ok: bool):
+        """
+        :param key: str - ``provider:model``.
+        :param latency: float, optional - Seconds the request took (time to first token for streams).
+        :param ok: bool - Whether the request produced a response.
+        """
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.max_samples)
+            samples.append((time.monotonic(), latency, ok))
+
+    def snapshot(self, key: str) -> dict:
+        """
+        :return: dict - ``samples``, ``error_rate`` and ``p95_latency`` (seconds, None without successes) for the window.
+        """
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            samples = [sample for sample in self._samples.get(key, ()) if sample[0] >= cutoff]
+        latencies = sorted(latency for _, latency, ok in samples if ok and latency is not None)
+        failures = sum(1 for _, _, ok in samples if not ok)
+        return {
+            "samples": len(samples),
+            "error_rate": failures / len(samples) if samples else 0.0,
+            "p95_latency": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            keys = list(self._samples)
+        return {key: self.snapshot(key) for key in keys}
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+class ModelRouter(object):
+    """
+    Picks the configuration that serves a request, from routing rules in ``config_data["routing"]``::
+
+        {
+            "simple": {"config_name": "university-agent-mini", "max_chars": 80, "patterns": ["^(hi|hello|thanks)\\\\b"]},
+            "fallbacks": ["university-agent-claude"],
+            "max_p95_latency": 20,
+            "max_error_rate": 0.5,
+            "min_samples": 20,
+            "hedge_after": 3
+        }
+
+    A query that is at most ``max_chars`` long or matches one of ``patterns`` goes to the ``simple``
+    configuration first. Targets whose rolling p95 latency or error rate is over the limit (once they have
+    ``min_samples`` requests in the window) are tried last. A failed request moves on to the next target.
+    With ``hedge_after``, a second target is started when the first has not answered after that many
+    seconds and the first answer wins; the slower request still completes and is logged.
+
+    Targets are other configurations: their provider, model and pricing are used, while the prompt and
+    sampling parameters come from the original request. Each attempt's decision is passed on as
+    ``meta_data["routing"]`` so that it ends up in ``LLMRequestLog``.
+    """
+
+    def __init__(self, health: ModelHealth = None):
+        self.health = health or ModelHealth()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @staticmethod
+    def get_routing(config_obj) -> Optional[dict]:
+        return (config_obj.config_data or {}).get("routing") or None
+
+    @staticmethod
+    def health_key(config_obj) -> str:
+        return f"{config_obj.llm_provider}:{config_obj.model}"
+
+    @staticmethod
+    def is_simple(rule: dict, text: Optional[str]) -> bool:
+        if not text:
+            return False
+        text = text.strip()
+        max_chars = rule.get("max_chars", RoutingConstants.SIMPLE_MAX_CHARS)
+        if max_chars and len(text) <= max_chars:
+            return True
+        return any(re.search(pattern, text, re.IGNORECASE) for pattern in rule.get("patterns", ()))
+
+    def _unhealthy_reason(self, routing: dict, target) -> Optional[str]:
+        snapshot = self.health.snapshot(self.health_key(target))
+        if snapshot["samples"] < routing.get("min_samples", RoutingConstants.MIN_SAMPLES):
+            return None
+        max_error_rate = routing.get("max_error_rate", RoutingConstants.MAX_ERROR_RATE)
+        if snapshot["error_rate"] > max_error_rate:
+            return f"error rate {snapshot['error_rate']:.2f} > {max_error_rate}"
+        max_p95_latency = routing.get("max_p95_latency", RoutingConstants.MAX_P95_LATENCY)
+        if snapshot["p95_latency"] is not None and snapshot["p95_latency"] > max_p95_latency:
+            return f"p95 latency {snapshot['p95_latency']:.2f}s > {max_p95_latency}s"
+        return None
+
+    def plan(self, config_obj, routing_text: Optional[str] = None) -> Tuple[List[tuple], Optional[dict]]:
+        """
+        :param config_obj: LLMConfiguration - The configuration the request was made with.
+        :param routing_text: str, optional - The text the ``simple`` rule classifies, usually the user's query.
+        :return: tuple - The ``(configuration, reason)`` targets in the order to try them, and the routing
+            rules (None when the configuration has none).
+        """
+        routing = self.get_routing(config_obj)
+        if not routing:
+            return [(config_obj, "default")], None
+
+        candidates = []
+        simple = routing.get("simple")
+        if simple and self.is_simple(simple, routing_text):
+            candidates.append((simple.get("config_name"), "simple_query"))
+        candidates.append((config_obj, "default"))
+        candidates.extend((config_name, "fallback") for config_name in routing.get("fallbacks", ()))
+
+        targets, seen = [], set()
+        for target, reason in candidates:
+            if isinstance(target, str):
+                target_name = target
+                target = llm_config_cache.get(target_name)
+                if target is None:
+                    logger.warning(f"Routing target {target_name} of config {config_obj.config_name} is not present")
+                    continue
+            if target.config_name in seen:
+                continue
+            seen.add(target.config_name)
+            targets.append((target, reason))
+
+        healthy, unhealthy = [], []
+        for target, reason in targets:
+            unhealthy_reason = self._unhealthy_reason(routing, target)
+            if unhealthy_reason:
+                unhealthy.append((target, f"{reason}; unhealthy: {unhealthy_reason}"))
+            else:
+                healthy.append((target, reason))
+        return healthy + unhealthy, routing
+
+    @staticmethod
+    def _decision(config_obj, target, reason: str, attempt: int, plan: List[tuple], hedged: bool = False) -> dict:
+        return {
+            "config_name": config_obj.config_name,
+            "target": target.config_name,
+            "provider": target.llm_provider,
+            "model": target.model,
+            "reason": reason,
+            "attempt": attempt,
+            "hedged": hedged,
+            "plan": [{"target": candidate.config_name, "reason": candidate_reason} for candidate, candidate_reason in plan],
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Separate from the shared fan-out pool, since hedged calls are themselves made from fan-out tasks.
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "ROUTING_HEDGE_MAX_WORKERS", RoutingConstants.HEDGE_MAX_WORKERS),
+                    thread_name_prefix="hedge",
+                )
+            return self._executor
+
+    def _attempt(self, call: Callable, target, meta_data: Optional[dict]):
+        started = time.monotonic()
+        try:
+            response = call(target, meta_data)
+        except Exception as e:
+            logger.error(f"Request to {target.config_name} failed: {str(e)}")
+            response = None
+        ok = bool(response)
+        self.health.record(self.health_key(target), time.monotonic() - started if ok else None, ok)
+        return response
+
+    def call(self, config_obj, call: Callable, routing_text: Optional[str] = None, meta_data: Optional[dict] = None,
+             enabled: bool = True):
+        """
+        Make a request through the routing rules.
+
+        :param call: callable - ``call(target_config, meta_data)`` makes the request with a target and returns
+            the response, or None if it failed.
+        :param meta_data: dict, optional - The caller's request log metadata; the decision is added as ``routing``.
+        :param enabled: bool - False when the caller pinned a model, so only the configuration itself is used.
+        :return: Any - The first response, or None if every target failed.
+        """
+        plan, routing = self.plan(config_obj, routing_text) if enabled else ([(config_obj, "default")], None)
+        if routing is None:
+            return self._attempt(call, config_obj, meta_data)
+
+        def attempt_with(index, hedged=False):
+            target, reason = plan[index]
+            decision = self._decision(config_obj, target, reason, index + 1, plan, hedged=hedged)
+            return self._attempt(call, target, dict(meta_data or {}, routing=decision))
+
+        start = 0
+        hedge_after = routing.get("hedge_after")
+        if hedge_after and len(plan) > 1:
+            response = self._hedged(attempt_with, hedge_after)
+            if response:
+                return response
+            start = 2
+
+        for index in range(start, len(plan)):
+            response = attempt_with(index)
+            if response:
+                return response
+        return None
+
+    def _hedged(self, attempt_with: Callable, hedge_after: float):
+        executor = self._get_executor()
+        futures = [executor.submit(with_thread_context(attempt_with), 0, True)]
+        done, _ = wait(futures, timeout=hedge_after)
+        if not (done and futures[0].result()):
+            futures.append(executor.submit(with_thread_context(attempt_with), 1, True))
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.result():
+                    return future.result()
+        return None
+
+    def stream(self, config_obj, stream_call: Callable, routing_text: Optional[str] = None,
+               meta_data: Optional[dict] = None, enabled: bool = True) -> Iterator[str]:
+        """
+        Streaming counterpart of ``call``. A target that fails before its first chunk is replaced by the next
+        one; once text has been yielded, errors are raised. Streams are not hedged, and their latency is
+        recorded as time to first chunk.
+
+        :param stream_call: callable - ``stream_call(target_config, meta_data)`` returns an iterator of text deltas.
+        """
+        plan, routing = self.plan(config_obj, routing_text) if enabled else ([(config_obj, "default")], None)
+
+        error = None
+        for index, (target, reason) in enumerate(plan):
+            target_meta_data = meta_data
+            if routing is not None:
+                target_meta_data = dict(meta_data or {}, routing=self._decision(config_obj, target, reason, index + 1, plan))
+
+            started = time.monotonic()
+            stream = stream_call(target, target_meta_data)
+            try:
+                first = next(stream)
+            except StopIteration:
+                self.health.record(self.health_key(target), time.monotonic() - started, True)
+                return
+            except Exception as e:
+                self.health.record(self.health_key(target), None, False)
+                logger.error(f"Stream from {target.config_name} failed: {str(e)}")
+                error = e
+                continue
+
+            self.health.record(self.health_key(target), time.monotonic() - started, True)
+            try:
+                yield first
+                yield from stream
+            finally:
+                stream.close()
+            return
+
+        raise error
+
+    def stats(self) -> dict:
+        return self.health.stats()
+
+
+model_router = ModelRouter()
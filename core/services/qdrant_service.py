@@ -1,15 +1,29 @@
+import hashlib
 import json
 import os
-import qdrant_client
-import openai
-from qdrant_client.http import models
 import uuid
 import logging
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional
 import re
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.conf import settings
+from core.constants import EmbeddingConstants, OpenAIConstants, RetrievalConstants, SemanticCacheConstants, \
+    SingleFlightConstants, VectorStoreConstants
+from core.models import VectorCollectionManifest
+from core.services import background
+from core.services.client_registry import client_registry, get_openai_client, get_qdrant_client, \
+    get_qdrant_transport
+from core.services.context_packer import ContextPacker
+from core.services.embedding_batcher import embedding_batcher
+from core.services.embedding_cache import embedding_cache
+from core.providers.llm_service import log_llm_request
 from core.services.llm_interface import LLMInterface
-from university_agent.utils import get_previous_context_from_session, identify_creation_intent_and_execute
+from core.services.semantic_cache import semantic_response_cache
+from core.services.single_flight import single_flight
+from core.services.sparse_index import document_text, get_sparse_index, reciprocal_rank_fusion
+from core.services.vector_store import get_vector_store, get_vector_store_backend
+from university_agent.utils import get_session_memory, identify_creation_intent_and_execute
 
 logger = logging.getLogger(__name__)
 
@@ -20,29 +34,92 @@ class QdrantServiceError(Exception):
 
 
 class QdrantRAGAgent:
-    def __init__(self, collection_name: str = "newStudents"):
+    def __init__(self, collection_name: str = "newStudents", vector_store_backend: Optional[str] = None,
+                 retrieval_mode: Optional[str] = None):
         try:
             self.QDRANT_URL = os.environ.get("QDRANT_URL")
             self.QDRANT_API_KEY = os.environ.get("QDRANT_API_KEY")
-
-            if not self.QDRANT_URL or not self.QDRANT_API_KEY:
-                raise QdrantServiceError(
-                    "Missing Qdrant configuration. Please check QDRANT_URL and QDRANT_API_KEY environment variables.")
-
-            self.client = qdrant_client.QdrantClient(url=self.QDRANT_URL, api_key=self.QDRANT_API_KEY)
-            self.openai_client = openai.OpenAI()
             self.collection_name = collection_name
+            self.vector_store_backend = vector_store_backend or get_vector_store_backend(collection_name)
+
+            self.client = None
+            self.transport = None
+            if self.vector_store_backend == VectorStoreConstants.QDRANT:
+                if not self.QDRANT_URL or not self.QDRANT_API_KEY:
+                    raise QdrantServiceError(
+                        "Missing Qdrant configuration. Please check QDRANT_URL and QDRANT_API_KEY environment variables.")
+
+                self.client = get_qdrant_client(url=self.QDRANT_URL, api_key=self.QDRANT_API_KEY)
+                self.transport = get_qdrant_transport(url=self.QDRANT_URL, api_key=self.QDRANT_API_KEY)
+
+            self.vector_store = get_vector_store(
+                collection_name, backend=self.vector_store_backend, client=self.client, transport=self.transport)
+            self.retrieval_mode = retrieval_mode or self.get_retrieval_mode(collection_name)
+            self.sparse_index = get_sparse_index(collection_name)
             # self.knowledge_base = config.meta_data.get("knowledge_base", [])
 
             openai_api_key = os.environ.get("OPENAI_API_KEY")
             if not openai_api_key:
                 raise QdrantServiceError("Missing OpenAI API key. Please check OPENAI_API_KEY environment variable.")
 
-            self.openai_client.api_key = openai_api_key
+            self.openai_client = get_openai_client(openai_api_key)
         except Exception as e:
             logger.error(f"Failed to initialize QdrantRAGAgent: {str(e)}")
             raise QdrantServiceError(f"Initialization failed: {str(e)}")
 
+    @staticmethod
+    def get_retrieval_mode(collection_name: str) -> str:
+        return getattr(settings, "RETRIEVAL_MODES", {}).get(
+            collection_name, getattr(settings, "DEFAULT_RETRIEVAL_MODE", RetrievalConstants.DENSE))
+
+    def _embed_many(self, texts: List[str], model: str = EmbeddingConstants.DEFAULT_MODEL,
+                    batched: bool = False) -> List[List[float]]:
+        """
+        Embed ``texts`` through the embedding cache, only calling OpenAI for the texts it has not seen.
+
+        :param batched: bool - Send the missing texts through ``embedding_batcher``, so that they share an
+            embeddings request with other concurrent queries. Used for query-time embeddings.
+        """
+        vectors = embedding_cache.get_many(model, texts)
+        missing = [i for i in range(len(texts)) if i not in vectors]
+        if missing:
+            started = time.monotonic()
+            missing_texts = [texts[i] for i in missing]
+            if batched and embedding_batcher.is_enabled():
+                embeddings = embedding_batcher.embed_many(self.openai_client, model, missing_texts)
+            else:
+                response = self.openai_client.embeddings.create(
+                    model=model,
+                    input=missing_texts
+                )
+                embeddings = [item.embedding for item in response.data]
+            embedding_cache.record_miss_latency((time.monotonic() - started) * 1000)
+            fresh = {}
+            for i, embedding in zip(missing, embeddings):
+                vectors[i] = embedding
+                fresh[texts[i]] = embedding
+            embedding_cache.set_many(model, fresh)
+        return [vectors[i] for i in range(len(texts))]
+
+    def _embed(self, text: str, model: str = EmbeddingConstants.DEFAULT_MODEL) -> List[float]:
+        """
+        Embed one query. Concurrent requests for the same text share a single embedding call, and those
+        for different texts are micro-batched into one embeddings request.
+        """
+        return single_flight.do(
+            SingleFlightConstants.EMBEDDING,
+            embedding_cache.make_key(model, text),
+            lambda: self._embed_many([text], model=model, batched=True)[0]
+        )
+
+    @staticmethod
+    def get_embedding_cache_stats() -> dict:
+        return embedding_cache.stats()
+
+    @staticmethod
+    def get_embedding_batcher_stats() -> dict:
+        return embedding_batcher.stats()
+
     def search_qdrant_api(
             self,
             query_vector: List[float],
@@ -53,68 +130,71 @@ class QdrantRAGAgent:
         """
         Search Qdrant using direct REST API calls instead of the client library.
         This may help bypass Windows-specific network issues.
+        Calls go through the agent's pooled ``QdrantTransport`` so connections are reused between searches.
         """
-        qdrant_url = os.environ.get("QDRANT_URL")
-        qdrant_api_key = os.environ.get("QDRANT_API_KEY")
-
-        if not qdrant_url.endswith('/'):
-            qdrant_url += '/'
-
-        search_url = f"{qdrant_url}collections/{collection_name}/points/search"
-
-        print(search_url)
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-
-        if qdrant_api_key:
-            headers["api-key"] = qdrant_api_key
-
-        payload = {
-            "vector": query_vector,
-            "limit": limit,
-            "score_threshold": score_threshold,
-            "with_payload": True
-        }
-
+        if self.transport is None:
+            raise QdrantServiceError("Qdrant REST search is not available for a local vector store")
         try:
-            response = requests.post(
-                search_url,
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=60  # Set a generous timeout
+            return self.transport.search(
+                collection_name=collection_name,
+                query_vector=query_vector,
+                limit=limit,
+                score_threshold=score_threshold
             )
+        except Exception as e:
+            logger.error(f"Qdrant API request error: {str(e)}")
+            raise QdrantServiceError(f"Failed to search Qdrant via API: {str(e)}")
 
-            response.raise_for_status()  # Raise an exception for 4XX/5XX responses
-
-            result = response.json()
-            return result.get("result", [])
-        except QdrantServiceError as e:
+    async def asearch_qdrant_api(
+            self,
+            query_vector: List[float],
+            collection_name: str,
+            limit: int = 3,
+            score_threshold: float = 0.7
+    ):
+        """
+        Async variant of ``search_qdrant_api`` for ASGI deployments.
+        """
+        if self.transport is None:
+            raise QdrantServiceError("Qdrant REST search is not available for a local vector store")
+        try:
+            return await self.transport.asearch(
+                collection_name=collection_name,
+                query_vector=query_vector,
+                limit=limit,
+                score_threshold=score_threshold
+            )
+        except Exception as e:
             logger.error(f"Qdrant API request error: {str(e)}")
-            raise Exception(f"Failed to search Qdrant via API: {str(e)}")
+            raise QdrantServiceError(f"Failed to search Qdrant via API: {str(e)}")
 
     def get_context_from_vector_db_api(self, user_query: str, n_points: int = 3, score_threshold: float = 0.7) -> str:
         if not user_query:
             logger.warning("Empty user query provided")
             return ""
 
+        vector_results = self.retrieve(user_query, n_points=n_points, score_threshold=score_threshold)
+        if not vector_results:
+            logger.warning("No results found in vector API search")
+            return ""
+
+        return self._format_context(vector_results)
+
+    def retrieve(self, user_query: str, n_points: int = 3, score_threshold: float = 0.7) -> List[dict]:
+        """
+        Embed ``user_query`` and return the matching points, best first, in the Qdrant REST result shape.
+        """
         try:
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=user_query
-            )
-            query_vector = response.data[0].embedding
+            query_vector = self._embed(user_query)
         except Exception as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise Exception(f"Failed to generate embeddings: {str(e)}")
 
-        print("Searching Qdrant via API")
+        logger.debug(f"Searching {self.vector_store_backend} collection {self.collection_name} ({self.retrieval_mode})")
         try:
-            # Use the API search function instead of client library
-            vector_results = self.search_qdrant_api(
+            vector_results = self.search(
+                user_query=user_query,
                 query_vector=query_vector,
-                collection_name=self.collection_name,
                 limit=n_points,
                 score_threshold=score_threshold
             )
@@ -122,10 +202,40 @@ class QdrantRAGAgent:
             logger.error(f"Qdrant API search error: {str(e)}")
             raise Exception(f"Failed to search vector database via API: {str(e)}")
 
-        if not vector_results:
-            logger.warning("No results found in vector API search")
-            return ""
+        return vector_results
+
+    def search(self, user_query: str, query_vector: List[float], limit: int = 3, score_threshold: float = 0.7):
+        """
+        Retrieve the ``limit`` best points for a query.
 
+        In ``dense`` mode this is a plain vector search. In ``hybrid`` mode a larger candidate pool is
+        taken from both the vector store (still subject to ``score_threshold``) and the BM25 index (subject
+        to ``HYBRID_SPARSE_MIN_SCORE``), and the two rankings are fused with reciprocal rank fusion.
+
+        Concurrent identical searches on the same collection share one search.
+        """
+        key = json.dumps([self.vector_store_backend, self.collection_name, self.retrieval_mode,
+                          " ".join(user_query.split()), limit, score_threshold])
+        return single_flight.do(
+            SingleFlightConstants.VECTOR_SEARCH,
+            key,
+            lambda: self._search(user_query, query_vector, limit=limit, score_threshold=score_threshold)
+        )
+
+    def _search(self, user_query: str, query_vector: List[float], limit: int = 3, score_threshold: float = 0.7):
+        if self.retrieval_mode != RetrievalConstants.HYBRID:
+            return self.vector_store.search(query_vector=query_vector, limit=limit, score_threshold=score_threshold)
+
+        candidates = limit * RetrievalConstants.CANDIDATE_MULTIPLIER
+        dense_results = self.vector_store.search(
+            query_vector=query_vector, limit=candidates, score_threshold=score_threshold)
+        sparse_results = self.sparse_index.search(
+            user_query, limit=candidates,
+            min_score=getattr(settings, "HYBRID_SPARSE_MIN_SCORE", RetrievalConstants.SPARSE_MIN_SCORE))
+        return reciprocal_rank_fusion([dense_results, sparse_results], limit=limit)
+
+    @staticmethod
+    def _format_context(vector_results) -> str:
         if len(vector_results) == 1:
             return vector_results[0].get('payload', {}).get('context', "")
 
@@ -137,39 +247,150 @@ class QdrantRAGAgent:
         context = "\n\n".join(context_parts)
         return context
 
-    def create_collection(self, knowledge_base):
+    def create_collection(self, knowledge_base, max_batch_tokens: int = EmbeddingConstants.MAX_BATCH_TOKENS,
+                          max_concurrency: int = EmbeddingConstants.INGEST_CONCURRENCY, full_rebuild: bool = False):
         self._ensure_collection_exists()
-        self._populate_collection(knowledge_base)
+        self._populate_collection(knowledge_base, max_batch_tokens=max_batch_tokens,
+                                  max_concurrency=max_concurrency, full_rebuild=full_rebuild)
 
     def _ensure_collection_exists(self):
-        """Create the Qdrant collection if it doesn't exist."""
+        """
+        Create the collection in the configured vector store if it doesn't exist. A new collection is
+        empty, so any manifest recorded for an earlier one is dropped.
+        """
+        try:
+            exists = self.vector_store.collection_exists()
+        except Exception as e:
+            logger.error(f"Failed to check collection: {str(e)}")
+            raise QdrantServiceError(f"Failed to check collection: {str(e)}")
+        if exists:
+            logger.info(f"Collection {self.collection_name} already exists")
+            return
+
+        logger.info(f"Creating {self.vector_store_backend} collection {self.collection_name}...")
         try:
-            self.client.get_collection(self.collection_name)
-            print(f"Collection {self.collection_name} already exists")
+            self.vector_store.ensure_collection(vector_size=EmbeddingConstants.VECTOR_SIZE)
+            VectorCollectionManifest.objects.filter(collection_name=self.collection_name).delete()
+            logger.info(f"Collection {self.collection_name} created successfully")
         except Exception as e:
-            print(f"Creating collection {self.collection_name}...")
+            logger.error(f"Failed to create collection: {str(e)}")
+            raise QdrantServiceError(f"Failed to create collection: {str(e)}")
+
+    @staticmethod
+    def _kb_text(kb) -> str:
+        return f'''
+                {kb}
+                '''
+
+    @staticmethod
+    def _point_id(kb, model: str = EmbeddingConstants.DEFAULT_MODEL) -> str:
+        """
+        Deterministic point id derived from the entry's content and the embedding model, so the same
+        entry always maps to the same point and a model change re-embeds everything.
+        """
+        content = json.dumps(kb, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(f"{model}:{content}".encode("utf-8")).hexdigest()
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, digest))
+
+    def _load_manifest(self) -> set:
+        """
+        Point ids currently stored in the collection. When no manifest has been recorded yet it is
+        bootstrapped from the collection itself, so points written before manifests existed are diffed too.
+        A manifest whose size differs from the collection's point count (the collection was emptied,
+        recreated or moved to another cluster) is not trusted and the ids are listed instead.
+        Local stores list their own ids cheaply and do not keep a manifest.
+        """
+        if self.vector_store_backend == VectorStoreConstants.LOCAL:
+            return self.vector_store.list_point_ids()
+
+        manifest = VectorCollectionManifest.objects.filter(collection_name=self.collection_name).first()
+        if manifest:
+            point_count = self.vector_store.count()
+            if point_count == len(manifest.point_ids):
+                return set(manifest.point_ids)
+            logger.warning(f"Manifest of {self.collection_name} lists {len(manifest.point_ids)} points but the "
+                           f"collection has {point_count}; listing the collection's points instead")
+
+        return self.vector_store.list_point_ids()
+
+    def _save_manifest(self, point_ids: set):
+        if self.vector_store_backend == VectorStoreConstants.LOCAL:
+            return
+        VectorCollectionManifest.objects.update_or_create(
+            collection_name=self.collection_name,
+            defaults={'point_ids': sorted(point_ids)}
+        )
+
+    def _delete_points(self, point_ids: List[str], batch_size: int = 1000):
+        for i in range(0, len(point_ids), batch_size):
             try:
-                self.client.recreate_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=models.VectorParams(
-                        size=1536,
-                        distance=models.Distance.COSINE
-                    )
-                )
-                print("Collection created successfully")
+                self.vector_store.delete(point_ids[i:i + batch_size])
             except Exception as e:
-                logger.error(f"Failed to create collection: {str(e)}")
-                raise QdrantServiceError(f"Failed to create collection: {str(e)}")
+                logger.error(f"Error deleting points: {str(e)}")
+                raise QdrantServiceError(f"Failed to delete points: {str(e)}")
+
+    @staticmethod
+    def _iter_embedding_batches(entries, max_batch_tokens: int, max_batch_size: int):
+        """
+        Group ``(point_id, kb, text)`` entries into embedding batches whose estimated token count stays
+        within ``max_batch_tokens``. Entries are consumed lazily so the whole corpus is never held at once.
+        """
+        batch, batch_tokens = [], 0
+        for entry in entries:
+            tokens = len(entry[2]) // OpenAIConstants.TOKEN_MULTIPLIER + 1
+            if batch and (batch_tokens + tokens > max_batch_tokens or len(batch) >= max_batch_size):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(entry)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _embed_and_upsert_batch(self, batch) -> List[str]:
+        vectors = self._embed_many([text for _, _, text in batch])
+        points = [
+            {
+                'id': point_id,
+                'vector': vector,
+                'payload': {
+                    'context': kb
+                }
+            }
+            for (point_id, kb, _), vector in zip(batch, vectors)
+        ]
+        try:
+            self.vector_store.upsert(points)
+        except Exception as e:
+            raise QdrantServiceError(f"Failed to insert batch: {str(e)}")
+        return [point_id for point_id, _, _ in batch]
+
+    def _populate_collection(self, knowledge_base, max_batch_tokens: int = EmbeddingConstants.MAX_BATCH_TOKENS,
+                             max_concurrency: int = EmbeddingConstants.INGEST_CONCURRENCY, full_rebuild: bool = False):
+        """
+        Incrementally sync the Qdrant collection with the knowledge-base entries.
 
-    def _populate_collection(self, knowledge_base):
-        """Populate the Qdrant collection with meeting data."""
-        print("Starting collection population...")
+        Point ids are derived from entry content, and the ids already stored are tracked in a
+        ``VectorCollectionManifest``. Only new or changed entries are embedded and upserted, and
+        points whose entry disappeared are deleted. ``full_rebuild`` ignores the manifest and re-upserts
+        every entry.
+
+        Entries are embedded in multi-input batches sized by ``max_batch_tokens``, with at most
+        ``max_concurrency`` batches in flight. Each batch is upserted as soon as its embeddings arrive,
+        so memory stays bounded by the in-flight batches rather than the corpus size.
+
+        The BM25 sparse index used by hybrid retrieval is rebuilt from the same scan, since it needs
+        no embedding calls.
+        """
+        logger.info(f"Starting population of collection {self.collection_name}")
 
         try:
-            collection_info = self.client.get_collection(self.collection_name)
+            exists = self.vector_store.collection_exists()
         except Exception as e:
-            logger.error(f"Error checking collection: {str(e)}")
+            logger.error(f"Failed to check collection: {str(e)}")
             raise QdrantServiceError(f"Failed to check collection: {str(e)}")
+        if not exists:
+            logger.error(f"Collection {self.collection_name} does not exist")
+            raise QdrantServiceError(f"Failed to check collection: {self.collection_name} does not exist")
 
         try:
             if not knowledge_base:
@@ -179,73 +400,96 @@ class QdrantRAGAgent:
             logger.error(f"Failed to fetch knowledge base configuration: {str(e)}")
             raise QdrantServiceError(f"Failed to fetch knowledge base: {str(e)}")
 
-        points = []
-        for i, kb in enumerate(knowledge_base):
-            try:
-                text_to_embed = f'''
-                {kb}
-                '''
+        try:
+            existing_ids = self._load_manifest()
+        except Exception as e:
+            logger.error(f"Error loading collection manifest: {str(e)}")
+            raise QdrantServiceError(f"Failed to load collection manifest: {str(e)}")
+
+        seen_ids = set()
+        sparse_documents = {}
 
-                try:
-                    vector = self.openai_client.embeddings.create(
-                        model="text-embedding-ada-002",
-                        input=text_to_embed
-                    ).data[0].embedding
-                except Exception as e:
-                    logger.error(f"OpenAI API error for kb {i}: {str(e)}")
+        def changed_entries():
+            for kb in knowledge_base:
+                point_id = self._point_id(kb)
+                if point_id in seen_ids:
                     continue
+                seen_ids.add(point_id)
+                text = self._kb_text(kb)
+                sparse_documents[point_id] = {'text': document_text(kb), 'payload': {'context': kb}}
+                if full_rebuild or point_id not in existing_ids:
+                    yield point_id, kb, text
+
+        started = time.monotonic()
+        inserted_ids, failed = set(), 0
+        upsert_error = None
+
+        batches = self._iter_embedding_batches(
+            changed_entries(), max_batch_tokens=max_batch_tokens, max_batch_size=EmbeddingConstants.MAX_BATCH_SIZE)
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            pending = {}
+
+            def collect(done):
+                nonlocal failed, upsert_error
+                for future in done:
+                    size = pending.pop(future)
+                    try:
+                        inserted_ids.update(future.result())
+                    except Exception as e:
+                        failed += size
+                        logger.error(f"Error processing batch of {size} kb: {str(e)}")
+                        if isinstance(e, QdrantServiceError):
+                            upsert_error = upsert_error or e
+                elapsed = time.monotonic() - started
+                logger.info(
+                    f"Collection {self.collection_name}: upserted {len(inserted_ids)} kb "
+                    f"({len(seen_ids)} scanned), {failed} failed, "
+                    f"{len(inserted_ids) / elapsed if elapsed else 0:.1f} kb/s"
+                )
 
-                point_id = str(uuid.uuid4())
-                points.append(models.PointStruct(
-                    id=point_id,
-                    vector=vector,
-                    payload={
-                        'context': kb
-                    }
-                ))
+            for batch in batches:
+                if len(pending) >= max_concurrency:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[executor.submit(self._embed_and_upsert_batch, batch)] = len(batch)
 
-                if (i + 1) % 100 == 0:
-                    print(f"Processed {i + 1} kb...")
+            if pending:
+                done, _ = wait(pending)
+                collect(done)
 
-            except Exception as e:
-                logger.error(f"Error processing kb {i}: {str(e)}")
-                continue
+        removed_ids = sorted(existing_ids - seen_ids)
+        if removed_ids:
+            self._delete_points(removed_ids)
 
-        if not points:
-            logger.warning("No valid points to insert")
-            return
+        stored_ids = (existing_ids & seen_ids) | inserted_ids
+        self._save_manifest(stored_ids)
+        self.sparse_index.replace({point_id: sparse_documents[point_id] for point_id in stored_ids})
+        if inserted_ids or removed_ids:
+            semantic_response_cache.invalidate(self.collection_name)
 
-        batch_size = 100
-        for i in range(0, len(points), batch_size):
-            batch = points[i:i + batch_size]
-            try:
-                self.client.upsert(
-                    collection_name=self.collection_name,
-                    points=batch
-                )
-                print(f"Inserted batch {i // batch_size + 1} of {len(points) // batch_size + 1}")
-            except Exception as e:
-                logger.error(f"Error inserting batch: {str(e)}")
-                raise QdrantServiceError(f"Failed to insert batch: {str(e)}")
+        if upsert_error is not None:
+            raise upsert_error
 
-        print("Collection population complete")
+        logger.info(f"Collection {self.collection_name} sync complete: {len(inserted_ids)} upserted, "
+                    f"{len(removed_ids)} deleted, {len(seen_ids) - len(inserted_ids) - failed} unchanged, "
+                    f"{failed} failed in {time.monotonic() - started:.1f}s")
 
     def get_context_from_vector_db(self, user_query: str, n_points: int = 3, score_threshold: float = 0.7) -> str:
         if not user_query:
             logger.warning("Empty user query provided")
             return ""
 
+        if self.client is None:
+            return self.get_context_from_vector_db_api(user_query, n_points=n_points, score_threshold=score_threshold)
+
         try:
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=user_query
-            )
-            query_vector = response.data[0].embedding
+            query_vector = self._embed(user_query)
         except Exception as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise QdrantServiceError(f"Failed to generate embeddings: {str(e)}")
 
-        print("Searching Qdrant")
+        logger.debug(f"Searching Qdrant collection {self.collection_name}")
         try:
             vector_results = self.client.search(
                 collection_name=self.collection_name,
@@ -273,22 +517,95 @@ class QdrantRAGAgent:
         return context
 
     def get_response_using_rag(self, config_name, user_query: str, n_points: int = 3,
-                               previous_context: Optional[List[Dict[str, str]]] = None) -> str:
+                               previous_context: Optional[List[Dict[str, str]]] = None,
+                               session_summary: Optional[str] = None,
+                               vector_results: Optional[List[dict]] = None,
+                               stage_timings: Optional[Dict[str, float]] = None) -> str:
+        """
+        :param vector_results: list, optional - Points already retrieved for ``user_query``; retrieval is skipped.
+        :param stage_timings: dict, optional - Per-stage durations in ms, updated in place and logged with the request.
+        """
         if not user_query:
             logger.warning("Empty user query provided")
             return ""
 
-        if previous_context is None:
-            previous_context = []
+        if stage_timings is None:
+            stage_timings = {}
 
+        rag_request = self._prepare_rag_request(
+            config_name, user_query, n_points, previous_context, session_summary, vector_results, stage_timings)
+        if "answer" in rag_request:
+            return rag_request["answer"]
+
+        started = time.perf_counter()
         try:
-            context = self.get_context_from_vector_db_api(
-                user_query=user_query,
-                n_points=n_points
+            content = LLMInterface().get_custom_response_from_context(
+                messages=rag_request["messages"],
+                config_name="university-agent",
+                meta_data=rag_request["meta_data"],
+                routing_text=user_query
             )
-        except QdrantServiceError as e:
-            logger.error(f"Failed to get context: {str(e)}")
-            context = ""
+        except Exception as e:
+            logger.error(f"Failed to get response from LLM: {str(e)}")
+            return "I apologize, but I'm having trouble generating a response at the moment."
+        stage_timings["llm_ms"] = (time.perf_counter() - started) * 1000
+
+        self._finish_rag_request(rag_request, user_query, content, stage_timings)
+        return content
+
+    def stream_response_using_rag(self, config_name, user_query: str, n_points: int = 3,
+                                  previous_context: Optional[List[Dict[str, str]]] = None,
+                                  session_summary: Optional[str] = None,
+                                  vector_results: Optional[List[dict]] = None,
+                                  stage_timings: Optional[Dict[str, float]] = None) -> Iterator[str]:
+        """
+        Same as ``get_response_using_rag``, but yields the answer as text deltas while it is generated.
+        Cached answers and error messages are yielded as a single chunk.
+        """
+        if not user_query:
+            logger.warning("Empty user query provided")
+            return
+
+        if stage_timings is None:
+            stage_timings = {}
+
+        rag_request = self._prepare_rag_request(
+            config_name, user_query, n_points, previous_context, session_summary, vector_results, stage_timings)
+        if "answer" in rag_request:
+            yield rag_request["answer"]
+            return
+
+        started = time.perf_counter()
+        parts = []
+        try:
+            for delta in LLMInterface().get_streaming_response_from_context(
+                    messages=rag_request["messages"],
+                    config_name="university-agent",
+                    meta_data=rag_request["meta_data"],
+                    routing_text=user_query):
+                if not parts:
+                    stage_timings["llm_first_token_ms"] = (time.perf_counter() - started) * 1000
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            logger.error(f"Failed to stream response from LLM: {str(e)}")
+            if not parts:
+                yield "I apologize, but I'm having trouble generating a response at the moment."
+            return
+        stage_timings["llm_ms"] = (time.perf_counter() - started) * 1000
+
+        self._finish_rag_request(rag_request, user_query, "".join(parts), stage_timings)
+
+    def _prepare_rag_request(self, config_name, user_query: str, n_points: int,
+                             previous_context: Optional[List[Dict[str, str]]], session_summary: Optional[str],
+                             vector_results: Optional[List[dict]], stage_timings: Dict[str, float]) -> dict:
+        """
+        Everything before the answer is generated: configuration, semantic cache lookup, retrieval and prompt packing.
+
+        :return: dict - Either ``answer`` (a cached answer or an error message to return as is), or the
+            ``messages`` and ``meta_data`` for the LLM call plus the state ``_finish_rag_request`` needs.
+        """
+        previous_context = self._history_messages(previous_context, user_query)
 
         try:
             config_obj = LLMInterface().get_config_object(config_name=config_name)
@@ -296,47 +613,160 @@ class QdrantRAGAgent:
                 raise QdrantServiceError("Failed to get RAG messaging agent configuration")
         except Exception as e:
             logger.error(f"Failed to get configuration: {str(e)}")
-            return "I apologize, but I'm having trouble accessing the configuration at the moment."
+            return {"answer": "I apologize, but I'm having trouble accessing the configuration at the moment."}
+
+        semantic_cache_config = self._get_semantic_cache_config(config_obj)
+        use_semantic_cache = semantic_cache_config["enabled"] and not previous_context and not session_summary
+        query_vector = None
+        if use_semantic_cache:
+            started = time.perf_counter()
+            try:
+                query_vector = self._embed(user_query)
+                cached = semantic_response_cache.lookup(
+                    config_name, self.collection_name, query_vector, threshold=semantic_cache_config["threshold"])
+            except Exception as e:
+                logger.warning(f"Semantic cache lookup failed: {str(e)}")
+                cached = None
+            stage_timings["semantic_cache_ms"] = (time.perf_counter() - started) * 1000
+
+            if cached:
+                self._log_semantic_cache_hit(config_obj, user_query, cached)
+                return {"answer": cached["answer"]}
+
+        if vector_results is None:
+            started = time.perf_counter()
+            try:
+                vector_results = self.retrieve(
+                    user_query=user_query,
+                    n_points=n_points
+                )
+            except QdrantServiceError as e:
+                logger.error(f"Failed to get context: {str(e)}")
+                vector_results = []
+            stage_timings["retrieval_ms"] = (time.perf_counter() - started) * 1000
 
         try:
             system_prompt = config_obj.system_behaviour
 
+            packed = ContextPacker.for_config(config_obj).pack(
+                system_prompt=system_prompt or "",
+                question=user_query,
+                chunks=[str(r.get('payload', {}).get('context', "")) for r in vector_results],
+                history=previous_context,
+                summary=session_summary
+            )
+            context = "\n\n".join(packed["chunks"])
+
             meta_prompt = f'''
             Context to be used: {context.strip()}
-            Previous Conversation: {previous_context}
             Current Question: {user_query.strip()}
             Answer:
             '''
         except Exception as e:
             logger.error(f"Failed to format metaprompt: {str(e)}")
-            return "I apologize, but I'm having trouble processing your request at the moment."
+            return {"answer": "I apologize, but I'm having trouble processing your request at the moment."}
+
+        # Ordered from least to most volatile, so that consecutive requests share the longest possible prefix
+        # for provider-side prompt caching: static instructions, then session memory, then context and question.
+        messages = [{"role": "system", "content": system_prompt}]
+        if session_summary:
+            messages.append({"role": "system", "content": f"Summary of Earlier Conversation: {session_summary}"})
+        messages.extend(packed["history"])
+        messages.append({"role": "user", "content": meta_prompt})
+
+        meta_data = {
+            "prompt_tokens": packed["tokens"],
+            "semantic_cache": dict(semantic_response_cache.stats(), hit=False, used=use_semantic_cache),
+            "stage_timings_ms": stage_timings
+        }
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": meta_prompt}
+        return {
+            "config_name": config_name,
+            "messages": messages,
+            "meta_data": meta_data,
+            "packed_tokens": packed["tokens"],
+            "semantic_cache_config": semantic_cache_config,
+            "use_semantic_cache": use_semantic_cache,
+            "query_vector": query_vector,
+        }
+
+    @staticmethod
+    def _history_messages(previous_context: Optional[List[Dict[str, str]]], user_query: str) -> List[Dict[str, str]]:
+        """
+        Previous turns as chat messages. The current question, which the views store before answering, is
+        dropped from the end, and the history starts at a user turn, as Anthropic requires.
+        """
+        history = [
+            {"role": message["role"], "content": message["content"]}
+            for message in previous_context or []
+            if message.get("role") in ("user", "assistant") and message.get("content")
         ]
+        if history and history[-1]["role"] == "user" and history[-1]["content"].strip() == user_query.strip():
+            history.pop()
+        while history and history[0]["role"] != "user":
+            history.pop(0)
+        return history
+
+    def _finish_rag_request(self, rag_request: dict, user_query: str, content: str, stage_timings: Dict[str, float]):
+        logger.info(f"RAG stage timings for {self.collection_name}: "
+                    + ", ".join(f"{stage}={ms:.1f}" for stage, ms in stage_timings.items()))
+
+        if rag_request["use_semantic_cache"] and rag_request["query_vector"] is not None and content:
+            estimated_tokens = rag_request["packed_tokens"]["total"] + len(content) // OpenAIConstants.TOKEN_MULTIPLIER
+            semantic_response_cache.store(
+                rag_request["config_name"], self.collection_name, user_query, rag_request["query_vector"], content,
+                tokens=estimated_tokens, ttl=rag_request["semantic_cache_config"]["ttl"]
+            )
 
+    @staticmethod
+    def _get_semantic_cache_config(config_obj) -> dict:
+        """
+        Semantic cache settings, overridable per configuration through ``config_data["semantic_cache"]``.
+        The cache is never enabled without a shared generation cache to invalidate it through.
+        """
+        overrides = (config_obj.config_data or {}).get("semantic_cache", {})
+        enabled = overrides.get("enabled", getattr(settings, "SEMANTIC_CACHE_ENABLED", False))
+        return {
+            "enabled": bool(enabled) and semantic_response_cache.is_usable(),
+            "threshold": overrides.get("threshold"),
+            "ttl": overrides.get("ttl"),
+        }
+
+    @staticmethod
+    def _log_semantic_cache_hit(config_obj, user_query: str, cached: dict):
         try:
-            content = LLMInterface().get_custom_response_from_context(
-                messages=messages,
-                config_name="university-agent",
+            log_llm_request(
+                model=config_obj.model,
+                config_name=config_obj.config_name,
+                request_type='text',
+                request_data={"user_query": user_query},
+                response_data={"content": cached["answer"], "cached_query": cached["query"]},
+                response_cost=0,
+                usage_data={},
+                status=SemanticCacheConstants.CACHE_HIT_STATUS,
+                meta_data={
+                    "semantic_cache": dict(
+                        semantic_response_cache.stats(),
+                        hit=True,
+                        similarity=cached["similarity"],
+                        saved_tokens_this_request=cached["tokens"],
+                    )
+                }
             )
-            return content
         except Exception as e:
-            logger.error(f"Failed to get response from LLM: {str(e)}")
-            return "I apologize, but I'm having trouble generating a response at the moment."
-
+            logger.error(f"Failed to log semantic cache hit: {str(e)}")
 
     def get_response_for_new_user(self, user_query: str, session_id: Optional[str] = None) -> str:
         try:
-            previous_context = []
+            session_memory = {"summary": None, "recent": []}
             if session_id:
-                previous_context = get_previous_context_from_session(session_id)
+                session_memory = get_session_memory(session_id)
 
             response = self.get_response_using_rag(
                 user_query=user_query,
                 n_points=2,
-                previous_context=previous_context,
+                previous_context=session_memory["recent"],
+                session_summary=session_memory["summary"],
                 config_name='university-agent'
             )
             return response
@@ -344,27 +774,141 @@ class QdrantRAGAgent:
             logger.error(f"Failed to get response for rag agent: {str(e)}")
             return "I apologize, but I'm having trouble processing your request at the moment."
 
+    def stream_response_for_new_user(self, user_query: str, session_id: Optional[str] = None) -> Iterator[str]:
+        try:
+            session_memory = {"summary": None, "recent": []}
+            if session_id:
+                session_memory = get_session_memory(session_id)
+        except Exception as e:
+            logger.error(f"Failed to get response for rag agent: {str(e)}")
+            yield "I apologize, but I'm having trouble processing your request at the moment."
+            return
+
+        yield from self.stream_response_using_rag(
+            user_query=user_query,
+            n_points=2,
+            previous_context=session_memory["recent"],
+            session_summary=session_memory["summary"],
+            config_name='university-agent'
+        )
 
     def get_response_for_existing_user(self, user_query: str, session_id: Optional[str] = None) -> str:
         try:
-            previous_context = []
-            creation_intent, response = identify_creation_intent_and_execute(user_query=user_query)
+            stage_timings = {}
+            creation_intent, response, rag_kwargs = self._prepare_existing_user_query(
+                user_query, session_id, stage_timings)
             if creation_intent:
                 return response
-            if session_id:
-                previous_context = get_previous_context_from_session(session_id)
 
             response = self.get_response_using_rag(
                 user_query=user_query,
                 n_points=1,
-                previous_context=previous_context,
-                config_name='university-agent'
+                config_name='university-agent',
+                stage_timings=stage_timings,
+                **rag_kwargs
             )
             return response
         except Exception as e:
             logger.error(f"Failed to get response for rag agent: {str(e)}")
             return "I apologize, but I'm having trouble processing your request at the moment."
 
+    def stream_response_for_existing_user(self, user_query: str, session_id: Optional[str] = None) -> Iterator[str]:
+        try:
+            stage_timings = {}
+            creation_intent, response, rag_kwargs = self._prepare_existing_user_query(
+                user_query, session_id, stage_timings)
+        except Exception as e:
+            logger.error(f"Failed to get response for rag agent: {str(e)}")
+            yield "I apologize, but I'm having trouble processing your request at the moment."
+            return
+
+        if creation_intent:
+            yield response
+            return
+
+        yield from self.stream_response_using_rag(
+            user_query=user_query,
+            n_points=1,
+            config_name='university-agent',
+            stage_timings=stage_timings,
+            **rag_kwargs
+        )
+
+    @staticmethod
+    def _timed(stage_timings: Dict[str, float], stage: str, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stage_timings[stage] = (time.perf_counter() - started) * 1000
+
+    def _prepare_existing_user_query(self, user_query: str, session_id: Optional[str],
+                                     stage_timings: Dict[str, float]):
+        """
+        Run intent classification and load what the RAG answer needs.
+
+        With ``RAG_FANOUT_ENABLED``, retrieval is started speculatively on the shared pool while intent
+        classification and then session history loading run on the calling thread, so a request holds at
+        most one pool thread. If a task is created the retrieval is cancelled, or discarded if it has
+        already started. If the pool has not started it by the time the rest is done, it is cancelled and
+        run on the calling thread instead of waiting for a free pool thread. Retrieval is not speculated when the semantic cache is enabled for the answering
+        configuration, since a cache hit makes it unnecessary; it then runs after a miss.
+
+        :return: tuple - ``(creation_intent, response, rag_kwargs)``, where ``rag_kwargs`` are the session
+            memory and, when fanned out, retrieval results to pass on to ``get_response_using_rag``.
+        """
+        if not getattr(settings, "RAG_FANOUT_ENABLED", True) or self._semantic_cache_enabled('university-agent'):
+            creation_intent, response = self._timed(
+                stage_timings, "intent_ms", identify_creation_intent_and_execute, user_query=user_query)
+            if creation_intent:
+                return True, response, {}
+            session_memory = {"summary": None, "recent": []}
+            if session_id:
+                session_memory = self._timed(stage_timings, "history_ms", get_session_memory, session_id)
+            return False, response, {
+                "previous_context": session_memory["recent"],
+                "session_summary": session_memory["summary"],
+            }
+
+        started = time.perf_counter()
+        retrieval_future = background.submit(
+            self._timed, stage_timings, "retrieval_ms", self.retrieve, user_query=user_query, n_points=1)
+
+        try:
+            creation_intent, response = self._timed(
+                stage_timings, "intent_ms", identify_creation_intent_and_execute, user_query=user_query)
+            if creation_intent:
+                retrieval_future.cancel()
+                return True, response, {}
+
+            session_memory = {"summary": None, "recent": []}
+            if session_id:
+                session_memory = self._timed(stage_timings, "history_ms", get_session_memory, session_id)
+        except Exception:
+            retrieval_future.cancel()
+            raise
+
+        if retrieval_future.cancel():
+            # Still queued behind other requests' work on the shared pool: retrieving here is quicker.
+            vector_results = self._timed(
+                stage_timings, "retrieval_ms", self.retrieve, user_query=user_query, n_points=1)
+        else:
+            vector_results = retrieval_future.result()
+        stage_timings["prepare_ms"] = (time.perf_counter() - started) * 1000
+        return False, response, {
+            "previous_context": session_memory["recent"],
+            "session_summary": session_memory["summary"],
+            "vector_results": vector_results,
+        }
+
+    def _semantic_cache_enabled(self, config_name: str) -> bool:
+        try:
+            config_obj = LLMInterface().get_config_object(config_name=config_name)
+            return bool(config_obj) and self._get_semantic_cache_config(config_obj)["enabled"]
+        except Exception as e:
+            logger.error(f"Failed to get configuration: {str(e)}")
+            return False
+
     def get_response_for_tutor(self, user_query: str, user_details = None, user_level = "medium") -> str:
 
         user_query = f"User Details: {user_details}\n User Level: {user_level}\n User Query: {user_query}"
@@ -398,4 +942,18 @@ class QdrantRAGAgent:
             return response_dict
         except Exception as e:
             logger.error(f"Failed to get response for rag agent: {str(e)}")
-            return "I apologize, but I'm having trouble processing your request at the moment."
\ No newline at end of file
+            return "I apologize, but I'm having trouble processing your request at the moment."
+
+
+def get_rag_agent(collection_name: str = "newStudents") -> QdrantRAGAgent:
+    """
+    The shared ``QdrantRAGAgent`` for a collection. It is built once per process and rebuilt when the Qdrant
+    or OpenAI credentials, or the collection's vector store backend or retrieval mode, change.
+    """
+    vector_store_backend = get_vector_store_backend(collection_name)
+    fingerprint = (
+        os.environ.get("QDRANT_URL"), os.environ.get("QDRANT_API_KEY"), os.environ.get("OPENAI_API_KEY"),
+        vector_store_backend, QdrantRAGAgent.get_retrieval_mode(collection_name),
+    )
+    return client_registry.get(
+        ("rag_agent", collection_name), fingerprint, lambda: QdrantRAGAgent(collection_name=collection_name))
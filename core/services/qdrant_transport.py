@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class QdrantTransportError(Exception):
+    """Raised when a Qdrant REST call fails after all retries"""
+    pass
+
+
+class QdrantTransport(object):
+    """
+    Pooled, keep-alive HTTP transport for the Qdrant REST API.
+
+    One instance is meant to be owned by a ``QdrantRAGAgent`` (or shared between them) so that
+    connections are reused across searches instead of paying a TCP+TLS handshake per query.
+    Requests that time out or return a 5xx response are retried with jittered exponential backoff.
+    """
+
+    RETRY_STATUS_CODES = {500, 502, 503, 504}
+
+    def __init__(
+            self,
+            url: str,
+            api_key: Optional[str] = None,
+            pool_size: int = 20,
+            connect_timeout: float = 3.0,
+            read_timeout: float = 10.0,
+            max_retries: int = 3,
+            backoff_base: float = 0.1,
+            backoff_max: float = 2.0,
+            http2: bool = False
+    ):
+        """
+        :param url: str - Base URL of the Qdrant instance.
+        :param api_key: str, optional - Qdrant API key, sent as the ``api-key`` header.
+        :param pool_size: int - Maximum number of pooled (and kept-alive) connections.
+        :param connect_timeout: float - Seconds to wait for a connection to be established.
+        :param read_timeout: float - Seconds to wait for a response once connected.
+        :param max_retries: int - Retries after the first attempt for 5xx responses and timeouts.
+        :param backoff_base: float - Base delay in seconds of the exponential backoff.
+        :param backoff_max: float - Upper bound in seconds of a single backoff delay.
+        :param http2: bool - Negotiate HTTP/2 instead of HTTP/1.1 keep-alive.
+        """
+        self.base_url = url if url.endswith('/') else url + '/'
+        self.headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        if api_key:
+            self.headers["api-key"] = api_key
+
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.http2 = http2
+
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, url: str, api_key: Optional[str] = None):
+        from django.conf import settings
+
+        return cls(
+            url=url,
+            api_key=api_key,
+            pool_size=getattr(settings, "QDRANT_POOL_SIZE", 20),
+            connect_timeout=getattr(settings, "QDRANT_CONNECT_TIMEOUT", 3.0),
+            read_timeout=getattr(settings, "QDRANT_READ_TIMEOUT", 10.0),
+            max_retries=getattr(settings, "QDRANT_MAX_RETRIES", 3),
+            http2=getattr(settings, "QDRANT_HTTP2", False),
+        )
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        base_url=self.base_url,
+                        headers=self.headers,
+                        limits=self.limits,
+                        timeout=self.timeout,
+                        http2=self.http2,
+                    )
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = httpx.AsyncClient(
+                        base_url=self.base_url,
+                        headers=self.headers,
+                        limits=self.limits,
+                        timeout=self.timeout,
+                        http2=self.http2,
+                    )
+        return self._async_client
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _is_retryable(self, response: Optional[httpx.Response], error: Optional[Exception]) -> bool:
+        if error is not None:
+            return isinstance(error, (httpx.TimeoutException, httpx.NetworkError))
+        return response.status_code in self.RETRY_STATUS_CODES
+
+    def _parse(self, response: httpx.Response, path: str) -> dict:
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise QdrantTransportError(f"Qdrant request to {path} failed: {str(e)}")
+        return response.json()
+
+    def request(self, method: str, path: str, payload: Optional[dict] = None) -> dict:
+        for attempt in range(self.max_retries + 1):
+            response, error = None, None
+            try:
+                response = self.client.request(method, path, json=payload)
+            except httpx.HTTPError as e:
+                error = e
+
+            if attempt < self.max_retries and self._is_retryable(response, error):
+                delay = self._backoff(attempt)
+                logger.warning(f"Retrying Qdrant {method} {path} in {delay:.3f}s "
+                               f"({str(error) if error else response.status_code})")
+                time.sleep(delay)
+                continue
+
+            if error is not None:
+                raise QdrantTransportError(f"Qdrant request to {path} failed: {str(error)}")
+            return self._parse(response, path)
+
+    async def arequest(self, method: str, path: str, payload: Optional[dict] = None) -> dict:
+        for attempt in range(self.max_retries + 1):
+            response, error = None, None
+            try:
+                response = await self.async_client.request(method, path, json=payload)
+            except httpx.HTTPError as e:
+                error = e
+
+            if attempt < self.max_retries and self._is_retryable(response, error):
+                delay = self._backoff(attempt)
+                logger.warning(f"Retrying Qdrant {method} {path} in {delay:.3f}s "
+                               f"({str(error) if error else response.status_code})")
+                await asyncio.sleep(delay)
+                continue
+
+            if error is not None:
+                raise QdrantTransportError(f"Qdrant request to {path} failed: {str(error)}")
+            return self._parse(response, path)
+
+    @staticmethod
+    def _search_request(collection_name: str, query_vector: List[float], limit: int, score_threshold: float):
+        path = f"collections/{collection_name}/points/search"
+        payload = {
+            "vector": query_vector,
+            "limit": limit,
+            "score_threshold": score_threshold,
+            "with_payload": True
+        }
+        return path, payload
+
+    def search(self, collection_name: str, query_vector: List[float], limit: int = 3, score_threshold: float = 0.7) -> list:
+        path, payload = self._search_request(collection_name, query_vector, limit, score_threshold)
+        return self.request("POST", path, payload).get("result", [])
+
+    async def asearch(self, collection_name: str, query_vector: List[float], limit: int = 3, score_threshold: float = 0.7) -> list:
+        path, payload = self._search_request(collection_name, query_vector, limit, score_threshold)
+        result = await self.arequest("POST", path, payload)
+        return result.get("result", [])
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
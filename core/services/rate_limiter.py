@@ -0,0 +1,374 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import anthropic
+import openai
+from django.conf import settings
+
+from core.constants import RateLimitConstants
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request cannot get a rate limit permit within the configured wait"""
+    pass
+
+
+class TokenBucket(object):
+    """
+    Token bucket refilled continuously at ``rate`` per second up to ``capacity``.
+
+    ``reserve`` always takes the amount and lets the level go negative, returning how long the caller has to
+    wait for the debt to be paid back. Callers are therefore served in arrival order and a request larger than
+    the capacity waits instead of starving.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        :param amount: float - Units to take from the bucket.
+        :return: float - Seconds to wait before the reservation is covered.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+    def refund(self, amount: float):
+        """
+        Give back units, or take more with a negative amount, once the real cost of a request is known.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level + amount)
+
+    @property
+    def level(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._level
+
+
+class AIMDConcurrencyLimiter(object):
+    """
+    Concurrency limit adjusted by additive increase / multiplicative decrease.
+
+    Each request that succeeds within ``latency_target`` raises the limit by ``1 / limit``, i.e. by one per
+    round of requests. A throttled or slow request multiplies it by ``decrease_factor``, at most once per
+    ``decrease_interval`` so that one burst of 429s does not collapse the limit to the minimum.
+    """
+
+    def __init__(self, initial: float, min_limit: float, max_limit: float, latency_target: float = None,
+                 decrease_factor: float = RateLimitConstants.DECREASE_FACTOR,
+                 decrease_interval: float = RateLimitConstants.DECREASE_INTERVAL):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.decrease_interval = decrease_interval
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float = None) -> bool:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: float = None, throttled: bool = False):
+        """
+        :param latency: float, optional - Duration of the request; None when it failed for an unrelated reason.
+        :param throttled: bool - The provider rejected the request with a rate limit or overload error.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            slow = latency is not None and self.latency_target and latency > self.latency_target
+            if throttled or slow:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_interval:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class LLMRateLimiter(object):
+    """
+    Rate limits and retries for one provider and model.
+
+    A request takes a permit from the request bucket, reserves its estimated prompt tokens from the token
+    bucket and waits for a free concurrency slot. ``call`` retries rate limit, overload, timeout, connection
+    and 5xx errors with jittered exponential backoff, waiting at least as long as the provider's
+    ``retry-after`` header asks; a ``retry-after`` also holds back every other request for this model.
+    A request that would have to wait longer than ``max_wait`` fails with ``RateLimitExceeded`` instead.
+    """
+
+    THROTTLE_STATUS_CODES = {429, 529}
+    RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+    CONNECTION_ERRORS = (openai.APIConnectionError, anthropic.APIConnectionError)
+
+    def __init__(
+            self,
+            name: str,
+            requests_per_minute: float = 0,
+            tokens_per_minute: float = 0,
+            max_concurrency: int = RateLimitConstants.MAX_CONCURRENCY,
+            min_concurrency: int = RateLimitConstants.MIN_CONCURRENCY,
+            latency_target: float = RateLimitConstants.LATENCY_TARGET,
+            max_retries: int = RateLimitConstants.MAX_RETRIES,
+            backoff_base: float = RateLimitConstants.BACKOFF_BASE,
+            backoff_max: float = RateLimitConstants.BACKOFF_MAX,
+            max_wait: float = RateLimitConstants.MAX_WAIT
+    ):
+        """
+        :param name: str - ``provider:model``, used in logs and metrics.
+        :param requests_per_minute: float - Request budget; 0 disables the request bucket.
+        :param tokens_per_minute: float - Token budget; 0 disables the token bucket.
+        :param max_concurrency: int - Upper bound, and starting value, of the adaptive concurrency limit.
+        :param min_concurrency: int - Lower bound of the adaptive concurrency limit.
+        :param latency_target: float - Requests slower than this many seconds count as congestion; 0 disables.
+        :param max_retries: int - Retries after the first attempt.
+        :param backoff_base: float - Base delay in seconds of the exponential backoff.
+        :param backoff_max: float - Upper bound in seconds of a single backoff delay.
+        :param max_wait: float - Longest a request may wait for permits or a ``retry-after`` before failing.
+        """
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AIMDConcurrencyLimiter(
+            initial=max_concurrency, min_limit=min_concurrency, max_limit=max_concurrency,
+            latency_target=latency_target or None)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_wait = max_wait
+
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0, "succeeded": 0, "failed": 0, "throttled": 0, "retries": 0,
+            "rejected": 0, "wait_time": 0.0, "latency_total": 0.0
+        }
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    @classmethod
+    def _status_code(cls, error: Exception) -> Optional[int]:
+        return getattr(error, "status_code", None)
+
+    def is_throttled(self, error: Exception) -> bool:
+        return self._status_code(error) in self.THROTTLE_STATUS_CODES
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, self.CONNECTION_ERRORS) or self._status_code(error) in self.RETRY_STATUS_CODES
+
+    @staticmethod
+    def get_retry_after(error: Exception) -> Optional[float]:
+        """
+        :return: float - Seconds the provider asked to wait (``retry-after-ms`` or ``retry-after``), or None.
+        """
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            retry_after = headers.get("retry-after")
+            if not retry_after:
+                return None
+            try:
+                return float(retry_after)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _acquire(self, tokens: int):
+        started = time.monotonic()
+        wait = max(0.0, self._blocked_until - started)
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+
+        if wait > self.max_wait:
+            self._release_reservation(tokens)
+            self._count(rejected=1)
+            raise RateLimitExceeded(f"Rate limit for {self.name} would need a {wait:.1f}s wait")
+        if wait:
+            time.sleep(wait)
+
+        if not self.concurrency.acquire(timeout=max(0.0, self.max_wait - wait)):
+            self._release_reservation(tokens)
+            self._count(rejected=1)
+            raise RateLimitExceeded(f"No free concurrency slot for {self.name} "
+                                    f"({self.concurrency.in_flight} requests in flight)")
+        self._count(wait_time=time.monotonic() - started)
+
+    def _release_reservation(self, tokens: int):
+        if self.requests:
+            self.requests.refund(1)
+        if self.tokens and tokens:
+            self.tokens.refund(tokens)
+
+    @contextmanager
+    def slot(self, tokens: int = 0):
+        """
+        Hold permits for one request, e.g. for the whole life of a stream. Errors are recorded, not retried.
+
+        :param tokens: int - Estimated prompt tokens to reserve from the token bucket.
+        :raises RateLimitExceeded: If the permits are not available within ``max_wait``.
+        """
+        self._acquire(tokens)
+        self._count(requests=1)
+        started = time.monotonic()
+        latency = None
+        throttled = False
+        try:
+            yield
+            latency = time.monotonic() - started
+            self._count(succeeded=1, latency_total=latency)
+        except Exception as e:
+            throttled = self.is_throttled(e)
+            self._count(failed=1, throttled=int(throttled))
+            if self.tokens and tokens:
+                self.tokens.refund(tokens)
+            if throttled:
+                self._hold_back(self.get_retry_after(e))
+            raise
+        finally:
+            # A stream closed early by its consumer leaves the limit unchanged.
+            self.concurrency.release(latency=latency, throttled=throttled)
+
+    def _hold_back(self, retry_after: Optional[float]):
+        if retry_after:
+            with self._lock:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + min(retry_after, self.max_wait))
+
+    def settle_tokens(self, reserved: int, used: int):
+        """
+        Correct the token bucket once a request's real usage is known.
+        """
+        if self.tokens and used is not None:
+            self.tokens.refund(reserved - used)
+
+    def call(self, fn: Callable, tokens: int = 0, usage_tokens: Callable = None):
+        """
+        Run ``fn`` under the rate limits, retrying transient provider errors.
+
+        :param fn: callable - Makes the provider request.
+        :param tokens: int - Estimated prompt tokens to reserve from the token bucket.
+        :param usage_tokens: callable, optional - Returns the tokens a response actually used, to settle the reservation.
+        :return: Any - What ``fn`` returns.
+        :raises RateLimitExceeded: If the permits are not available within ``max_wait``.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.slot(tokens):
+                    response = fn()
+            except RateLimitExceeded:
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    raise
+                retry_after = self.get_retry_after(e)
+                if retry_after is not None and retry_after > self.max_wait:
+                    raise
+                delay = max(retry_after or 0.0, self._backoff(attempt))
+                self._count(retries=1)
+                logger.warning(f"Retrying {self.name} request in {delay:.2f}s ({str(e)})")
+                time.sleep(delay)
+                continue
+
+            if usage_tokens is not None:
+                try:
+                    self.settle_tokens(tokens, usage_tokens(response))
+                except Exception as e:
+                    logger.error(f"Could not settle token usage for {self.name}: {str(e)}")
+            return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        latency_total = stats.pop("latency_total")
+        stats["average_latency"] = latency_total / stats["succeeded"] if stats["succeeded"] else 0.0
+        stats["concurrency_limit"] = round(self.concurrency.limit, 2)
+        stats["in_flight"] = self.concurrency.in_flight
+        stats["request_budget"] = round(self.requests.level, 2) if self.requests else None
+        stats["token_budget"] = round(self.tokens.level, 2) if self.tokens else None
+        return stats
+
+
+class LLMRateLimiterRegistry(object):
+    """
+    One ``LLMRateLimiter`` per provider and model, shared by every configuration and thread in the process.
+
+    Limits come from ``settings.LLM_RATE_LIMITS``: the ``"default"`` entry, then the provider's entry
+    (e.g. ``"openai"``), then the model's entry (e.g. ``"openai:gpt-4o"``), each overriding the previous.
+    A limiter is rebuilt when its limits change.
+    """
+
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_limits(provider: str, model: str) -> dict:
+        configured = getattr(settings, "LLM_RATE_LIMITS", None) or {}
+        limits = {
+            "max_retries": getattr(settings, "LLM_MAX_RETRIES", RateLimitConstants.MAX_RETRIES),
+            "max_wait": getattr(settings, "LLM_RATE_LIMIT_MAX_WAIT", RateLimitConstants.MAX_WAIT),
+        }
+        for key in ("default", provider, f"{provider}:{model}"):
+            limits.update(configured.get(key) or {})
+        return limits
+
+    def get(self, provider: str, model: str) -> LLMRateLimiter:
+        limits = self.get_limits(provider, model)
+        key = f"{provider}:{model}"
+        with self._lock:
+            entry = self._limiters.get(key)
+            if entry is None or entry[0] != limits:
+                entry = (limits, LLMRateLimiter(name=key, **limits))
+                self._limiters[key] = entry
+            return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._limiters.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            limiters = {key: entry[1] for key, entry in self._limiters.items()}
+        return {key: limiter.stats() for key, limiter in limiters.items()}
+
+
+llm_rate_limiters = LLMRateLimiterRegistry()
@@ -0,0 +1,185 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import List
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+
+from core.constants import RequestLogConstants
+from core.models import LLMRequestLog
+
+logger = logging.getLogger(__name__)
+
+
+class LLMRequestLogWriter(object):
+    """
+    Writes ``LLMRequestLog`` rows off the request thread.
+
+    Records are queued in memory and a daemon thread writes them with ``bulk_create`` once ``batch_size``
+    records are waiting or ``flush_interval`` seconds have passed. When the queue is full, ``write`` blocks
+    for at most ``enqueue_timeout`` seconds and then appends the record to a local JSONL spill file instead,
+    as does a batch whose insert fails, so that nothing is lost. ``load_spilled`` imports the spill file
+    later. Pending records are flushed when the process exits.
+
+    Each writer thread has its own stop event, which ``flush`` also queues to wake it. A thread only stops
+    for its own event, so a thread started by a concurrent ``write`` cannot take another thread's stop.
+    """
+
+    def __init__(self, batch_size: int = None, flush_interval: float = None, max_queue_size: int = None,
+                 enqueue_timeout: float = None, spill_path: str = None):
+        self.batch_size = batch_size or getattr(
+            settings, "LLM_REQUEST_LOG_BATCH_SIZE", RequestLogConstants.BATCH_SIZE)
+        self.flush_interval = flush_interval or getattr(
+            settings, "LLM_REQUEST_LOG_FLUSH_INTERVAL", RequestLogConstants.FLUSH_INTERVAL)
+        self.max_queue_size = max_queue_size or getattr(
+            settings, "LLM_REQUEST_LOG_MAX_QUEUE_SIZE", RequestLogConstants.MAX_QUEUE_SIZE)
+        self.enqueue_timeout = enqueue_timeout if enqueue_timeout is not None else getattr(
+            settings, "LLM_REQUEST_LOG_ENQUEUE_TIMEOUT", RequestLogConstants.ENQUEUE_TIMEOUT)
+        self.spill_path = spill_path or getattr(
+            settings, "LLM_REQUEST_LOG_SPILL_PATH",
+            os.path.join(settings.BASE_DIR, ".cache", RequestLogConstants.SPILL_FILE_NAME))
+
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._stop = None
+        self._pid = None
+        self._stats = {"queued": 0, "written": 0, "spilled": 0, "flushes": 0}
+
+    def _is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def _ensure_started(self):
+        # Started lazily, again in a forked worker, where the parent's thread does not exist, and again
+        # once a flushed thread has stopped.
+        if self._is_running():
+            return
+        with self._lock:
+            if self._is_running():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+                self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, args=(self._stop,), name="llm-request-log-writer", daemon=True)
+            self._thread.start()
+
+    def write(self, record: dict):
+        """
+        Queue one record, given as ``LLMRequestLog`` field values.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put(record, timeout=self.enqueue_timeout)
+        except queue.Full:
+            logger.warning("LLM request log queue is full; spilling record to disk")
+            self._spill([record])
+            return
+        with self._lock:
+            self._stats["queued"] += 1
+
+    def _run(self, stop: threading.Event):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if isinstance(record, threading.Event):
+                    # Another thread's stop is dropped; that thread sees its event on its next pass.
+                    if record is stop:
+                        break
+                    continue
+                batch.append(record)
+
+            if batch:
+                self._write_batch(batch)
+            if stop.is_set():
+                return
+
+    def _write_batch(self, batch: List[dict]):
+        try:
+            close_old_connections()
+            LLMRequestLog.objects.bulk_create([LLMRequestLog(**record) for record in batch])
+            with self._lock:
+                self._stats["written"] += len(batch)
+                self._stats["flushes"] += 1
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} LLM request logs: {str(e)}")
+            self._spill(batch)
+
+    def _spill(self, records: List[dict]):
+        try:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            with self._spill_lock, open(self.spill_path, "a") as f:
+                for record in records:
+                    f.write(json.dumps(record, cls=DjangoJSONEncoder, default=str) + "\n")
+            with self._lock:
+                self._stats["spilled"] += len(records)
+        except Exception as e:
+            logger.error(f"Failed to spill {len(records)} LLM request logs: {str(e)}")
+
+    def flush(self, timeout: float = None):
+        """
+        Write everything queued so far and stop the writer thread; the next ``write`` starts a new one.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            thread, stop = self._thread, self._stop
+        if thread is not None:
+            stop.set()
+            self._queue.put(stop)
+            thread.join(timeout)
+            with self._lock:
+                if self._thread is thread:
+                    self._thread = None
+
+        # Anything the thread did not get to before the timeout is written here.
+        remaining = []
+        while True:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if not isinstance(record, threading.Event):
+                remaining.append(record)
+        for start in range(0, len(remaining), self.batch_size):
+            self._write_batch(remaining[start:start + self.batch_size])
+
+    def load_spilled(self) -> int:
+        """
+        Import records from the spill file into the database and remove it.
+
+        :return: int - The number of records imported.
+        """
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return 0
+            loading_path = f"{self.spill_path}.{os.getpid()}.loading"
+            os.replace(self.spill_path, loading_path)
+
+        with open(loading_path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        LLMRequestLog.objects.bulk_create(
+            [LLMRequestLog(**record) for record in records], batch_size=self.batch_size)
+        os.remove(loading_path)
+        return len(records)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, pending=self._queue.qsize())
+
+
+llm_request_log_writer = LLMRequestLogWriter()
+atexit.register(llm_request_log_writer.flush, RequestLogConstants.FLUSH_INTERVAL * 5)
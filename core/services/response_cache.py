@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import threading
+from typing import Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from core.constants import ResponseCacheConstants, SingleFlightConstants
+from core.providers.llm_service import log_llm_request
+from core.services.lru_cache import LRUCache
+from core.services.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache(object):
+    """
+    Exact-match cache of provider responses, opt-in per configuration through
+    ``config_data["response_cache"] = {"enabled": true, "ttl": 3600, "max_entries": 256}``.
+
+    Entries are keyed by a hash of the provider, model, messages, response format and sampling parameters,
+    so only byte-identical requests share an answer. It is meant for low-temperature configurations, where
+    a repeated request would get the same answer anyway.
+    """
+
+    def __init__(self):
+        self._scopes = {}
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0}
+
+    @staticmethod
+    def get_config(config_obj) -> Optional[dict]:
+        """
+        :return: dict - The configuration's cache settings, or None if caching is not enabled for it.
+        """
+        cache_config = (config_obj.config_data or {}).get("response_cache") or {}
+        if not cache_config.get("enabled"):
+            return None
+        return {
+            "ttl": cache_config.get("ttl", ResponseCacheConstants.TTL),
+            "max_entries": cache_config.get("max_entries", ResponseCacheConstants.MAX_ENTRIES),
+        }
+
+    @staticmethod
+    def _describe_response_format(response_format):
+        if response_format is None or isinstance(response_format, (str, dict)):
+            return response_format
+        if hasattr(response_format, "model_json_schema"):
+            return {"name": response_format.__name__, "schema": response_format.model_json_schema()}
+        return repr(response_format)
+
+    def make_key(self, **request) -> str:
+        """
+        Hash of everything that identifies a request: provider, model, prompt or messages, response format
+        and sampling parameters.
+        """
+        payload = dict(request, response_format=self._describe_response_format(request.get("response_format")))
+        encoded = json.dumps(payload, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _scope(self, config_name: str, cache_config: dict) -> LRUCache:
+        with self._lock:
+            scope = self._scopes.get(config_name)
+            if scope is None or scope.max_size != cache_config["max_entries"]:
+                scope = LRUCache(max_size=cache_config["max_entries"], ttl=cache_config["ttl"])
+                self._scopes[config_name] = scope
+            return scope
+
+    def get(self, config_name: str, cache_config: dict, key: str):
+        response = self._scope(config_name, cache_config).get(key)
+        with self._lock:
+            self._stats["lookups"] += 1
+            if response is not None:
+                self._stats["hits"] += 1
+        return response
+
+    def set(self, config_name: str, cache_config: dict, key: str, response):
+        self._scope(config_name, cache_config).set(key, response, ttl=cache_config["ttl"])
+
+    def clear(self, config_name: str = None):
+        with self._lock:
+            if config_name is None:
+                self._scopes.clear()
+            else:
+                self._scopes.pop(config_name, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+    def get_or_call(self, config_obj, request_type: str, call, **key_data):
+        """
+        Return the cached response for this request, or make it with ``call`` and cache the result.
+        Hits are logged as zero-cost ``CACHE_HIT`` entries. Failed calls (None) are not cached.
+        Concurrent misses for the same request share one call through ``single_flight``.
+
+        :param config_obj: LLMConfiguration - The configuration the request is made with.
+        :param request_type: str - Request type for the log entry.
+        :param call: callable - Makes the provider request.
+        :param key_data: dict - Everything that identifies the request, passed to ``make_key``.
+        """
+        cache_config = self.get_config(config_obj)
+        if cache_config is None:
+            return call()
+
+        key = self.make_key(**key_data)
+        response = self.get(config_obj.config_name, cache_config, key)
+        if response is not None:
+            self._log_hit(config_obj, request_type, key, key_data.get("model"))
+            return response
+
+        response = single_flight.do(SingleFlightConstants.LLM, f"{config_obj.config_name}:{key}", call)
+        if response is not None:
+            self.set(config_obj.config_name, cache_config, key, response)
+        return response
+
+    def _log_hit(self, config_obj, request_type: str, key: str, model: str):
+        try:
+            log_llm_request(
+                model=model,
+                config_name=config_obj.config_name,
+                request_type=request_type,
+                request_data={"cache_key": key},
+                response_data={},
+                response_cost=0,
+                usage_data={},
+                status=ResponseCacheConstants.CACHE_HIT_STATUS,
+                meta_data={"response_cache": dict(self.stats(), hit=True)},
+            )
+        except Exception as e:
+            logger.error(f"Failed to log response cache hit: {str(e)}")
+
+
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,137 @@
+import logging
+import threading
+from typing import Dict, Type
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+def to_strict_json_schema(model: Type[BaseModel]) -> dict:
+    """
+    The model's JSON schema made valid for strict structured output: every object lists all its properties
+    as required and forbids others, ``None`` defaults are dropped (the field stays nullable), a single-entry
+    ``allOf`` is inlined, and a ``$ref`` with sibling keys is replaced by the definition it points to.
+
+    :param model: type - The pydantic model.
+    :return: dict - The strict JSON schema.
+    """
+    schema = model.model_json_schema()
+    return _make_strict(schema, root=schema)
+
+
+def _resolve_ref(root: dict, ref: str) -> dict:
+    if not ref.startswith("#/"):
+        raise ValueError(f"Unexpected $ref format {ref}; only local references are supported")
+    resolved = root
+    for key in ref[2:].split("/"):
+        resolved = resolved[key]
+    if not isinstance(resolved, dict):
+        raise ValueError(f"Expected $ref {ref} to resolve to a dictionary but got {resolved}")
+    return resolved
+
+
+def _make_strict(schema: dict, root: dict) -> dict:
+    for defs_key in ("$defs", "definitions"):
+        for definition in (schema.get(defs_key) or {}).values():
+            _make_strict(definition, root)
+
+    if schema.get("type") == "object" and "additionalProperties" not in schema:
+        schema["additionalProperties"] = False
+
+    properties = schema.get("properties")
+    if isinstance(properties, dict):
+        schema["required"] = list(properties)
+        schema["properties"] = {key: _make_strict(value, root) for key, value in properties.items()}
+
+    if isinstance(schema.get("items"), dict):
+        schema["items"] = _make_strict(schema["items"], root)
+
+    if isinstance(schema.get("anyOf"), list):
+        schema["anyOf"] = [_make_strict(variant, root) for variant in schema["anyOf"]]
+
+    all_of = schema.get("allOf")
+    if isinstance(all_of, list):
+        if len(all_of) == 1:
+            schema.update(_make_strict(all_of[0], root))
+            schema.pop("allOf")
+        else:
+            schema["allOf"] = [_make_strict(entry, root) for entry in all_of]
+
+    if "default" in schema and schema["default"] is None:
+        schema.pop("default")
+
+    ref = schema.get("$ref")
+    if ref and len(schema) > 1:
+        # Providers reject a $ref with sibling keys, so inline the definition; the siblings take priority.
+        schema.update({**_resolve_ref(root, ref), **schema})
+        schema.pop("$ref")
+        return _make_strict(schema, root)
+
+    return schema
+
+
+class StructuredOutputSchema(object):
+    """
+    A response schema for structured output, with everything derived from the pydantic model computed once:
+    the strict JSON schema and the ``response_format`` sent to the provider. Validation uses the model's
+    own compiled validator.
+    """
+
+    def __init__(self, name: str, model: Type[BaseModel], description: str = None):
+        """
+        :param name: str - Registry name, also sent to the provider as the schema name.
+        :param model: type - The pydantic model responses are validated into.
+        :param description: str, optional - What the schema is for, sent to providers that support it.
+        """
+        self.name = name
+        self.model = model
+        self.description = description or (model.__doc__ or "").strip() or None
+        self.json_schema = to_strict_json_schema(model)
+        self.response_format = {
+            "type": "json_schema",
+            "json_schema": {"name": name, "schema": self.json_schema, "strict": True},
+        }
+        if self.description:
+            self.response_format["json_schema"]["description"] = self.description
+
+    def validate(self, data: dict) -> BaseModel:
+        """
+        :raises pydantic.ValidationError: If ``data`` does not match the schema.
+        """
+        return self.model.model_validate(data)
+
+
+class SchemaRegistry(object):
+    """
+    Process-wide registry of structured-output schemas by name. Apps register their schemas when they
+    are imported, so nothing about a schema is rebuilt per request.
+    """
+
+    def __init__(self):
+        self._schemas: Dict[str, StructuredOutputSchema] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, model: Type[BaseModel], description: str = None) -> StructuredOutputSchema:
+        schema = StructuredOutputSchema(name, model, description=description)
+        with self._lock:
+            if name in self._schemas and self._schemas[name].model is not model:
+                logger.warning(f"Structured output schema {name} was registered again with a different model")
+            self._schemas[name] = schema
+        return schema
+
+    def get(self, name: str) -> StructuredOutputSchema:
+        """
+        :raises ValueError: If no schema is registered under ``name``.
+        """
+        schema = self._schemas.get(name)
+        if schema is None:
+            raise ValueError(f"Structured output schema {name} is not registered")
+        return schema
+
+    def names(self) -> list:
+        with self._lock:
+            return sorted(self._schemas)
+
+
+schema_registry = SchemaRegistry()
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from core.constants import SemanticCacheConstants
+from core.services.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticResponseCache(object):
+    """
+    Cache of generated RAG answers looked up by query-embedding similarity.
+
+    Entries are scoped per (config_name, collection_name) and tagged with the collection's generation.
+    Re-ingesting a collection bumps its generation, which makes every answer built from the old
+    contents stale. Re-ingestion usually runs in another process, so the generation counter lives in
+    the Django cache ``SEMANTIC_CACHE_GENERATION_CACHE_ALIAS``, which must be shared between processes;
+    with a per-process backend (local memory, dummy) the cache refuses to serve answers, see ``is_usable``.
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None, threshold: float = None):
+        self.max_entries = max_entries if max_entries is not None else getattr(
+            settings, "SEMANTIC_CACHE_MAX_ENTRIES", SemanticCacheConstants.MAX_ENTRIES)
+        self.ttl = ttl if ttl is not None else getattr(settings, "SEMANTIC_CACHE_TTL", SemanticCacheConstants.TTL)
+        self.threshold = threshold if threshold is not None else getattr(
+            settings, "SEMANTIC_CACHE_THRESHOLD", SemanticCacheConstants.THRESHOLD)
+        self._scopes = {}
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "saved_tokens": 0}
+        self._warned = False
+
+    @property
+    def generation_cache(self):
+        return caches[getattr(
+            settings, "SEMANTIC_CACHE_GENERATION_CACHE_ALIAS", SemanticCacheConstants.GENERATION_CACHE_ALIAS)]
+
+    def is_usable(self) -> bool:
+        """
+        :return: bool - Whether the generation counter is in a cache shared between processes, so that an
+            invalidation made by an ingest process reaches every web worker.
+        """
+        if not isinstance(self.generation_cache, (LocMemCache, DummyCache)):
+            return True
+        if not self._warned:
+            self._warned = True
+            logger.warning("Semantic cache disabled: SEMANTIC_CACHE_GENERATION_CACHE_ALIAS is not a shared cache, "
+                           "so invalidations from other processes would be missed")
+        return False
+
+    @staticmethod
+    def _generation_key(collection_name: str) -> str:
+        return f"semantic_cache:generation:{collection_name}"
+
+    def get_generation(self, collection_name: str) -> int:
+        return self.generation_cache.get(self._generation_key(collection_name), 0)
+
+    def _scope(self, config_name: str, collection_name: str) -> LRUCache:
+        with self._lock:
+            key = (config_name, collection_name)
+            if key not in self._scopes:
+                self._scopes[key] = LRUCache(max_size=self.max_entries, ttl=self.ttl)
+            return self._scopes[key]
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, config_name: str, collection_name: str, query_vector: List[float],
+               threshold: float = None) -> Optional[dict]:
+        """
+        Find the cached answer closest to ``query_vector``.
+
+        :param config_name: str - The LLM configuration the answer was generated with.
+        :param collection_name: str - The collection the answer's context was retrieved from.
+        :param query_vector: list - Embedding of the current question.
+        :param threshold: float, optional - Minimum cosine similarity for a hit. Defaults to the cache threshold.
+        :return: dict - The cached entry plus its ``similarity``, or None on a miss.
+        """
+        threshold = threshold if threshold is not None else self.threshold
+        generation = self.get_generation(collection_name)
+        scope = self._scope(config_name, collection_name)
+        entries = [(key, entry) for key, entry in scope.items() if entry["generation"] == generation]
+
+        hit = None
+        if entries:
+            similarities = np.stack([entry["vector"] for _, entry in entries]) @ self._normalize(query_vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                key, entry = entries[best]
+                scope.get(key)
+                hit = dict(entry, similarity=float(similarities[best]))
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            if hit:
+                self._stats["hits"] += 1
+                self._stats["saved_tokens"] += hit["tokens"]
+        return hit
+
+    def store(self, config_name: str, collection_name: str, query: str, query_vector: List[float],
+              answer: str, tokens: int = 0, ttl: float = None):
+        key = hashlib.sha256(" ".join(query.split()).lower().encode("utf-8")).hexdigest()
+        self._scope(config_name, collection_name).set(key, {
+            "vector": self._normalize(query_vector),
+            "query": query,
+            "answer": answer,
+            "tokens": tokens,
+            "generation": self.get_generation(collection_name),
+            "created_at": time.time(),
+        }, ttl=ttl)
+
+    def invalidate(self, collection_name: str):
+        """
+        Drop every answer built from ``collection_name``, e.g. after it has been re-ingested.
+        """
+        cache = self.generation_cache
+        key = self._generation_key(collection_name)
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+        with self._lock:
+            scopes = [scope for (_, name), scope in self._scopes.items() if name == collection_name]
+        for scope in scopes:
+            scope.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+
+semantic_response_cache = SemanticResponseCache()
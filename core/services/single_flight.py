@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.constants import SingleFlightConstants
+
+logger = logging.getLogger(__name__)
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent identical calls: while a call for a ``(namespace, key)`` is in flight, other
+    threads asking for the same key wait for it and receive its result (or its exception) instead of
+    making their own upstream request. A thread that waits longer than ``SINGLE_FLIGHT_WAIT_TIMEOUT``
+    seconds for another thread's call makes the call itself, so a hung call does not hold up the rest.
+
+    With ``SINGLE_FLIGHT_SHARED`` the same is done across worker processes through the Django cache
+    ``SINGLE_FLIGHT_CACHE_ALIAS``, which must then be shared (Redis, Memcached, database): the first
+    worker takes a lock with ``cache.add`` and publishes its result for ``SINGLE_FLIGHT_RESULT_TTL``
+    seconds, and the others poll for it. A worker that finds the lock released without a result, or
+    waits longer than ``SINGLE_FLIGHT_WAIT_TIMEOUT``, makes the call itself. Shared results must be
+    picklable; failures (exceptions and None) are never shared across workers.
+    """
+
+    _MISSING = object()
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return getattr(settings, "SINGLE_FLIGHT_ENABLED", True)
+
+    @staticmethod
+    def is_shared() -> bool:
+        return getattr(settings, "SINGLE_FLIGHT_SHARED", False)
+
+    @staticmethod
+    def get_wait_timeout() -> float:
+        return getattr(settings, "SINGLE_FLIGHT_WAIT_TIMEOUT", SingleFlightConstants.WAIT_TIMEOUT)
+
+    def _incr(self, namespace: str, name: str, value: int = 1):
+        with self._lock:
+            stats = self._stats.get(namespace)
+            if stats is None:
+                stats = self._stats[namespace] = {
+                    "calls": 0, "executions": 0, "coalesced": 0, "wait_fallbacks": 0, "shared_coalesced": 0,
+                    "shared_fallbacks": 0, "errors": 0}
+            stats[name] += value
+
+    def do(self, namespace: str, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        :param namespace: str - The kind of call (``embedding``, ``vector_search``, ``llm``), for keys and metrics.
+        :param key: str - Identifies the call: equal keys must mean interchangeable results.
+        :param fn: callable - Makes the call.
+        :return: Any - The result of ``fn``, possibly from another thread's or worker's call.
+        """
+        if not self.is_enabled():
+            return fn()
+
+        self._incr(namespace, "calls")
+        flight_key = (namespace, key)
+        with self._lock:
+            call = self._calls.get(flight_key)
+            leader = call is None
+            if leader:
+                call = self._calls[flight_key] = _Call()
+
+        if not leader:
+            if not call.done.wait(self.get_wait_timeout()):
+                logger.warning(f"Single-flight {namespace} call still running after the wait timeout; calling directly")
+                self._incr(namespace, "wait_fallbacks")
+                return self._execute(namespace, fn)
+            self._incr(namespace, "coalesced")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._shared_do(namespace, key, fn) if self.is_shared() else self._execute(namespace, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(flight_key, None)
+            call.done.set()
+
+    def _execute(self, namespace: str, fn: Callable[[], Any]) -> Any:
+        self._incr(namespace, "executions")
+        try:
+            return fn()
+        except Exception:
+            self._incr(namespace, "errors")
+            raise
+
+    def _shared_do(self, namespace: str, key: str, fn: Callable[[], Any]) -> Any:
+        cache = caches[getattr(settings, "SINGLE_FLIGHT_CACHE_ALIAS", SingleFlightConstants.CACHE_ALIAS)]
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        lock_key = f"{SingleFlightConstants.KEY_PREFIX}:lock:{namespace}:{digest}"
+        result_key = f"{SingleFlightConstants.KEY_PREFIX}:result:{namespace}:{digest}"
+        wait_timeout = self.get_wait_timeout()
+
+        try:
+            acquired = cache.add(lock_key, 1, timeout=wait_timeout)
+        except Exception as e:
+            logger.warning(f"Single-flight lock failed: {str(e)}")
+            return self._execute(namespace, fn)
+
+        if not acquired:
+            deadline = time.monotonic() + wait_timeout
+            poll_interval = getattr(settings, "SINGLE_FLIGHT_POLL_INTERVAL", SingleFlightConstants.POLL_INTERVAL)
+            while time.monotonic() < deadline:
+                time.sleep(poll_interval)
+                try:
+                    result = cache.get(result_key, self._MISSING)
+                    if result is not self._MISSING:
+                        self._incr(namespace, "shared_coalesced")
+                        return result
+                    if cache.get(lock_key) is None:
+                        break
+                except Exception as e:
+                    logger.warning(f"Single-flight result read failed: {str(e)}")
+                    break
+            self._incr(namespace, "shared_fallbacks")
+            return self._execute(namespace, fn)
+
+        try:
+            result = self._execute(namespace, fn)
+            if result is not None:
+                try:
+                    cache.set(result_key, result, timeout=getattr(
+                        settings, "SINGLE_FLIGHT_RESULT_TTL", SingleFlightConstants.RESULT_TTL))
+                except Exception as e:
+                    logger.warning(f"Single-flight result write failed: {str(e)}")
+            return result
+        finally:
+            try:
+                cache.delete(lock_key)
+            except Exception as e:
+                logger.warning(f"Single-flight unlock failed: {str(e)}")
+
+    def stats(self) -> dict:
+        """
+        :return: dict - Per namespace: ``calls`` made, upstream ``executions``, calls ``coalesced`` onto another
+            thread's and ``shared_coalesced`` onto another worker's call, ``wait_fallbacks`` and
+            ``shared_fallbacks`` made directly after waiting too long, ``errors``,
+            the ``coalesce_rate`` and the keys currently ``in_flight``.
+        """
+        with self._lock:
+            stats = {namespace: dict(counters) for namespace, counters in self._stats.items()}
+            in_flight = {}
+            for namespace, _ in self._calls:
+                in_flight[namespace] = in_flight.get(namespace, 0) + 1
+        for namespace, counters in stats.items():
+            coalesced = counters["coalesced"] + counters["shared_coalesced"]
+            counters["coalesce_rate"] = coalesced / counters["calls"] if counters["calls"] else 0.0
+            counters["in_flight"] = in_flight.get(namespace, 0)
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,177 @@
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+from django.conf import settings
+
+from core.constants import RetrievalConstants
+from core.models import SparseIndex
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./-][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been before being but by can could did do does doing
+for from get got had has have having he her hers him his how i if in into is it its just let like me more
+most my no not of on or our ours please she should so some such tell than that the their them then there
+these they this those to too us was we were what when where which while who whom why will with would you
+your yours hi hello hey thanks thank know want need
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens that keep codes such as ``g.o.ms``, ``11/2018`` or ``r22`` intact, without stopwords.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def document_text(value) -> str:
+    """
+    The text of a knowledge-base entry for indexing: its string values, without the keys of its dicts.
+    """
+    if isinstance(value, dict):
+        return " ".join(document_text(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(document_text(item) for item in value)
+    return "" if value is None else str(value)
+
+
+class BM25Index(object):
+    """
+    Inverted index scored with Okapi BM25, built at ingest time alongside the dense vectors.
+
+    The documents are stored in the database (``SparseIndex``), so every host serves the index the ingest
+    host built. Each process keeps the built index in memory and re-reads it when the row has changed,
+    checking at most once per ``SPARSE_INDEX_CHECK_INTERVAL`` seconds. Exact terms such as fee amounts,
+    section numbers and program codes are thereby matched lexically without a Qdrant sparse-vector schema.
+    """
+
+    def __init__(self, collection_name: str, k1: float = RetrievalConstants.BM25_K1,
+                 b: float = RetrievalConstants.BM25_B):
+        self.collection_name = collection_name
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._updated_at = None
+        self._checked_at = None
+        self._index = self._build({})
+        self._warned = False
+
+    @staticmethod
+    def _build(documents: Dict[str, dict]) -> dict:
+        postings = defaultdict(dict)
+        lengths = {}
+        for point_id, document in documents.items():
+            terms = Counter(document["tokens"])
+            lengths[point_id] = sum(terms.values())
+            for term, frequency in terms.items():
+                postings[term][point_id] = frequency
+
+        return {
+            "documents": documents,
+            "postings": postings,
+            "lengths": lengths,
+            "avg_length": sum(lengths.values()) / len(lengths) if lengths else 0.0,
+        }
+
+    def _load(self) -> dict:
+        check_interval = getattr(
+            settings, "SPARSE_INDEX_CHECK_INTERVAL", RetrievalConstants.SPARSE_INDEX_CHECK_INTERVAL)
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < check_interval:
+            return self._index
+
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < check_interval:
+                return self._index
+            updated_at = SparseIndex.objects.filter(
+                collection_name=self.collection_name).values_list("updated_at", flat=True).first()
+            if updated_at is None:
+                self._index, self._updated_at = self._build({}), None
+                if not self._warned:
+                    self._warned = True
+                    logger.warning(f"No sparse index for collection {self.collection_name}; hybrid retrieval is "
+                                   f"dense-only until the collection is ingested")
+            elif updated_at != self._updated_at:
+                documents = SparseIndex.objects.filter(
+                    collection_name=self.collection_name).values_list("documents", flat=True).first()
+                self._index, self._updated_at = self._build(documents or {}), updated_at
+            self._checked_at = now
+            return self._index
+
+    def replace(self, documents: Dict[str, dict]):
+        """
+        Replace the index contents.
+
+        :param documents: dict - Point id mapped to ``{"text": ..., "payload": ...}``.
+        """
+        stored = {
+            point_id: {"tokens": tokenize(document["text"]), "payload": document["payload"]}
+            for point_id, document in documents.items()
+        }
+        SparseIndex.objects.update_or_create(collection_name=self.collection_name, defaults={"documents": stored})
+        with self._lock:
+            self._checked_at = None
+
+    def search(self, query: str, limit: int = 3, min_score: float = 0.0) -> List[dict]:
+        """
+        Scores are normalised to [0, 1) by the query's best possible BM25 score, the sum over its terms of
+        ``idf * (k1 + 1)``. Query terms that no document contains count towards that maximum too, so an
+        off-topic query that shares a single word with an entry scores low.
+
+        :param min_score: float - Lowest normalised score returned.
+        :return: list - Matches in the Qdrant REST result shape, best score first.
+        """
+        index = self._load()
+        documents = index["documents"]
+        if not documents or limit <= 0:
+            return []
+
+        scores = defaultdict(float)
+        max_score = 0.0
+        for term in set(tokenize(query)):
+            postings = index["postings"].get(term) or {}
+            idf = math.log(1 + (len(documents) - len(postings) + 0.5) / (len(postings) + 0.5))
+            max_score += idf * (self.k1 + 1)
+            for point_id, frequency in postings.items():
+                norm = 1 - self.b + self.b * index["lengths"][point_id] / index["avg_length"]
+                scores[point_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+
+        ranked = sorted(
+            ((point_id, score / max_score) for point_id, score in scores.items() if score / max_score >= min_score),
+            key=lambda item: item[1], reverse=True
+        )[:limit]
+        return [
+            {"id": point_id, "version": 0, "score": score, "payload": documents[point_id]["payload"]}
+            for point_id, score in ranked
+        ]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], limit: int, k: int = RetrievalConstants.RRF_K) -> List[dict]:
+    """
+    Fuse ranked result lists with reciprocal rank fusion: each result scores ``sum(1 / (k + rank))``
+    over the lists it appears in.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.setdefault(result["id"], dict(result, score=0.0))
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda result: result["score"], reverse=True)[:limit]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_sparse_index(collection_name: str) -> BM25Index:
+    with _indexes_lock:
+        if collection_name not in _indexes:
+            _indexes[collection_name] = BM25Index(collection_name)
+        return _indexes[collection_name]
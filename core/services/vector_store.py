@@ -0,0 +1,337 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from qdrant_client.http import models
+
+from core.constants import EmbeddingConstants, VectorStoreConstants
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreError(Exception):
+    """Raised when a vector store operation fails"""
+    pass
+
+
+class BaseVectorStore(ABC):
+    """
+    A single vector collection. Search results use the Qdrant REST shape:
+    ``{"id": ..., "version": ..., "score": ..., "payload": {...}}``, best match first.
+    """
+
+    backend = None
+
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+
+    @abstractmethod
+    def collection_exists(self) -> bool:
+        """
+        :raises Exception: If the store cannot be reached; an unreachable collection is not a missing one.
+        """
+        pass
+
+    @abstractmethod
+    def ensure_collection(self, vector_size: int = EmbeddingConstants.VECTOR_SIZE):
+        pass
+
+    @abstractmethod
+    def search(self, query_vector: List[float], limit: int = 3, score_threshold: float = 0.7) -> List[dict]:
+        pass
+
+    async def asearch(self, query_vector: List[float], limit: int = 3, score_threshold: float = 0.7) -> List[dict]:
+        return self.search(query_vector=query_vector, limit=limit, score_threshold=score_threshold)
+
+    @abstractmethod
+    def upsert(self, points: List[dict]):
+        """
+        :param points: list - Dicts with ``id``, ``vector`` and ``payload`` keys.
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, point_ids: List[str]):
+        pass
+
+    @abstractmethod
+    def list_point_ids(self) -> set:
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        """
+        :return: int - The number of points in the collection.
+        """
+        pass
+
+
+class QdrantVectorStore(BaseVectorStore):
+    """
+    Remote Qdrant collection. Searches go through the pooled REST transport, writes through the client library.
+    """
+
+    backend = VectorStoreConstants.QDRANT
+
+    def __init__(self, collection_name: str, client, transport):
+        super().__init__(collection_name)
+        self.client = client
+        self.transport = transport
+
+    def collection_exists(self) -> bool:
+        return self.client.collection_exists(self.collection_name)
+
+    def ensure_collection(self, vector_size: int = EmbeddingConstants.VECTOR_SIZE):
+        if self.collection_exists():
+            return
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=models.VectorParams(
+                size=vector_size,
+                distance=models.Distance.COSINE
+            )
+        )
+
+    def search(self, query_vector: List[float], limit: int = 3, score_threshold: float = 0.7) -> List[dict]:
+        return self.transport.search(
+            collection_name=self.collection_name,
+            query_vector=query_vector,
+            limit=limit,
+            score_threshold=score_threshold
+        )
+
+    async def asearch(self, query_vector: List[float], limit: int = 3, score_threshold: float = 0.7) -> List[dict]:
+        return await self.transport.asearch(
+            collection_name=self.collection_name,
+            query_vector=query_vector,
+            limit=limit,
+            score_threshold=score_threshold
+        )
+
+    def upsert(self, points: List[dict]):
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[models.PointStruct(id=p["id"], vector=p["vector"], payload=p["payload"]) for p in points]
+        )
+
+    def delete(self, point_ids: List[str]):
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.PointIdsList(points=point_ids)
+        )
+
+    def list_point_ids(self) -> set:
+        point_ids, offset = set(), None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1000,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            point_ids.update(str(record.id) for record in records)
+            if offset is None:
+                return point_ids
+
+    def count(self) -> int:
+        return self.client.count(collection_name=self.collection_name, exact=True).count
+
+
+class LocalVectorStore(BaseVectorStore):
+    """
+    In-process vector index for small, hot collections and offline tests.
+
+    Vectors are L2-normalised on write and kept in a memory-mapped float32/float16 ``.npy`` matrix, with
+    ids and payloads in a JSON file alongside, so cosine similarity is a single matrix-vector product.
+    Each write produces a new generation directory and atomically repoints ``CURRENT`` at it, so readers
+    in other threads or processes never observe a half-written collection.
+    """
+
+    backend = VectorStoreConstants.LOCAL
+
+    def __init__(self, collection_name: str, base_dir: str = None, dtype: str = None):
+        super().__init__(collection_name)
+        self.base_dir = os.path.join(
+            base_dir or settings.LOCAL_VECTOR_STORE_DIR, collection_name)
+        self.dtype = np.dtype(dtype or getattr(settings, "LOCAL_VECTOR_STORE_DTYPE", "float32"))
+        self._lock = threading.RLock()
+        self._generation = None
+        self._snapshot = None
+
+    @property
+    def _current_path(self) -> str:
+        return os.path.join(self.base_dir, "CURRENT")
+
+    def _read_generation(self) -> Optional[str]:
+        try:
+            with open(self._current_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        """
+        Return the current ``(vectors, ids, payloads)`` snapshot, reloading it if another writer moved ``CURRENT``.
+        """
+        generation = self._read_generation()
+        if generation is None:
+            raise VectorStoreError(f"Local collection {self.collection_name} does not exist")
+        if generation == self._generation:
+            return self._snapshot
+
+        with self._lock:
+            if generation == self._generation:
+                return self._snapshot
+            path = os.path.join(self.base_dir, generation)
+            with open(os.path.join(path, "points.json")) as f:
+                points = json.load(f)
+            vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+            self._snapshot = (vectors, points["ids"], points["payloads"])
+            self._generation = generation
+        return self._snapshot
+
+    def _write(self, vectors: np.ndarray, ids: List[str], payloads: List[dict]):
+        generation = uuid.uuid4().hex
+        path = os.path.join(self.base_dir, generation)
+        os.makedirs(path)
+        np.save(os.path.join(path, "vectors.npy"), vectors.astype(self.dtype, copy=False))
+        with open(os.path.join(path, "points.json"), "w") as f:
+            json.dump({"ids": ids, "payloads": payloads}, f)
+
+        previous = self._read_generation()
+        tmp_path = f"{self._current_path}.{generation}"
+        with open(tmp_path, "w") as f:
+            f.write(generation)
+        os.replace(tmp_path, self._current_path)
+
+        # Keep the previous generation for readers that resolved CURRENT just before the swap.
+        for name in os.listdir(self.base_dir):
+            stale = os.path.join(self.base_dir, name)
+            if name not in (generation, previous) and os.path.isdir(stale):
+                shutil.rmtree(stale, ignore_errors=True)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def collection_exists(self) -> bool:
+        return self._read_generation() is not None
+
+    def ensure_collection(self, vector_size: int = EmbeddingConstants.VECTOR_SIZE):
+        with self._lock:
+            if self.collection_exists():
+                return
+            os.makedirs(self.base_dir, exist_ok=True)
+            self._write(np.zeros((0, vector_size), dtype=np.float32), [], [])
+
+    def search(self, query_vector: List[float], limit: int = 3, score_threshold: float = 0.7) -> List[dict]:
+        vectors, ids, payloads = self._load()
+        if not len(ids) or limit <= 0:
+            return []
+
+        query = self._normalize(np.asarray(query_vector, dtype=np.float32))
+        if vectors.dtype == np.float32:
+            scores = vectors @ query
+        else:
+            # NumPy has no BLAS path for float16, so upcast in row chunks rather than scoring in half precision.
+            scores = np.empty(len(ids), dtype=np.float32)
+            step = VectorStoreConstants.LOCAL_SEARCH_CHUNK_ROWS
+            for start in range(0, len(ids), step):
+                scores[start:start + step] = vectors[start:start + step].astype(np.float32) @ query
+
+        k = min(limit, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        results = []
+        for index in top:
+            score = float(scores[index])
+            if score_threshold is not None and score < score_threshold:
+                break
+            results.append({"id": ids[index], "version": 0, "score": score, "payload": payloads[index]})
+        return results
+
+    def upsert(self, points: List[dict]):
+        if not points:
+            return
+        with self._lock:
+            vectors, ids, payloads = self._load()
+            positions: Dict[str, int] = {point_id: i for i, point_id in enumerate(ids)}
+            vectors = np.array(vectors, dtype=np.float32)
+            ids, payloads = list(ids), list(payloads)
+
+            new_vectors = []
+            for point in points:
+                vector = self._normalize(np.asarray(point["vector"], dtype=np.float32))
+                point_id = str(point["id"])
+                if point_id in positions:
+                    vectors[positions[point_id]] = vector
+                    payloads[positions[point_id]] = point["payload"]
+                else:
+                    positions[point_id] = len(ids)
+                    ids.append(point_id)
+                    payloads.append(point["payload"])
+                    new_vectors.append(vector)
+
+            if new_vectors:
+                vectors = np.vstack([vectors.reshape(-1, len(new_vectors[0])), np.stack(new_vectors)])
+            self._write(vectors, ids, payloads)
+
+    def delete(self, point_ids: List[str]):
+        with self._lock:
+            vectors, ids, payloads = self._load()
+            removed = set(str(point_id) for point_id in point_ids)
+            keep = [i for i, point_id in enumerate(ids) if point_id not in removed]
+            self._write(
+                np.array(vectors[keep], dtype=np.float32),
+                [ids[i] for i in keep],
+                [payloads[i] for i in keep]
+            )
+
+    def list_point_ids(self) -> set:
+        return set(self._load()[1])
+
+    def count(self) -> int:
+        return len(self._load()[1])
+
+
+def get_vector_store_backend(collection_name: str) -> str:
+    """
+    Backend configured for ``collection_name`` via ``VECTOR_STORE_BACKENDS``, falling back to
+    ``DEFAULT_VECTOR_STORE_BACKEND``.
+    """
+    backends = getattr(settings, "VECTOR_STORE_BACKENDS", {}) or {}
+    return backends.get(collection_name) or getattr(
+        settings, "DEFAULT_VECTOR_STORE_BACKEND", VectorStoreConstants.QDRANT)
+
+
+_local_stores = {}
+_local_stores_lock = threading.Lock()
+
+
+def get_vector_store(collection_name: str, backend: str = None, client=None, transport=None) -> BaseVectorStore:
+    """
+    Build the vector store for ``collection_name``. Local stores are shared per process so their
+    memory map and payloads are loaded once.
+
+    :raises ValueError: If the backend is not present.
+    """
+    backend = backend or get_vector_store_backend(collection_name)
+    if backend == VectorStoreConstants.QDRANT:
+        return QdrantVectorStore(collection_name, client=client, transport=transport)
+    if backend == VectorStoreConstants.LOCAL:
+        with _local_stores_lock:
+            if collection_name not in _local_stores:
+                _local_stores[collection_name] = LocalVectorStore(collection_name)
+            return _local_stores[collection_name]
+    raise ValueError(f"Vector store backend '{backend}' is not present.")
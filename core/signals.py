@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import LLMConfiguration, LLMInfo
+from core.services.config_cache import llm_config_cache
+
+
+@receiver([post_save, post_delete], sender=LLMConfiguration)
+@receiver([post_save, post_delete], sender=LLMInfo)
+def invalidate_llm_config_cache(sender, using=None, **kwargs):
+    # After commit, or a reader could re-cache the old row before the change is visible.
+    transaction.on_commit(llm_config_cache.invalidate, using=using)
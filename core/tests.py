@@ -1,6 +1,37 @@
-from django.test import TestCase
+import hashlib
+import os
+import queue
+import threading
+import time
+import types
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import List, Optional
+from unittest import mock
 
+from django.core.cache import caches
+from django.test import TestCase, SimpleTestCase, override_settings
+from pydantic import BaseModel, Field
+
+from core.constants import VectorStoreConstants
+from core.models import LLMBatchJob, LLMConfiguration, LLMInfo, LLMRequestLog, VectorCollectionManifest
+from core.providers.anthropic_service import AnthropicProvider
+from core.providers.llm_service import LLMProviderError
+from core.services.config_cache import LLMConfigCache
+from core.services.context_packer import ContextPacker, TokenCounter
+from core.services.embedding_batcher import EmbeddingBatcher
+from core.services.embedding_cache import EmbeddingCache
+from core.services.llm_interface import LLMInterface
+from core.services.lru_cache import LRUCache
 from core.services.qdrant_service import QdrantRAGAgent
+from core.services.rate_limiter import AIMDConcurrencyLimiter, LLMRateLimiter, RateLimitExceeded
+from core.services.request_log_writer import LLMRequestLogWriter
+from core.services.schema_registry import to_strict_json_schema
+from core.services.semantic_cache import SemanticResponseCache
+from core.services.single_flight import SingleFlight
+from core.services.sparse_index import BM25Index, document_text, tokenize
+from core.services.vector_store import QdrantVectorStore
 
 
 # Create your tests here.
@@ -240,4 +271,795 @@ def insert_syllabus_data():
             "link": "https://drive.google.com/file/d/1CPT0zfrOrSf4Q8wJCbgdIttKDOBrz95q/view?usp=sharing"
           }
         ]
-    QdrantRAGAgent(collection_name="tutorKB").create_collection(knowledge_base=knowledge_base)
\ No newline at end of file
+    QdrantRAGAgent(collection_name="tutorKB").create_collection(knowledge_base=knowledge_base)
+
+
+class FakeQdrantClient(object):
+
+    def __init__(self, exists=True):
+        self.exists = exists
+        self.points = {}
+
+    def collection_exists(self, collection_name):
+        return self.exists
+
+    def create_collection(self, collection_name, vectors_config):
+        self.exists = True
+        self.points = {}
+
+    def upsert(self, collection_name, points):
+        for point in points:
+            self.points[str(point.id)] = point
+
+    def delete(self, collection_name, points_selector):
+        for point_id in points_selector.points:
+            self.points.pop(point_id, None)
+
+    def scroll(self, collection_name, limit, offset, with_payload, with_vectors):
+        return [types.SimpleNamespace(id=point_id) for point_id in self.points], None
+
+    def count(self, collection_name, exact=True):
+        return types.SimpleNamespace(count=len(self.points))
+
+
+class CollectionManifestTests(TestCase):
+
+    def make_agent(self, client):
+        agent = QdrantRAGAgent.__new__(QdrantRAGAgent)
+        agent.collection_name = "manifest-test"
+        agent.vector_store_backend = VectorStoreConstants.QDRANT
+        agent.vector_store = QdrantVectorStore(agent.collection_name, client, transport=None)
+        agent.sparse_index = mock.Mock()
+        agent._embed_many = lambda texts, model=None, batched=False: [[1.0, 0.0] for _ in texts]
+        return agent
+
+    def setUp(self):
+        self.knowledge_base = [{"Context": f"entry {i}"} for i in range(5)]
+
+    def test_recreated_collection_drops_manifest(self):
+        client = FakeQdrantClient()
+        self.make_agent(client).create_collection(self.knowledge_base)
+        self.assertEqual(len(client.points), 5)
+
+        # The collection is deleted behind our back: the next sync must repopulate it.
+        client.exists, client.points = False, {}
+        self.make_agent(client).create_collection(self.knowledge_base)
+        self.assertEqual(len(client.points), 5)
+
+    def test_manifest_size_mismatch_lists_points(self):
+        client = FakeQdrantClient()
+        self.make_agent(client).create_collection(self.knowledge_base)
+
+        # Same collection name on an empty cluster, the stale manifest still present.
+        client = FakeQdrantClient()
+        self.make_agent(client).create_collection(self.knowledge_base)
+        self.assertEqual(len(client.points), 5)
+        self.assertEqual(len(VectorCollectionManifest.objects.get(collection_name="manifest-test").point_ids), 5)
+
+    def test_unreachable_store_does_not_recreate(self):
+        client = FakeQdrantClient()
+        client.collection_exists = mock.Mock(side_effect=ConnectionError("timeout"))
+        client.create_collection = mock.Mock()
+        with self.assertRaises(Exception):
+            self.make_agent(client).create_collection(self.knowledge_base)
+        client.create_collection.assert_not_called()
+
+
+SHARED_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": "/tmp/semantic-cache-tests"},
+}
+
+
+@override_settings(CACHES=SHARED_CACHES, SEMANTIC_CACHE_GENERATION_CACHE_ALIAS="shared")
+class SemanticResponseCacheTests(SimpleTestCase):
+
+    def test_explicit_zero_threshold_is_kept(self):
+        semantic_cache = SemanticResponseCache(threshold=0.0)
+        self.assertEqual(semantic_cache.threshold, 0.0)
+        semantic_cache.store("config", "collection-a", "fees?", [1.0, 0.0], "answer")
+        self.assertIsNotNone(semantic_cache.lookup("config", "collection-a", [0.0, 1.0], threshold=0.0))
+
+    def test_invalidation_reaches_other_instances(self):
+        worker, ingest = SemanticResponseCache(), SemanticResponseCache()
+        worker.store("config", "collection-b", "fees?", [1.0, 0.0], "answer")
+        self.assertIsNotNone(worker.lookup("config", "collection-b", [1.0, 0.0]))
+        ingest.invalidate("collection-b")
+        self.assertIsNone(worker.lookup("config", "collection-b", [1.0, 0.0]))
+
+    def test_per_process_generation_cache_is_refused(self):
+        self.assertTrue(SemanticResponseCache().is_usable())
+        with override_settings(SEMANTIC_CACHE_GENERATION_CACHE_ALIAS="default"):
+            self.assertFalse(SemanticResponseCache().is_usable())
+
+
+class FakeEmbeddingsClient(object):
+
+    def __init__(self, latency=0.0, error=None):
+        self.latency = latency
+        self.error = error
+        self.calls = []
+        self.embeddings = self
+
+    def create(self, model, input):
+        self.calls.append(list(input))
+        time.sleep(self.latency)
+        if self.error:
+            raise self.error
+        return types.SimpleNamespace(data=[types.SimpleNamespace(embedding=[float(len(text))]) for text in input])
+
+
+@override_settings(EMBEDDING_BATCH_WINDOW_MS=20, EMBEDDING_BATCH_MAX_SIZE=64, EMBEDDING_BATCH_MAX_CONCURRENCY=4)
+class EmbeddingBatcherTests(SimpleTestCase):
+
+    def embed_concurrently(self, batcher, client, texts):
+        results = {}
+
+        def embed(text):
+            results[text] = batcher.embed_many(client, "model", [text])[0]
+
+        threads = [threading.Thread(target=embed, args=(text,)) for text in texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_texts_share_requests(self):
+        batcher, client = EmbeddingBatcher(), FakeEmbeddingsClient(latency=0.01)
+        texts = [f"question {i}" * (i % 4 + 1) for i in range(50)]
+        results = self.embed_concurrently(batcher, client, texts)
+
+        self.assertEqual(results, {text: [float(len(text))] for text in texts})
+        self.assertLess(len(client.calls), 10)
+        self.assertEqual(sum(len(call) for call in client.calls), 50)
+        self.assertEqual(batcher.stats()["batched_requests"], 50)
+
+    def test_collection_continues_while_a_batch_is_sent(self):
+        batcher, client = EmbeddingBatcher(), FakeEmbeddingsClient(latency=0.4)
+        first = batcher.submit(client, "model", "first")
+        time.sleep(0.1)
+        started = time.monotonic()
+        second = batcher.submit(client, "model", "second")
+        second.result(timeout=5)
+        self.assertLess(time.monotonic() - started, 0.55)
+        first.result(timeout=5)
+        self.assertEqual(len(client.calls), 2)
+        self.assertLess(batcher.stats()["wait_p99_ms"], 100)
+
+    def test_errors_reach_every_caller(self):
+        batcher, client = EmbeddingBatcher(), FakeEmbeddingsClient(error=RuntimeError("api down"))
+        futures = [batcher.submit(client, "model", f"text {i}") for i in range(5)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+        self.assertEqual(batcher.stats()["errors"], 1)
+
+    def test_dead_collector_is_restarted(self):
+        class DyingQueue(queue.Queue):
+            died = False
+
+            def get(self, *args, **kwargs):
+                if not DyingQueue.died:
+                    DyingQueue.died = True
+                    raise SystemExit
+                return super().get(*args, **kwargs)
+
+        batcher, client = EmbeddingBatcher(), FakeEmbeddingsClient()
+        batcher._pid, batcher._queue = os.getpid(), DyingQueue()
+        first = batcher.submit(client, "model", "before")
+        batcher._thread.join(timeout=5)
+        self.assertFalse(batcher._thread.is_alive())
+
+        self.assertEqual(batcher.embed_many(client, "model", ["after"]), [[5.0]])
+        self.assertEqual(first.result(timeout=5), [6.0])
+
+
+class BM25IndexTests(TestCase):
+
+    def setUp(self):
+        self.index = BM25Index("bm25-tests")
+        entries = [
+            {"Questions": ["What are the B.Tech fees?"], "Context": "B.Tech tuition fees are 2,50,000 per year."},
+            {"Questions": ["Is there a hostel?"], "Context": "Separate hostels are available for boys and girls."},
+            {"Questions": ["Telangana reservation"], "Context": "Section 33 of Act No. 11 of 2018 reserves 25% of seats."},
+        ]
+        self.index.replace({str(i): {"text": document_text(entry), "payload": entry} for i, entry in enumerate(entries)})
+
+    def test_keys_and_stopwords_are_not_indexed(self):
+        self.assertNotIn("context", tokenize(document_text({"Context": "Hostel fees"})))
+        self.assertEqual(tokenize("What are the hostel fees?"), ["hostel", "fees"])
+
+    def test_exact_terms_match(self):
+        results = self.index.search("section 33 reservation", limit=3, min_score=0.25)
+        self.assertEqual(results[0]["id"], "2")
+        self.assertLess(results[0]["score"], 1.0)
+
+    def test_off_topic_query_sharing_a_word_is_dropped(self):
+        self.assertTrue(self.index.search("what is the weather forecast for the year", limit=3))
+        self.assertEqual(self.index.search("what is the weather forecast for the year", limit=3, min_score=0.25), [])
+
+    def test_index_is_shared_between_hosts(self):
+        other_host = BM25Index("bm25-tests")
+        self.assertEqual(other_host.search("hostel", limit=1)[0]["id"], "1")
+
+        self.index.replace({"9": {"text": "Hostel mess timings", "payload": {}}})
+        self.assertEqual(self.index.search("hostel", limit=1)[0]["id"], "9")
+        with override_settings(SPARSE_INDEX_CHECK_INTERVAL=0):
+            self.assertEqual(other_host.search("hostel", limit=1)[0]["id"], "9")
+
+    def test_missing_index_warns_once(self):
+        index = BM25Index("bm25-missing")
+        with self.assertLogs("core.services.sparse_index", level="WARNING") as logs:
+            self.assertEqual(index.search("hostel fees", limit=3), [])
+            with override_settings(SPARSE_INDEX_CHECK_INTERVAL=0):
+                self.assertEqual(index.search("hostel fees", limit=3), [])
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("dense-only", logs.output[0])
+
+
+@override_settings(LOCAL_BATCH_DIR="/tmp/local-batch-tests", LLM_REQUEST_LOG_ASYNC=False, LOCAL_BATCH_PROVIDER_ENABLED=True)
+class LocalBatchTests(TestCase):
+
+    def setUp(self):
+        llm_info = LLMInfo.objects.create(model_name="local-batch-model", provider="openai", pricing={
+            "input_tokens_cost_per_k": 1.0, "output_tokens_cost_per_k": 2.0, "batch_price_multiplier": 0.2})
+        LLMConfiguration.objects.create(config_name="local-batch-agent", llm_provider="local", model="local-batch-model",
+                                        llm_info=llm_info, system_behaviour="Answer briefly.", config_data={})
+        self.requests = [{"custom_id": f"q{i}", "user_prompt": f"question {i}"} for i in range(3)]
+        self.requests.append({"custom_id": "broken", "messages": [{"role": "system", "content": "no user message"}]})
+
+    def test_submit_and_poll(self):
+        interface, results = LLMInterface(), []
+        batch_job = interface.submit_batch("local-batch-agent", self.requests)
+        batch_job = interface.poll_batch(batch_job, on_result=results.append)
+
+        self.assertTrue(batch_job.results_processed)
+        self.assertEqual((batch_job.succeeded_count, batch_job.failed_count), (3, 1))
+        self.assertEqual({result["custom_id"]: result["status"] for result in results},
+                         {"q0": "SUCCESS", "q1": "SUCCESS", "q2": "SUCCESS", "broken": "FAILURE"})
+        self.assertEqual(results[0]["content"], "question 0")
+
+        logs = LLMRequestLog.objects.filter(request_type="batch", config_name="local-batch-agent")
+        self.assertEqual(logs.count(), 4)
+        full_price = sum(log.input_tokens * 1.0 / 1000 + log.output_tokens * 2.0 / 1000 for log in logs)
+        self.assertAlmostEqual(batch_job.total_cost, full_price * 0.2)
+
+    def test_overlapping_polls_process_results_once(self):
+        interface, results = LLMInterface(), []
+        batch_job = interface.submit_batch("local-batch-agent", self.requests)
+        first, second = LLMBatchJob.objects.get(id=batch_job.id), LLMBatchJob.objects.get(id=batch_job.id)
+
+        interface.poll_batch(first, on_result=results.append)
+        second = interface.poll_batch(second, on_result=results.append)
+        interface.poll_pending_batches()
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(second.results_processed)
+        self.assertEqual(LLMRequestLog.objects.filter(request_type="batch", config_name="local-batch-agent").count(), 4)
+
+    def test_only_batch_requests_are_supported(self):
+        with self.assertRaises(LLMProviderError):
+            LLMInterface().get_llm_provider("local", "local-batch-agent").get_text_response(user_prompt="hi")
+        with override_settings(LOCAL_BATCH_PROVIDER_ENABLED=False), self.assertRaises(ValueError):
+            LLMInterface().get_llm_provider("local", "local-batch-agent")
+
+
+class TokenCounterTests(SimpleTestCase):
+
+    def setUp(self):
+        TokenCounter._encodings.clear()
+        self.addCleanup(TokenCounter._encodings.clear)
+
+    def test_known_model_uses_its_encoding(self):
+        encoding = mock.Mock(encode=lambda text: text.split())
+        with mock.patch("tiktoken.encoding_for_model", return_value=encoding) as encoding_for_model:
+            counter = TokenCounter("gpt-4o")
+        encoding_for_model.assert_called_once_with("gpt-4o")
+        self.assertEqual(counter.count("one two three four five"), 5)
+
+    def test_unknown_model_is_estimated(self):
+        counter = TokenCounter("claude-3-5-haiku-latest")
+        self.assertIsNone(counter.encoding)
+        self.assertEqual(counter.count("x" * 10), 3)
+
+    def test_unloadable_encoding_is_estimated(self):
+        with mock.patch("tiktoken.encoding_for_model", side_effect=OSError("offline")):
+            counter = TokenCounter("gpt-4o")
+        self.assertIsNone(counter.encoding)
+        self.assertEqual(counter.count("x" * 8), 2)
+
+
+class ExistingUserFanoutTests(SimpleTestCase):
+
+    def setUp(self):
+        self.agent = QdrantRAGAgent.__new__(QdrantRAGAgent)
+        self.agent.retrieve = mock.Mock(return_value=[{"payload": {"context": "fees"}}])
+        self.submitted = []
+        patches = [
+            mock.patch("core.services.qdrant_service.identify_creation_intent_and_execute",
+                       return_value=(False, None)),
+            mock.patch("core.services.qdrant_service.get_session_memory",
+                       return_value={"summary": None, "recent": [{"role": "user", "content": "hi"}]}),
+            mock.patch("core.services.background.get_executor", return_value=mock.Mock(submit=self.submit)),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted.append(fn)
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+    def test_holds_one_pool_thread(self):
+        with mock.patch.object(QdrantRAGAgent, "_semantic_cache_enabled", return_value=False):
+            creation_intent, _, rag_kwargs = self.agent._prepare_existing_user_query("fees?", "session", {})
+
+        self.assertFalse(creation_intent)
+        self.assertEqual(len(self.submitted), 1)
+        self.assertEqual(rag_kwargs["vector_results"], [{"payload": {"context": "fees"}}])
+        self.assertEqual(rag_kwargs["previous_context"], [{"role": "user", "content": "hi"}])
+
+    def test_queued_retrieval_runs_on_the_request_thread(self):
+        pending = Future()
+        with mock.patch.object(QdrantRAGAgent, "_semantic_cache_enabled", return_value=False), \
+                mock.patch("core.services.background.get_executor", return_value=mock.Mock(submit=lambda *a, **k: pending)):
+            _, _, rag_kwargs = self.agent._prepare_existing_user_query("fees?", "session", {})
+
+        self.assertTrue(pending.cancelled())
+        self.agent.retrieve.assert_called_once_with(user_query="fees?", n_points=1)
+        self.assertEqual(rag_kwargs["vector_results"], [{"payload": {"context": "fees"}}])
+
+    def test_semantic_cache_skips_speculative_retrieval(self):
+        with mock.patch.object(QdrantRAGAgent, "_semantic_cache_enabled", return_value=True):
+            _, _, rag_kwargs = self.agent._prepare_existing_user_query("fees?", "session", {})
+
+        self.assertEqual(self.submitted, [])
+        self.agent.retrieve.assert_not_called()
+        self.assertNotIn("vector_results", rag_kwargs)
+
+
+class ProviderError(Exception):
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(headers=headers or {})
+
+
+class RateLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        patcher = mock.patch("core.services.rate_limiter.time.sleep", side_effect=self.sleeps.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retry_after_forms(self):
+        get_retry_after = LLMRateLimiter.get_retry_after
+        self.assertEqual(get_retry_after(ProviderError(429, {"retry-after": "2"})), 2.0)
+        self.assertEqual(get_retry_after(ProviderError(429, {"retry-after-ms": "1500", "retry-after": "2"})), 1.5)
+        retry_at = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        self.assertAlmostEqual(get_retry_after(ProviderError(429, {"retry-after": retry_at})), 30, delta=1.5)
+        self.assertIsNone(get_retry_after(ProviderError(429, {"retry-after": "soon"})))
+        self.assertIsNone(get_retry_after(ProviderError(429)))
+
+    def test_throttled_calls_back_off(self):
+        limiter = LLMRateLimiter("test:model", max_concurrency=4)
+        fn = mock.Mock(side_effect=[ProviderError(429, {"retry-after": "1"}), ProviderError(529), "answer"])
+
+        self.assertEqual(limiter.call(fn), "answer")
+        self.assertEqual(fn.call_count, 3)
+        self.assertGreaterEqual(self.sleeps[0], 1.0)
+        stats = limiter.stats()
+        self.assertEqual((stats["throttled"], stats["retries"], stats["succeeded"]), (2, 2, 1))
+        self.assertEqual(stats["concurrency_limit"], 2.5)
+
+    def test_non_retryable_error_is_raised(self):
+        limiter = LLMRateLimiter("test:model")
+        fn = mock.Mock(side_effect=ProviderError(400))
+        with self.assertRaises(ProviderError):
+            limiter.call(fn)
+        self.assertEqual(fn.call_count, 1)
+
+    def test_wait_beyond_max_wait_is_rejected(self):
+        limiter = LLMRateLimiter("test:model", requests_per_minute=1, max_wait=5)
+        limiter.call(lambda: "first")
+        with self.assertRaises(RateLimitExceeded):
+            limiter.call(lambda: "second")
+        self.assertEqual(limiter.stats()["rejected"], 1)
+        self.assertEqual(self.sleeps, [])
+
+    def test_retry_after_beyond_max_wait_is_not_retried(self):
+        limiter = LLMRateLimiter("test:model", max_wait=5)
+        fn = mock.Mock(side_effect=ProviderError(429, {"retry-after": "120"}))
+        with self.assertRaises(ProviderError):
+            limiter.call(fn)
+        self.assertEqual(fn.call_count, 1)
+        # Other requests for the model are held back, but only for up to max_wait.
+        self.assertEqual(limiter.call(lambda: "held back"), "held back")
+        self.assertAlmostEqual(self.sleeps[-1], 5, delta=0.5)
+
+    def test_aimd_decrease_and_increase(self):
+        limiter = AIMDConcurrencyLimiter(initial=4, min_limit=1, max_limit=5, latency_target=1.0, decrease_interval=60)
+        for _ in range(4):
+            self.assertTrue(limiter.acquire(timeout=0))
+        self.assertFalse(limiter.acquire(timeout=0))
+
+        limiter.release(throttled=True)
+        self.assertEqual(limiter.limit, 2.0)
+        limiter.release(throttled=True)
+        self.assertEqual(limiter.limit, 2.0)  # one decrease per interval
+        limiter.release(latency=0.1)
+        self.assertEqual(limiter.limit, 2.5)
+        limiter.release(latency=None)
+        self.assertEqual(limiter.limit, 2.5)
+
+        limiter._last_decrease = 0.0
+        self.assertTrue(limiter.acquire(timeout=0))
+        limiter.release(latency=2.0)
+        self.assertEqual(limiter.limit, 1.25)
+        for _ in range(20):
+            limiter.acquire(timeout=0)
+            limiter.release(latency=0.1)
+        self.assertEqual(limiter.limit, 5)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def slow(self, result=None, error=None, latency=0.2):
+        calls = []
+
+        def fn():
+            calls.append(threading.current_thread().name)
+            time.sleep(latency)
+            if error is not None:
+                raise error
+            return result
+
+        return fn, calls
+
+    def run_concurrently(self, flight, fn, callers=5):
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flight.do("test", "key", fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_followers_receive_the_leaders_result(self):
+        flight = SingleFlight()
+        fn, calls = self.slow(result={"vector": [1.0]})
+        results, errors = self.run_concurrently(flight, fn)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, [])
+        self.assertEqual(results, [{"vector": [1.0]}] * 5)
+        stats = flight.stats()["test"]
+        self.assertEqual((stats["calls"], stats["executions"], stats["coalesced"], stats["in_flight"]), (5, 1, 4, 0))
+
+    def test_followers_receive_the_leaders_exception(self):
+        flight = SingleFlight()
+        error = ConnectionError("upstream down")
+        fn, calls = self.slow(error=error)
+        results, errors = self.run_concurrently(flight, fn)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [])
+        self.assertEqual(errors, [error] * 5)
+        self.assertEqual(flight.stats()["test"]["errors"], 1)
+
+        # The failed call is not remembered.
+        fn, calls = self.slow(result="recovered", latency=0)
+        self.assertEqual(flight.do("test", "key", fn), "recovered")
+
+    @override_settings(SINGLE_FLIGHT_WAIT_TIMEOUT=0.1)
+    def test_follower_calls_directly_when_leader_hangs(self):
+        flight, released = SingleFlight(), threading.Event()
+        leader = threading.Thread(target=flight.do, args=("test", "key", released.wait))
+        leader.start()
+        self.addCleanup(leader.join)
+        self.addCleanup(released.set)
+        time.sleep(0.05)
+
+        fn, calls = self.slow(result="direct", latency=0)
+        started = time.monotonic()
+        self.assertEqual(flight.do("test", "key", fn), "direct")
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(len(calls), 1)
+        stats = flight.stats()["test"]
+        self.assertEqual((stats["wait_fallbacks"], stats["coalesced"], stats["in_flight"]), (1, 0, 1))
+
+    @override_settings(SINGLE_FLIGHT_SHARED=True, SINGLE_FLIGHT_POLL_INTERVAL=0.01, SINGLE_FLIGHT_WAIT_TIMEOUT=2)
+    def test_shared_result_from_another_worker(self):
+        flight, cache = SingleFlight(), caches["default"]
+        lock_key, result_key = self.shared_keys("shared-result")
+        cache.add(lock_key, 1)
+        threading.Timer(0.1, cache.set, args=(result_key, "from another worker")).start()
+        self.addCleanup(cache.delete_many, [lock_key, result_key])
+
+        fn, calls = self.slow(result="local")
+        self.assertEqual(flight.do("test", "shared-result", fn), "from another worker")
+        self.assertEqual(calls, [])
+        self.assertEqual(flight.stats()["test"]["shared_coalesced"], 1)
+
+    @override_settings(SINGLE_FLIGHT_SHARED=True, SINGLE_FLIGHT_POLL_INTERVAL=0.01, SINGLE_FLIGHT_WAIT_TIMEOUT=2)
+    def test_shared_fallback_when_other_worker_gives_up(self):
+        flight, cache = SingleFlight(), caches["default"]
+        lock_key, result_key = self.shared_keys("shared-fallback")
+        cache.add(lock_key, 1)
+        threading.Timer(0.1, cache.delete, args=(lock_key,)).start()
+        self.addCleanup(cache.delete_many, [lock_key, result_key])
+
+        fn, calls = self.slow(result="local", latency=0)
+        self.assertEqual(flight.do("test", "shared-fallback", fn), "local")
+        self.assertEqual(len(calls), 1)
+        stats = flight.stats()["test"]
+        self.assertEqual((stats["shared_fallbacks"], stats["executions"]), (1, 1))
+
+    @override_settings(SINGLE_FLIGHT_SHARED=True)
+    def test_shared_leader_publishes_its_result(self):
+        flight, cache = SingleFlight(), caches["default"]
+        lock_key, result_key = self.shared_keys("shared-leader")
+        self.addCleanup(cache.delete_many, [lock_key, result_key])
+
+        fn, calls = self.slow(result="answer", latency=0)
+        self.assertEqual(flight.do("test", "shared-leader", fn), "answer")
+        self.assertEqual(cache.get(result_key), "answer")
+        self.assertIsNone(cache.get(lock_key))
+
+    @staticmethod
+    def shared_keys(key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return f"single_flight:lock:test:{digest}", f"single_flight:result:test:{digest}"
+
+
+class StrictSchemaTests(SimpleTestCase):
+
+    def test_nested_models_are_made_strict(self):
+        class Step(BaseModel):
+            title: str
+            note: Optional[str] = None
+
+        class Plan(BaseModel):
+            steps: List[Step]
+            first: Step = Field(description="The first step")
+            owner: Optional[str] = None
+
+        schema = to_strict_json_schema(Plan)
+        self.assertEqual(schema["required"], ["steps", "first", "owner"])
+        self.assertFalse(schema["additionalProperties"])
+        self.assertNotIn("default", schema["properties"]["owner"])
+        self.assertEqual(schema["properties"]["steps"]["items"], {"$ref": "#/$defs/Step"})
+        self.assertEqual(schema["properties"]["first"]["description"], "The first step")
+        self.assertNotIn("$ref", schema["properties"]["first"])
+        for step in (schema["$defs"]["Step"], schema["properties"]["first"]):
+            self.assertEqual(step["required"], ["title", "note"])
+            self.assertFalse(step["additionalProperties"])
+
+
+class RequestLogWriterTests(SimpleTestCase):
+
+    def make_writer(self, flush_interval=0.05):
+        writer = LLMRequestLogWriter(
+            batch_size=5, flush_interval=flush_interval, spill_path="/tmp/request-log-writer-tests.jsonl")
+        writer.written = []
+        writer._write_batch = lambda batch: writer.written.extend(record["id"] for record in batch)
+        return writer
+
+    def test_flush_writes_everything_and_stops(self):
+        writer = self.make_writer()
+        for i in range(12):
+            writer.write({"id": i})
+        thread = writer._thread
+        writer.flush(timeout=2)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(sorted(writer.written), list(range(12)))
+
+    def test_write_racing_flush_does_not_take_the_stop(self):
+        writer = self.make_writer(flush_interval=10)
+        writer.write({"id": 0})
+        thread, queue_put = writer._thread, writer._queue.put
+
+        def put(item, *args, **kwargs):
+            # A request thread writes after flush took the thread and before the stop is queued.
+            if not isinstance(item, dict):
+                writer._queue.put = queue_put
+                writer.write({"id": 1})
+                time.sleep(0.05)
+            queue_put(item, *args, **kwargs)
+
+        writer._queue.put = put
+        writer.flush(timeout=1)
+
+        self.assertFalse(thread.is_alive())
+        writer.flush(timeout=1)
+        self.assertEqual(sorted(writer.written), [0, 1])
+        self.assertEqual(writer.stats()["pending"], 0)
+
+
+@override_settings(CACHES=SHARED_CACHES, LLM_CONFIG_CACHE_VERSION_CACHE_ALIAS="shared")
+class LLMConfigCacheTests(TestCase):
+
+    def setUp(self):
+        caches["shared"].clear()
+        self.llm_info = LLMInfo.objects.create(model_name="config-cache-model", provider="openai", pricing={})
+        self.config = LLMConfiguration.objects.create(
+            config_name="config-cache-agent", llm_provider="openai", model="config-cache-model",
+            llm_info=self.llm_info, system_behaviour="Before.", config_data={})
+
+    def test_save_invalidates_after_commit(self):
+        config_cache, other_worker = LLMConfigCache(version_check_interval=0), LLMConfigCache(version_check_interval=0)
+        self.assertEqual(config_cache.get("config-cache-agent").system_behaviour, "Before.")
+        self.assertEqual(other_worker.get("config-cache-agent").system_behaviour, "Before.")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.config.system_behaviour = "After."
+            self.config.save()
+            # Nothing is invalidated until the transaction commits.
+            self.assertEqual(config_cache.get("config-cache-agent").system_behaviour, "Before.")
+        self.assertEqual(len(callbacks), 1)
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(config_cache.get("config-cache-agent").system_behaviour, "After.")
+        self.assertEqual(other_worker.get("config-cache-agent").system_behaviour, "After.")
+
+    def test_per_process_version_cache_caps_ttl(self):
+        self.assertEqual(LLMConfigCache(ttl=300, version_check_interval=2).get_ttl(), 300)
+        with override_settings(LLM_CONFIG_CACHE_VERSION_CACHE_ALIAS="default"):
+            self.assertEqual(LLMConfigCache(ttl=300, version_check_interval=2).get_ttl(), 2)
+
+
+class ContextPackerTests(SimpleTestCase):
+
+    def test_packed_history_starts_at_a_user_turn(self):
+        history = [{"role": "user" if i % 2 == 0 else "assistant", "content": "x" * 40} for i in range(6)]
+        # Room for the last three messages, the oldest of which is an assistant turn.
+        history_tokens = sum(TokenCounter().count(str(message)) for message in history[-3:])
+        packer = ContextPacker(budget={"max_input_tokens": 10000, "context_tokens": 0, "history_tokens": history_tokens})
+
+        packed = packer.pack(system_prompt="", question="fees?", chunks=[], history=history)
+        self.assertEqual([message["role"] for message in packed["history"]], ["user", "assistant"])
+        self.assertEqual(packed["history"], history[-2:])
+        self.assertEqual(packed["tokens"]["history"], sum(TokenCounter().count(str(message)) for message in history[-2:]))
+        self.assertEqual(packed["tokens"]["messages_dropped"], 4)
+
+
+class LRUCacheTests(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual([key for key, _ in cache.items()], ["a", "c"])
+        self.assertIsNone(cache.get("b"))
+
+    def test_entries_expire(self):
+        cache = LRUCache(ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=0.01)
+        time.sleep(0.02)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertNotIn("b", cache)
+
+
+EMBEDDING_TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "embedding-tests": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "embedding-tests"},
+}
+
+
+@override_settings(CACHES=EMBEDDING_TEST_CACHES, EMBEDDING_BATCH_WINDOW_MS=0)
+class EmbeddingCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        caches["embedding-tests"].clear()
+        self.client = FakeEmbeddingsClient()
+        self.agent = QdrantRAGAgent.__new__(QdrantRAGAgent)
+        self.agent.openai_client = self.client
+
+    def embed(self, embedding_cache, texts):
+        with mock.patch("core.services.qdrant_service.embedding_cache", embedding_cache):
+            return self.agent._embed_many(texts)
+
+    def test_lookup_goes_local_then_persistent_then_api(self):
+        worker = EmbeddingCache(cache_alias="embedding-tests")
+        self.assertEqual(self.embed(worker, ["fees", "hostel fees"]), [[4.0], [11.0]])
+        self.assertEqual(self.client.calls, [["fees", "hostel fees"]])
+        self.assertEqual(worker.stats()["misses"], 2)
+
+        self.assertEqual(self.embed(worker, ["fees", "  hostel   fees "]), [[4.0], [11.0]])
+        self.assertEqual(len(self.client.calls), 1)
+        self.assertEqual(worker.stats()["local_hits"], 2)
+
+        # Another process shares only the persistent tier.
+        other_worker = EmbeddingCache(cache_alias="embedding-tests")
+        self.assertEqual(self.embed(other_worker, ["hostel fees", "exam dates"]), [[11.0], [10.0]])
+        self.assertEqual(self.client.calls[-1], ["exam dates"])
+        stats = other_worker.stats()
+        self.assertEqual((stats["persistent_hits"], stats["misses"], stats["hits"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_set_many_writes_through(self):
+        embedding_cache = EmbeddingCache(cache_alias="embedding-tests")
+        embedding_cache.set_many("model", {"fees": [1.0], "dates": [2.0]})
+
+        self.assertEqual(embedding_cache.local.get(embedding_cache.make_key("model", "fees")), [1.0])
+        self.assertEqual(caches["embedding-tests"].get(embedding_cache.make_key("model", "dates")), [2.0])
+        self.assertEqual(embedding_cache.get_many("model", ["dates", "unknown"]), {0: [2.0]})
+        self.assertEqual(embedding_cache.stats()["local_hits"], 1)
+
+    def test_persistent_tier_failure_is_a_miss(self):
+        embedding_cache = EmbeddingCache(cache_alias="embedding-tests")
+        with mock.patch.object(caches["embedding-tests"], "get_many", side_effect=OSError("disk full")):
+            self.assertEqual(embedding_cache.get_many("model", ["fees"]), {})
+        self.assertEqual(embedding_cache.stats()["misses"], 1)
+
+
+class AnthropicPromptCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.provider = AnthropicProvider.__new__(AnthropicProvider)
+        self.provider.config_name = "claude-agent"
+        self.provider.provider = "anthropic"
+        self.provider.request_client = mock.Mock()
+        self.provider.log_response = mock.Mock()
+        self.usage = types.SimpleNamespace(
+            input_tokens=100, output_tokens=50, cache_read_input_tokens=1000, cache_creation_input_tokens=200)
+        self.provider.request_client.messages.create.return_value = mock.Mock(
+            content=[types.SimpleNamespace(text="Fees are listed online.")], usage=self.usage)
+        self.llm_info = types.SimpleNamespace(pricing={"input_tokens_cost_per_k": 3.0, "output_tokens_cost_per_k": 15.0})
+
+    def test_breakpoints_on_system_block_and_last_stable_message(self):
+        messages = [
+            {"role": "system", "content": "You are the university assistant."},
+            {"role": "system", "content": "Summary of Earlier Conversation: asked about hostels."},
+            {"role": "user", "content": "Is there a hostel?"},
+            {"role": "assistant", "content": "Yes, for boys and girls."},
+            {"role": "user", "content": "What are the fees?"},
+        ]
+        with mock.patch.object(LLMRateLimiter, "call", lambda limiter, fn, **kwargs: fn()):
+            self.provider.get_text_response_from_context(
+                model="claude-3-5-haiku-latest", messages=messages, max_completion_tokens=500, temperature=0,
+                n=1, frequency_penalty=0, llm_info=self.llm_info)
+
+        self.assertEqual(self.provider.log_response.call_args.kwargs["status"], "SUCCESS")
+        request = self.provider.request_client.messages.create.call_args.kwargs
+        self.assertEqual(request["system"], [
+            {"type": "text", "text": "You are the university assistant.", "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": "Summary of Earlier Conversation: asked about hostels."},
+        ])
+        self.assertEqual(request["messages"], [
+            {"role": "user", "content": "Is there a hostel?"},
+            {"role": "assistant", "content": [
+                {"type": "text", "text": "Yes, for boys and girls.", "cache_control": {"type": "ephemeral"}}]},
+            {"role": "user", "content": "What are the fees?"},
+        ])
+        self.assertEqual(messages[3]["content"], "Yes, for boys and girls.")
+
+    def test_cache_tokens_are_priced_separately(self):
+        usage_data, cost = self.provider._get_usage_and_cost(self.usage, self.llm_info)
+
+        self.assertEqual((usage_data["input_tokens"], usage_data["cache_read_tokens"], usage_data["cache_write_tokens"]),
+                         (1300, 1000, 200))
+        regular = 0.1 * 3.0 + 0.05 * 15.0
+        cached = 1.0 * 3.0 * 0.1 + 0.2 * 3.0 * 1.25
+        self.assertAlmostEqual(cost, regular + cached)
+
+        self.llm_info.pricing.update(cache_read_tokens_cost_per_k=0.5, cache_write_tokens_cost_per_k=4.0)
+        _, cost = self.provider._get_usage_and_cost(self.usage, self.llm_info)
+        self.assertAlmostEqual(cost, regular + 1.0 * 0.5 + 0.2 * 4.0)
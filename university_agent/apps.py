@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UniversityAgentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'university_agent'
+
+    def ready(self):
+        import university_agent.schemas  # noqa: F401
@@ -0,0 +1,23 @@
+class SessionMemoryConstants:
+    RECENT_TURNS = 4
+    SUMMARY_THRESHOLD_MESSAGES = 6
+    SUMMARY_CONFIG_NAME = "session-summary-agent"
+    FALLBACK_CONFIG_NAME = "university-agent"
+    SUMMARY_LOCK_TIMEOUT = 120
+    SUMMARY_SYSTEM_PROMPT = (
+        "You maintain a running summary of a conversation between a student and a university assistant. "
+        "Merge the existing summary with the new messages into a single updated summary of at most 200 words. "
+        "Keep facts the student shared, questions asked, answers given and any open follow-ups. "
+        "Return only the summary."
+    )
+
+class TaskIntentConstants:
+    NEGATIVE = "negative"
+    AMBIGUOUS = "ambiguous"
+    POSITIVE = "positive"
+    AMBIGUOUS_THRESHOLD = 0.3
+    POSITIVE_THRESHOLD = 0.7
+    EVAL_SET_FILE_NAME = "task_intent_eval.jsonl"
+
+class StructuredOutputConstants:
+    TASK_CREATION_SCHEMA = "task_creation"
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import re
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+
+from university_agent.constants import TaskIntentConstants
+
+logger = logging.getLogger(__name__)
+
+
+class TaskIntentClassifier(object):
+    """
+    Local first stage in front of the task-creation LLM call.
+
+    A message is scored from 0 to 1 with weighted regular expressions: explicit requests ("create a task",
+    "remind me") score high, task vocabulary and due dates add to the score, and plain questions lose some.
+    Messages below ``ambiguous_threshold`` are ``negative`` and skip the LLM; the rest are ``ambiguous``
+    or, from ``positive_threshold``, ``positive``, and still go to the LLM, which makes the final decision
+    and extracts the task. The thresholds trade LLM calls saved against task requests missed; measure
+    them with ``evaluate`` on the labelled set in ``data/task_intent_eval.jsonl``.
+    """
+
+    SIGNALS = (
+        ("create_task", 0.8, r"\b(create|add|make|set ?up|schedule|new|log)\b[^.?!]{0,40}\b(tasks?|to-?dos?|reminders?)\b"),
+        ("remind_me", 0.8, r"\bremind me\b"),
+        ("add_to_list", 0.7, r"\b(add|put)\b[^.?!]{0,40}\b(my|the)\s+(list|tasks|task list|to-?do(?: list)?|planner)\b"),
+        ("dont_forget", 0.6, r"\b(don'?t let me forget|make sure i (?:don'?t forget|remember))\b"),
+        ("note_down", 0.5, r"\b(note down|jot down|write down|keep track of)\b"),
+        ("cant_miss", 0.4, r"\b(can'?t|cannot|mustn'?t|shouldn'?t) (miss|forget)\b"),
+        ("mark_done", 0.5, r"\bmark\b[^.?!]{0,40}\b(as )?(done|complete|completed)\b"),
+        ("task_word", 0.35, r"\b(tasks?|to-?dos?|reminders?)\b"),
+        ("obligation", 0.45, r"\b(i need to|i have to|i must|i should|i want to|i've got to|i gotta)\b[^.?!]{0,60}\b(by|before|until|due)\b"),
+        ("due_date", 0.3, r"\b(by|before|due|until)\s+(tomorrow|tonight|today|next \w+|this \w+|end of \w+|"
+                          r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|\d{1,2}(st|nd|rd|th)?\b|"
+                          r"jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)"),
+        ("priority", 0.3, r"\b(high|low|medium|top)[ -]priority\b"),
+        ("question", -0.3, r"^\s*(what|when|where|who|which|why|how|is|are|does|do|can|could|will|tell me|explain)\b"),
+    )
+
+    def __init__(self, ambiguous_threshold: float = None, positive_threshold: float = None):
+        """
+        :param ambiguous_threshold: float, optional - Lowest score that still goes to the LLM.
+        :param positive_threshold: float, optional - Lowest score labelled ``positive``.
+        """
+        self.ambiguous_threshold = ambiguous_threshold if ambiguous_threshold is not None else getattr(
+            settings, "TASK_INTENT_AMBIGUOUS_THRESHOLD", TaskIntentConstants.AMBIGUOUS_THRESHOLD)
+        self.positive_threshold = positive_threshold if positive_threshold is not None else getattr(
+            settings, "TASK_INTENT_POSITIVE_THRESHOLD", TaskIntentConstants.POSITIVE_THRESHOLD)
+        self.signals = [(name, weight, re.compile(pattern, re.IGNORECASE)) for name, weight, pattern in self.SIGNALS]
+
+    def score(self, text: str) -> tuple:
+        """
+        :return: tuple - The score, clipped to [0, 1], and the names of the signals that matched.
+        """
+        score, matched = 0.0, []
+        for name, weight, pattern in self.signals:
+            if pattern.search(text or ""):
+                score += weight
+                matched.append(name)
+        return min(1.0, max(0.0, score)), matched
+
+    def classify(self, text: str) -> dict:
+        """
+        :param text: str - The user's message.
+        :return: dict - ``score``, ``label`` (negative, ambiguous or positive), ``call_llm`` and the ``matched`` signals.
+        """
+        score, matched = self.score(text)
+        if score >= self.positive_threshold:
+            label = TaskIntentConstants.POSITIVE
+        elif score >= self.ambiguous_threshold:
+            label = TaskIntentConstants.AMBIGUOUS
+        else:
+            label = TaskIntentConstants.NEGATIVE
+        return {
+            "score": round(score, 3),
+            "label": label,
+            "call_llm": label != TaskIntentConstants.NEGATIVE,
+            "matched": matched,
+        }
+
+
+def load_task_intent_eval_set(path: Optional[str] = None) -> List[dict]:
+    """
+    :param path: str, optional - A JSONL file of ``{"text": ..., "task": true|false}`` lines. Defaults to the bundled set.
+    :return: list - The labelled examples.
+    """
+    path = path or os.path.join(os.path.dirname(__file__), "data", TaskIntentConstants.EVAL_SET_FILE_NAME)
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(classifier: TaskIntentClassifier, examples: Iterable[dict]) -> dict:
+    """
+    Precision and recall of the classifier's "send to the LLM" decision against the labels. Recall is the
+    share of task requests that still reach the LLM; ``llm_call_rate`` is the share of all messages that do.
+
+    :return: dict - ``precision``, ``recall``, ``llm_call_rate``, the confusion counts and the ``missed`` task requests.
+    """
+    counts = {"true_positive": 0, "false_positive": 0, "true_negative": 0, "false_negative": 0}
+    missed = []
+    for example in examples:
+        call_llm = classifier.classify(example["text"])["call_llm"]
+        if example["task"]:
+            counts["true_positive" if call_llm else "false_negative"] += 1
+            if not call_llm:
+                missed.append(example["text"])
+        else:
+            counts["false_positive" if call_llm else "true_negative"] += 1
+
+    sent = counts["true_positive"] + counts["false_positive"]
+    positives = counts["true_positive"] + counts["false_negative"]
+    total = sent + counts["true_negative"] + counts["false_negative"]
+    return dict(
+        counts,
+        precision=counts["true_positive"] / sent if sent else 0.0,
+        recall=counts["true_positive"] / positives if positives else 0.0,
+        llm_call_rate=sent / total if total else 0.0,
+        missed=missed,
+    )
+
+
+task_intent_classifier = TaskIntentClassifier()
@@ -9,6 +9,9 @@ class ChatSession(UserAbstractModel):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    summary = models.TextField(null=True, blank=True)
+    summarized_message_count = models.IntegerField(default=0)
+    summary_updated_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
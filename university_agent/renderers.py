@@ -0,0 +1,20 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets server-sent event actions accept ``Accept: text/event-stream``. The event stream itself is a
+    ``StreamingHttpResponse`` and is never rendered; this only renders DRF responses such as errors,
+    as JSON.
+    """
+    media_type = "text/event-stream"
+    format = "event-stream"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return json.dumps(data, cls=DjangoJSONEncoder).encode(self.charset)
@@ -0,0 +1,31 @@
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+from core.services.schema_registry import schema_registry
+from university_agent.constants import StructuredOutputConstants
+
+
+class TaskStatus(str, Enum):
+    todo = 'todo'
+    completed = 'completed'
+
+
+class TaskPriority(str, Enum):
+    low = 'low'
+    medium = 'medium'
+    high = 'high'
+
+
+class Task(BaseModel):
+    creation_intent: bool
+    assistant_message: str
+    title: str
+    description: Optional[str] = None
+    due_date: Optional[str] = None
+    status: TaskStatus
+    priority: TaskPriority
+
+
+schema_registry.register(StructuredOutputConstants.TASK_CREATION_SCHEMA, Task)
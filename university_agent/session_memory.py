@@ -0,0 +1,126 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.services.background import run_in_background
+from core.services.config_cache import llm_config_cache
+from core.services.llm_interface import LLMInterface
+from university_agent.constants import SessionMemoryConstants
+from university_agent.models import ChatSession, ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class SessionMemory(object):
+    """
+    Bounded conversation memory for a chat session.
+
+    The last ``recent_turns`` turns are kept verbatim, and everything older is folded into
+    ``ChatSession.summary``. ``ChatSession.summarized_message_count`` records how many of the oldest
+    messages the summary covers. Once ``summary_threshold`` messages have aged out of the recent window
+    without being summarised, the summary is refreshed on a background thread, so per-turn prompt size
+    stays bounded however long the session gets. Until a session has a summary its whole history is sent,
+    so turns are never dropped because summarising is failing.
+
+    Summaries are written by the ``SESSION_SUMMARY_CONFIG_NAME`` configuration, or by ``university-agent``
+    while that does not exist. A refresh takes a ``cache.add`` lock on the default cache, which only keeps
+    workers from summarising the same session concurrently when that cache is shared (Redis, Memcached,
+    database); with the per-process default, a refresh only commits if no other refresh has moved the
+    summary on in the meantime, so a duplicate costs an LLM call but never rewinds the summary.
+    """
+
+    def __init__(self, recent_turns: int = None, summary_threshold: int = None):
+        self.recent_messages = 2 * (recent_turns or getattr(
+            settings, "SESSION_MEMORY_RECENT_TURNS", SessionMemoryConstants.RECENT_TURNS))
+        self.summary_threshold = summary_threshold or getattr(
+            settings, "SESSION_MEMORY_SUMMARY_THRESHOLD", SessionMemoryConstants.SUMMARY_THRESHOLD_MESSAGES)
+
+    @staticmethod
+    def _as_context(messages):
+        return [{"role": message.role, "content": message.content} for message in messages]
+
+    def get_context(self, session_id: str, refresh: bool = True) -> dict:
+        """
+        :param session_id: str - The chat session to load.
+        :param refresh: bool - Schedule a background summary refresh when the threshold is crossed.
+        :return: dict - ``summary`` of older turns (or None) and the ``recent`` messages, oldest first.
+        """
+        session_obj = ChatSession.objects.filter(session_id=session_id).first()
+        if not session_obj:
+            return {"summary": None, "recent": []}
+
+        messages = ChatMessage.objects.filter(session=session_obj)
+        total = messages.count()
+        unsummarized = total - session_obj.summarized_message_count
+
+        # Messages waiting for the next summary refresh are kept too, so nothing drops out of the prompt
+        # between the threshold being crossed and the refresh landing. Without a summary nothing is dropped.
+        window = unsummarized
+        if session_obj.summary:
+            window = min(unsummarized, self.recent_messages + self.summary_threshold)
+        recent = list(messages.order_by('-created_at', '-id')[:window]) if window > 0 else []
+        recent.reverse()
+
+        if refresh and unsummarized - self.recent_messages >= self.summary_threshold:
+            run_in_background(self.refresh_summary, session_id)
+
+        return {"summary": session_obj.summary, "recent": self._as_context(recent)}
+
+    @staticmethod
+    def get_summary_config_name() -> str:
+        config_name = getattr(settings, "SESSION_SUMMARY_CONFIG_NAME", SessionMemoryConstants.SUMMARY_CONFIG_NAME)
+        if llm_config_cache.get(config_name) is None:
+            logger.warning(f"Session summary config {config_name} is not present; "
+                           f"using {SessionMemoryConstants.FALLBACK_CONFIG_NAME}")
+            return SessionMemoryConstants.FALLBACK_CONFIG_NAME
+        return config_name
+
+    def refresh_summary(self, session_id: str):
+        """
+        Fold the messages older than the recent window into the session summary.
+        """
+        lock_key = f"session_summary_lock:{session_id}"
+        if not cache.add(lock_key, 1, timeout=SessionMemoryConstants.SUMMARY_LOCK_TIMEOUT):
+            return
+
+        try:
+            session_obj = ChatSession.objects.filter(session_id=session_id).first()
+            if not session_obj:
+                return
+
+            messages = ChatMessage.objects.filter(session=session_obj).order_by('created_at', 'id')
+            summarize_until = messages.count() - self.recent_messages
+            if summarize_until - session_obj.summarized_message_count < self.summary_threshold:
+                return
+
+            new_messages = self._as_context(messages[session_obj.summarized_message_count:summarize_until])
+            user_prompt = (
+                f"Existing summary: {session_obj.summary or 'None'}\n"
+                f"New messages: {new_messages}\n"
+                f"Updated summary:"
+            )
+            summary = LLMInterface().get_custom_response(
+                config_name=self.get_summary_config_name(),
+                user_prompt=user_prompt,
+                system_prompt=SessionMemoryConstants.SUMMARY_SYSTEM_PROMPT,
+            )
+            if not summary:
+                return
+
+            updated = ChatSession.objects.filter(
+                session_id=session_id, summarized_message_count=session_obj.summarized_message_count
+            ).update(
+                summary=summary.strip(),
+                summarized_message_count=summarize_until,
+                summary_updated_at=timezone.now(),
+            )
+            if not updated:
+                logger.info(f"Session {session_id} summary was refreshed concurrently; discarding this one")
+                return
+            logger.info(f"Session {session_id} summary refreshed through message {summarize_until}")
+        except Exception as e:
+            logger.error(f"Failed to refresh summary for session {session_id}: {str(e)}")
+        finally:
+            cache.delete(lock_key)
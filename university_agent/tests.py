@@ -1,8 +1,87 @@
-from django.test import TestCase
+from unittest import mock
 
+from django.test import SimpleTestCase, TestCase
+
+from university_agent.intent_classifier import TaskIntentClassifier, evaluate, load_task_intent_eval_set
+from university_agent.models import ChatMessage, ChatSession
+from university_agent.session_memory import SessionMemory
 from university_agent.utils import identify_creation_intent_and_execute
 
 
 # Create your tests here.
 def test_creation_agent():
-    identify_creation_intent_and_execute(user_query="Create a task to Complete the project by next week")
\ No newline at end of file
+    identify_creation_intent_and_execute(user_query="Create a task to Complete the project by next week")
+
+
+class TaskIntentClassifierTests(SimpleTestCase):
+
+    def test_eval_set_recall(self):
+        result = evaluate(TaskIntentClassifier(), load_task_intent_eval_set())
+        self.assertGreaterEqual(result["recall"], 0.95, result["missed"])
+        self.assertLess(result["llm_call_rate"], 0.6)
+
+    def test_plain_questions_skip_llm(self):
+        classifier = TaskIntentClassifier()
+        self.assertFalse(classifier.classify("what are the fees?")["call_llm"])
+        self.assertTrue(classifier.classify("Remind me to pay the fees by Friday")["call_llm"])
+
+
+class SessionMemoryTests(TestCase):
+
+    def setUp(self):
+        self.session = ChatSession.objects.create()
+        for i in range(30):
+            ChatMessage.objects.create(session=self.session, role="user" if i % 2 == 0 else "assistant", content=f"message {i}")
+        self.memory = SessionMemory(recent_turns=2, summary_threshold=4)
+
+    def test_full_history_until_summarized(self):
+        context = self.memory.get_context(self.session.session_id, refresh=False)
+        self.assertIsNone(context["summary"])
+        self.assertEqual(len(context["recent"]), 30)
+
+    def test_summary_falls_back_to_agent_config(self):
+        with mock.patch("university_agent.session_memory.LLMInterface") as interface:
+            interface.return_value.get_custom_response.return_value = "Summary."
+            self.memory.refresh_summary(self.session.session_id)
+        self.assertEqual(interface.return_value.get_custom_response.call_args.kwargs["config_name"], "university-agent")
+
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.summary, self.session.summarized_message_count), ("Summary.", 26))
+        context = self.memory.get_context(self.session.session_id, refresh=False)
+        self.assertEqual(len(context["recent"]), 4)
+
+
+class SendMessageStreamTests(TestCase):
+
+    url = "/university/chat/temp-session/send-message-stream/"
+
+    def post(self, chunks):
+        agent = mock.Mock()
+        agent.stream_response_for_new_user.return_value = iter(chunks)
+        with mock.patch("university_agent.views.get_rag_agent", return_value=agent):
+            return self.client.post(self.url, {"user_query": "What are the fees?"}, content_type="application/json",
+                                    HTTP_ACCEPT="text/event-stream")
+
+    def test_event_stream_is_accepted(self):
+        response = self.post(["The fees ", "are listed online."])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        frames = b"".join(response.streaming_content).decode().split("\n\n")
+        self.assertEqual([frame.split("\n")[0] for frame in frames if frame],
+                         ["event: session", "event: delta", "event: delta", "event: done"])
+        self.assertEqual(frames[1], 'event: delta\ndata: {"content": "The fees "}')
+
+        session = ChatSession.objects.get()
+        self.assertEqual(list(session.messages.values_list("role", "content")),
+                         [("user", "What are the fees?"), ("assistant", "The fees are listed online.")])
+
+    def test_reply_is_stored_when_client_disconnects(self):
+        response = self.post(["The fees ", "are listed online."])
+        stream = iter(response.streaming_content)
+        next(stream)
+        self.assertIn(b"The fees ", next(stream))
+        response.close()
+
+        assistant = ChatMessage.objects.get(role="assistant")
+        self.assertEqual(assistant.content, "The fees ")
@@ -1,67 +1,56 @@
+import logging
 from datetime import datetime
-from enum import Enum
+
+from django.conf import settings
 
 from core.services.llm_interface import LLMInterface
-from university_agent.models import ChatSession
-from university_agent.serializers import ChatSessionDetailSerializer, TaskSerializer
+from university_agent.constants import StructuredOutputConstants
+from university_agent.intent_classifier import task_intent_classifier
+from university_agent.serializers import TaskSerializer
+from university_agent.session_memory import SessionMemory
 
+logger = logging.getLogger(__name__)
 
-def get_previous_context_from_session(session_id: str):
+
+def get_session_memory(session_id: str):
+    """
+    Summary of the older turns of a session plus its recent messages, see ``SessionMemory``.
+    """
     try:
-        session_obj = ChatSession.objects.filter(session_id=session_id).first()
-        session_data = ChatSessionDetailSerializer(session_obj).data
-        previous_conversation = []
-        messages = session_data.get('messages')
-        for message in messages:
-            previous_conversation.append({
-                "role": message.get('role'),
-                "content": message.get('content')
-            })
-        return previous_conversation
+        return SessionMemory().get_context(session_id)
     except Exception as e:
-        return []
+        return {"summary": None, "recent": []}
+
+
+def get_previous_context_from_session(session_id: str):
+    return get_session_memory(session_id).get("recent", [])
 
 def identify_creation_intent_and_execute(user_query):
     """
     Identify the intent of the user query and execute the corresponding action.
 
+    Messages the local ``task_intent_classifier`` rules out are answered ``(False, None)`` without an LLM call.
+
     :param user_query: str - The user's query or command.
     :return: str - The result of the identified action.
     """
-
-    from pydantic import BaseModel
-    from typing import Optional
-    import json
-
-    class TaskStatus(str, Enum):
-        todo = 'todo'
-        completed = 'completed'
-
-    class TaskPriority(str, Enum):
-        low = 'low'
-        medium = 'medium'
-        high = 'high'
-
-    class Task(BaseModel):
-        creation_intent: bool
-        assistant_message: str
-        title: str
-        description: Optional[str] = None
-        due_date: Optional[str] = None
-        status: TaskStatus
-        priority: TaskPriority
+    if getattr(settings, "TASK_INTENT_PRECLASSIFIER_ENABLED", True):
+        intent = task_intent_classifier.classify(user_query)
+        if not intent["call_llm"]:
+            logger.debug(f"Skipped task-creation call for a message scored {intent['score']}")
+            return False, None
 
     user_query = f"Current Datetime; {datetime.now()} User Query:{user_query}"
 
-    content = LLMInterface().get_custom_structured_response(
+    task = LLMInterface().get_custom_structured_response(
         config_name="task-creation-agent",
         user_prompt=user_query,
-        response_format=Task,
+        schema_name=StructuredOutputConstants.TASK_CREATION_SCHEMA,
     )
 
-    task_dict = json.loads(content.choices[0].message.content)
-    creation_intent = task_dict.pop('creation_intent')
-    assistant_message = task_dict.pop('assistant_message')
+    task_dict = task.model_dump(mode="json", exclude={"creation_intent", "assistant_message"})
+    creation_intent = task.creation_intent
+    assistant_message = task.assistant_message
     if creation_intent:
         serializer = TaskSerializer(data=task_dict)
         serializer.is_valid(raise_exception=True)
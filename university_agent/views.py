@@ -1,15 +1,83 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
 from rest_framework.views import APIView
 
-from core.services.qdrant_service import QdrantRAGAgent
+from core.services.background import iterate_with_thread_context
+from core.services.qdrant_service import get_rag_agent
 from university_agent.models import ChatSession, ChatMessage, Task
+from university_agent.renderers import EventStreamRenderer
 from university_agent.serializers import ChatSessionDetailSerializer, \
     ChatSessionListSerializer, TaskSerializer
 
 
+def create_user_message(data):
+    """
+    Store the user's message in the requested session, creating the session if it does not exist.
+
+    :return: tuple - ``(session_obj, user_message)``.
+    """
+    session_id = data.get('session_id')
+    user_query = data.get('user_query')
+    if session_id:
+        session_obj = ChatSession.objects.filter(session_id=session_id).first()
+    else:
+        session_obj = None
+    if not session_obj:
+        session_obj = ChatSession.objects.create(
+            name='Untitled'
+        )
+
+    user_message = ChatMessage.objects.create(
+        session=session_obj,
+        role='user',
+        content=user_query
+    )
+    return session_obj, user_message
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def stream_assistant_message(session_obj, chunks):
+    """
+    Relay an assistant reply as server-sent events: a ``session`` event with the session id, one ``delta``
+    event per text chunk, and a ``done`` event with the session detail once the reply has been stored.
+    The reply is stored even if the client disconnects part way through.
+    """
+
+    def generate():
+        yield sse_event("session", {"session_id": str(session_obj.session_id)})
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield sse_event("delta", {"content": chunk})
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            ChatMessage.objects.create(
+                session=session_obj,
+                role='assistant',
+                content="".join(parts)
+            )
+
+        session_obj.refresh_from_db()
+        yield sse_event("done", ChatSessionDetailSerializer(session_obj).data)
+
+    response = StreamingHttpResponse(iterate_with_thread_context(generate()), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 class ChatSessionAPI(viewsets.ModelViewSet):
     serializer_class = ChatSessionListSerializer
 
@@ -23,25 +91,9 @@ class ChatSessionAPI(viewsets.ModelViewSet):
 
     @action(methods=["POST"], detail=False, url_path="send-message")
     def send_message(self, request, pk=None):
-        data = request.data
-        session_id = data.get('session_id')
-        user_query = data.get('user_query')
-        if session_id:
-            session_obj = ChatSession.objects.filter(session_id=session_id).first()
-        else:
-            session_obj = None
-        if not session_obj:
-            session_obj = ChatSession.objects.create(
-                name='Untitled'
-            )
-
-        user_message = ChatMessage.objects.create(
-            session=session_obj,
-            role='user',
-            content=user_query
-        )
+        session_obj, user_message = create_user_message(request.data)
 
-        rag_agent = QdrantRAGAgent()
+        rag_agent = get_rag_agent()
         response = rag_agent.get_response_for_existing_user(user_message.content, str(session_obj.session_id))
 
         assistant_message = ChatMessage.objects.create(
@@ -56,6 +108,16 @@ class ChatSessionAPI(viewsets.ModelViewSet):
 
         return Response(response, status=HTTP_200_OK)
 
+    @action(methods=["POST"], detail=False, url_path="send-message-stream",
+            renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def send_message_stream(self, request, pk=None):
+        session_obj, user_message = create_user_message(request.data)
+
+        rag_agent = get_rag_agent()
+        chunks = rag_agent.stream_response_for_existing_user(user_message.content, str(session_obj.session_id))
+
+        return stream_assistant_message(session_obj, chunks)
+
 
 
 class TempSessionAPI(viewsets.ModelViewSet):
@@ -82,25 +144,9 @@ class TempSessionAPI(viewsets.ModelViewSet):
 
     @action(methods=["POST"], detail=False, url_path="send-message")
     def send_message(self, request, pk=None):
-        data = request.data
-        session_id = data.get('session_id')
-        user_query = data.get('user_query')
-        if session_id:
-            session_obj = ChatSession.objects.filter(session_id=session_id).first()
-        else:
-            session_obj = None
-        if not session_obj:
-            session_obj = ChatSession.objects.create(
-                name='Untitled'
-            )
-
-        user_message = ChatMessage.objects.create(
-            session=session_obj,
-            role='user',
-            content=user_query
-        )
+        session_obj, user_message = create_user_message(request.data)
 
-        rag_agent = QdrantRAGAgent()
+        rag_agent = get_rag_agent()
         response = rag_agent.get_response_for_new_user(user_message.content, str(session_obj.session_id))
 
         assistant_message = ChatMessage.objects.create(
@@ -115,6 +161,16 @@ class TempSessionAPI(viewsets.ModelViewSet):
 
         return Response(response, status=HTTP_200_OK)
 
+    @action(methods=["POST"], detail=False, url_path="send-message-stream",
+            renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def send_message_stream(self, request, pk=None):
+        session_obj, user_message = create_user_message(request.data)
+
+        rag_agent = get_rag_agent()
+        chunks = rag_agent.stream_response_for_new_user(user_message.content, str(session_obj.session_id))
+
+        return stream_assistant_message(session_obj, chunks)
+
 
 class TaskAPI(viewsets.ModelViewSet):
     serializer_class = TaskSerializer
@@ -133,7 +189,7 @@ class TutorAPI(APIView):
             return Response({'detail': 'No user query provided'}, status=HTTP_400_BAD_REQUEST)
 
         try:
-            rag_agent = QdrantRAGAgent(collection_name="tutorKB")
+            rag_agent = get_rag_agent(collection_name="tutorKB")
             response = rag_agent.get_response_for_tutor(
                 user_query,
                 user_details=user_details,